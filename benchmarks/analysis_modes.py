@@ -0,0 +1,109 @@
+# compares the Ollama analysis modes (see aiFunctions.ANALYSIS_MODES) for latency and field accuracy
+#   python -m benchmarks.analysis_modes REFERENCE_DIR [--modes two-call multi-turn combined] [--pages 5]
+# REFERENCE_DIR holds PDFs with a reviewed JSON file of the same name (a "[FOR REVIEW] " prefix on
+# the PDF is ignored), so a checked destination folder can be used as it is
+
+import os
+import sys
+import json
+import time
+import argparse
+
+from scripts.documentParser import parseDocument
+from scripts.aiFunctions import analyzeDocument, ANALYSIS_MODES
+from benchmarks.common import summarize
+
+REVIEW_PREFIX = "[FOR REVIEW] "
+
+# HELPER: normalize a field value so that formatting differences are not counted as errors
+def normalize(value):
+    if isinstance(value, list):
+        return sorted(normalize(item) for item in value)
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return None if value in ("", "null") else value
+
+# HELPER: flatten a Document dict into {"classification.type": ..., "metadata.title": ...}
+def flatten(document):
+    fields = {}
+    for section in ("classification", "metadata"):
+        for field, value in (document.get(section) or {}).items():
+            fields[f"{section}.{field}"] = normalize(value)
+    return fields
+
+# (pdf path, reference dict) pairs found in a folder, searched recursively
+def findReferences(folder):
+    pairs = []
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            if not filename.lower().endswith(".pdf"):
+                continue
+            name = os.path.splitext(filename)[0]
+            if name.startswith(REVIEW_PREFIX):
+                name = name[len(REVIEW_PREFIX):]
+            json_path = os.path.join(root, f"{name}.json")
+            if os.path.exists(json_path):
+                with open(json_path, "r", encoding = "utf-8") as f:
+                    pairs.append((os.path.join(root, filename), json.load(f)))
+    return pairs
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.analysis_modes", description = "Compare Ollama analysis modes.")
+    parser.add_argument("reference", help = "folder with PDFs and their reviewed JSON files")
+    parser.add_argument("--modes", nargs = "+", choices = ANALYSIS_MODES, default = list(ANALYSIS_MODES))
+    parser.add_argument("--pages", type = int, default = 5, help = "pages parsed per document")
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    pairs = findReferences(args.reference)
+    if not pairs:
+        print(f"No PDF with a matching JSON file found in {args.reference}", file = sys.stderr)
+        return 1
+
+    # parse every document once, so all modes get the same markdown
+    documents = []
+    for filepath, reference in pairs:
+        documents.append((filepath, parseDocument(filepath, (1, args.pages)), flatten(reference)))
+
+    results = {}
+    for mode in args.modes:
+        latencies = []
+        matched = {}
+        compared = {}
+        failures = 0
+        for filepath, markdown, reference in documents:
+            started = time.perf_counter()
+            try:
+                document = analyzeDocument(markdown, os.path.basename(filepath), mode)
+            except Exception as e:
+                failures += 1
+                print(f"[{mode}] {os.path.basename(filepath)} failed: {e}", file = sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+            answer = flatten(document.model_dump())
+            for field, expected in reference.items():
+                compared[field] = compared.get(field, 0) + 1
+                matched[field] = matched.get(field, 0) + (answer.get(field) == expected)
+
+        results[mode] = {
+            "latency": summarize(latencies),
+            "failures": failures,
+            "accuracy": round(sum(matched.values()) / sum(compared.values()), 4) if compared else None,
+            "field_accuracy": {field: round(matched[field] / compared[field], 4) for field in sorted(compared)},
+        }
+
+    print(f"{'mode':<12} {'docs':>5} {'mean s':>8} {'p50 s':>8} {'p95 s':>8} {'accuracy':>9} {'failed':>7}")
+    for mode, result in results.items():
+        latency = result["latency"]
+        accuracy = f"{result['accuracy']:.1%}" if result["accuracy"] is not None else "-"
+        print(f"{mode:<12} {latency['count']:>5} {latency['mean'] or 0:>8.2f} {latency['p50'] or 0:>8.2f} {latency['p95'] or 0:>8.2f} {accuracy:>9} {result['failures']:>7}")
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump({"documents": len(documents), "pages": args.pages, "modes": results}, f, indent = 4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
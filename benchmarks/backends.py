@@ -0,0 +1,108 @@
+# scaling of the analysis over several Ollama servers (scripts.backendPool), with local stub servers
+#   python -m benchmarks.backends [--backends 1 2 4] [--documents 24] [--latency 0.5] [--kill-one]
+# every stub runs one request at a time like a single GPU, so docs/min should grow with the backends;
+# --kill-one stops one stub halfway through each run to check that its requests fail over
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.documentParser import parseTextLayer
+from scripts.aiFunctions import analyzeDocument, ANALYSIS_MODES, TWO_CALL
+from scripts.backendPool import BackendPool
+from benchmarks.common import summarize
+from benchmarks.corpus import generateCorpus
+from benchmarks.stub_ollama import StubOllama
+
+# analyze every document with as many threads as the pool has slots, returns the results dict
+def runPool(documents, stubs, mode, kill_one):
+    pool = BackendPool([(stub.host, 1) for stub in stubs], timeout = 30, health_interval = 1)
+    latencies, failures = [], []
+    done = threading.Semaphore(0)
+
+    def analyze(item):
+        filename, markdown = item
+        started = time.perf_counter()
+        try:
+            analyzeDocument(markdown, filename, mode, pool)
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            failures.append(f"{filename}: {type(e).__name__}: {e}")
+        done.release()
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers = pool.concurrency) as executor:
+            for item in documents:
+                executor.submit(analyze, item)
+            if kill_one and len(stubs) > 1:
+                for _ in range(len(documents) // 2):
+                    done.acquire()
+                stubs[-1].stop()
+    finally:
+        elapsed = time.perf_counter() - started
+        status = pool.status()
+        pool.close()
+
+    return {
+        "backends": len(stubs),
+        "processed": len(latencies),
+        "failed": len(failures),
+        "failures": failures[:10],
+        "seconds": round(elapsed, 3),
+        "docs_per_minute": round(len(latencies) / elapsed * 60, 2) if elapsed > 0 else None,
+        "latency": summarize(latencies),
+        "requests_per_backend": [stub.requests for stub in stubs],
+        "final_status": status,
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.backends", description = "Measure how the analysis scales with Ollama backends.")
+    parser.add_argument("--backends", type = int, nargs = "+", default = [1, 2, 4], help = "numbers of stub servers to compare")
+    parser.add_argument("--documents", type = int, default = 24, help = "documents analyzed per run")
+    parser.add_argument("--latency", type = float, default = 0.5, help = "stub Ollama seconds per chat request")
+    parser.add_argument("--mode", choices = ANALYSIS_MODES, default = TWO_CALL)
+    parser.add_argument("--kill-one", action = "store_true", help = "stop one stub halfway through each run")
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # text-layer documents of every type, parsed once
+    folder = tempfile.mkdtemp(prefix = "smartscanner-backends-")
+    per_type = max(1, -(-args.documents // 7))
+    generateCorpus(folder, per_type = per_type, page_counts = (1,))
+    documents = []
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith("-text.pdf"):
+            documents.append((filename, parseTextLayer(os.path.join(folder, filename), (1, 1))))
+    documents = documents[:args.documents]
+
+    results = []
+    for count in args.backends:
+        stubs = [StubOllama(args.latency, slots = 1).start() for _ in range(count)]
+        try:
+            results.append(runPool(documents, stubs, args.mode, args.kill_one))
+        finally:
+            for stub in stubs:
+                try:
+                    stub.stop()
+                except Exception:
+                    pass
+
+    base = results[0]["docs_per_minute"] / results[0]["backends"] if results and results[0]["docs_per_minute"] else None
+    print(f"{'backends':>8} {'docs/min':>9} {'scaling':>8} {'p50 s':>7} {'failed':>7}  requests per backend")
+    for result in results:
+        scaling = f"{result['docs_per_minute'] / (base * result['backends']):.0%}" if base else "-"
+        print(f"{result['backends']:>8} {result['docs_per_minute']:>9} {scaling:>8} {result['latency']['p50'] or 0:>7.2f} {result['failed']:>7}  {result['requests_per_backend']}")
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump({"documents": len(documents), "mode": args.mode, "kill_one": args.kill_one, "runs": results}, f, indent = 4)
+    return 1 if any(result["failed"] for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
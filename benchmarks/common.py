@@ -0,0 +1,18 @@
+import math
+
+# value below which the given fraction of the samples fall (nearest-rank method)
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+# count, mean, p50 and p95 of a list of durations in seconds
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 4) if samples else None,
+        "p50": round(percentile(samples, 0.50), 4) if samples else None,
+        "p95": round(percentile(samples, 0.95), 4) if samples else None,
+    }
@@ -0,0 +1,159 @@
+# synthetic PDF corpus for the benchmarks: every classification type, several page counts,
+# each one as a born-digital PDF (text layer) and as a scan (image-only pages)
+#   python -m benchmarks.corpus OUTPUT_DIR [--per-type 2] [--pages 1 3 10] [--seed 0]
+# a manifest.json next to the PDFs lists the expected type of each file
+
+import os
+import sys
+import json
+import zlib
+import random
+import argparse
+
+import pypdfium2
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter in points
+LINES_PER_PAGE = 46
+SCAN_DPI = 150
+
+# one title per document type, matching the categories of aiFunctions.CLASSIFY_INSTRUCTIONS
+TEMPLATES = {
+    "ACA": ["Class Schedule for the First Semester", "Course Outline of CMSC 21", "Submission of Final Grades"],
+    "ADM": ["Request for Travel to Manila", "Request for Room Usage", "Research Load Credit Application"],
+    "CRE": ["Terminal Report of the Research Project", "Progress Report of the Extension Program", "Line-Item Budget of the Approved Project"],
+    "FIN": ["Purchase Order for Laboratory Supplies", "Abstract of Price Quotations", "Budget Utilization Request"],
+    "LEG": ["Memorandum of Agreement", "Non-Disclosure Agreement", "Memorandum of Understanding"],
+    "PER": ["Individual Performance Commitment and Review", "Notice of Temporary Appointment", "Daily Time Record"],
+    "SAS": ["Student Assistant Application", "Internship Endorsement Letter", "Student Organization Recognition"],
+}
+NAMES = ["Juan C. Dela Cruz", "May Anne E. Mata", "Gian Paolo D. Plariza Jr.", "Maria Clara S. Santos", "Jose P. Rizal"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+FILLER = (
+    "The office respectfully submits the attached document for the consideration and approval of the committee. "
+    "All supporting papers were reviewed and found complete, and the amounts stated are within the approved budget. "
+    "Kindly acknowledge receipt of this communication and inform the undersigned of any further requirements."
+)
+
+# HELPER: wrap text into lines of at most `width` characters
+def wrap(text, width = 90):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+# text of a synthetic letter, split into pages of LINES_PER_PAGE lines
+def letterPages(doc_type, pages, rng):
+    title = rng.choice(TEMPLATES[doc_type])
+    author = rng.choice(NAMES)
+    lines = [
+        f"{rng.randint(1, 28)} {rng.choice(MONTHS)} {rng.randint(2015, 2025)}",
+        "",
+        "University of the Philippines Mindanao",
+        f"SUBJECT: {title}",
+        "",
+    ]
+    while len(lines) < pages * LINES_PER_PAGE - 4:
+        lines.extend(wrap(FILLER))
+        lines.append("")
+    lines = lines[:pages * LINES_PER_PAGE - 4] + ["", "Sincerely,", author, "Professor"]
+    return [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)]
+
+# HELPER: minimal PDF file from a list of (page dictionary, content stream) and extra objects
+def buildPdf(pages, resources):
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None] # the page tree is filled in once the page numbers are known
+    kids = []
+    for page, stream in pages:
+        kids.append(len(objects) + 1)
+        objects.append(None)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects[kids[-1] - 1] = page % {b"contents": b"%d 0 R" % (kids[-1] + 1)}
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    objects.extend(resources)
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start = 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return output
+
+# born-digital PDF: every line is real text in Helvetica
+def textPdf(page_lines):
+    escape = lambda line: line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    font_number = 3 + 2 * len(page_lines) # right after the pages and their content streams
+    pages = []
+    for lines in page_lines:
+        stream = "BT /F1 11 Tf 60 740 Td 15 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+        pages.append((
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 %d 0 R >> >> /Contents %%(contents)s >>" % (PAGE_WIDTH, PAGE_HEIGHT, font_number),
+            stream.encode("latin-1")
+        ))
+    return buildPdf(pages, [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"])
+
+# scanned PDF: the pages of a born-digital PDF rendered to grayscale images, without any text layer
+def scannedPdf(text_pdf):
+    document = pypdfium2.PdfDocument(text_pdf)
+    images = []
+    try:
+        for page in document:
+            pixels = page.render(scale = SCAN_DPI / 72, grayscale = True).to_numpy()
+            images.append((pixels.shape[1], pixels.shape[0], zlib.compress(pixels.tobytes(), 6)))
+    finally:
+        document.close()
+
+    first_image = 3 + 2 * len(images)
+    pages, resources = [], []
+    for number, (width, height, data) in enumerate(images):
+        pages.append((
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %%(contents)s >>" % (PAGE_WIDTH, PAGE_HEIGHT, first_image + number),
+            b"q %d 0 0 %d 0 0 cm /Im0 Do Q" % (PAGE_WIDTH, PAGE_HEIGHT)
+        ))
+        resources.append(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % (width, height, len(data))
+            + data + b"\nendstream"
+        )
+    return buildPdf(pages, resources)
+
+# write the corpus to `folder`, returns the manifest {filename: {"type", "pages", "text_layer"}}
+def generateCorpus(folder, per_type = 2, page_counts = (1, 3, 10), seed = 0):
+    os.makedirs(folder, exist_ok = True)
+    rng = random.Random(seed)
+    manifest = {}
+    for doc_type in TEMPLATES:
+        for pages in page_counts:
+            for copy in range(per_type):
+                text_pdf = textPdf(letterPages(doc_type, pages, rng))
+                for text_layer, data in ((True, text_pdf), (False, scannedPdf(text_pdf))):
+                    filename = f"{doc_type.lower()}-{pages}p-{copy + 1}-{'text' if text_layer else 'scan'}.pdf"
+                    with open(os.path.join(folder, filename), "wb") as f:
+                        f.write(data)
+                    manifest[filename] = {"type": doc_type, "pages": pages, "text_layer": text_layer}
+
+    with open(os.path.join(folder, "manifest.json"), "w", encoding = "utf-8") as f:
+        json.dump(manifest, f, indent = 4)
+    return manifest
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.corpus", description = "Generate a synthetic PDF corpus.")
+    parser.add_argument("output", help = "folder the PDFs are written to")
+    parser.add_argument("--per-type", type = int, default = 2, help = "documents per type and page count")
+    parser.add_argument("--pages", type = int, nargs = "+", default = [1, 3, 10], help = "page counts to generate")
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    manifest = generateCorpus(args.output, args.per_type, args.pages, args.seed)
+    print(f"{len(manifest)} PDFs written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
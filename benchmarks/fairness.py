@@ -0,0 +1,93 @@
+# fair scheduling across source folders: one department drops a backfill of --backfill files at once while
+# another gets a few same-day files per hour, and a simulated pipeline takes the files from the JobQueue
+# (its real code) one at a time, each taking --page-seconds per page. Compares one shared queue with the
+# weighted fair queue of scripts.sources, in simulated time so it runs in seconds
+#   python -m benchmarks.fairness [--backfill 2000] [--interval 120] [--weights 1 1] [--output fairness.json]
+
+import sys
+import json
+import time
+import random
+import argparse
+
+from benchmarks.common import summarize, percentile
+from scripts.jobQueue import JobQueue
+from scripts.sources import Source, Sources
+
+BACKFILL, SAME_DAY = "backfill", "same-day"
+
+# HELPER: (arrival time, path, pages) of every file, sorted by arrival
+def arrivals(backfill, interval, duration, rng):
+    files = [(0.0, f"/intake/{BACKFILL}/old-{i:05d}.pdf", rng.randint(1, 20)) for i in range(backfill)]
+    for i in range(int(duration // interval)):
+        files.append((i * interval + rng.uniform(0, interval), f"/intake/{SAME_DAY}/new-{i:05d}.pdf", rng.randint(1, 3)))
+    return sorted(files)
+
+# take every file from the queue like the pipeline feeder does, returns the waits per source and the
+# real time spent in put() and get()
+def simulate(files, sources, ordering, page_seconds):
+    job_queue = JobQueue(ordering, sources = sources)
+    arrived, pages = {}, {}
+    waits = {BACKFILL: [], SAME_DAY: []}
+    operations = []
+    now, next_file = 0.0, 0
+    while next_file < len(files) or len(job_queue):
+        if not len(job_queue) and files[next_file][0] > now:
+            now = files[next_file][0] # idle until the next file arrives
+        while next_file < len(files) and files[next_file][0] <= now:
+            arrival, path, count = files[next_file]
+            started = time.perf_counter()
+            job_queue.put(path, cost = count)
+            operations.append(time.perf_counter() - started)
+            arrived[path], pages[path] = arrival, count
+            next_file += 1
+
+        started = time.perf_counter()
+        path = job_queue.get(timeout = 0)
+        operations.append(time.perf_counter() - started)
+        waits[BACKFILL if f"/{BACKFILL}/" in path else SAME_DAY].append(now - arrived[path])
+        now += pages[path] * page_seconds
+    return waits, now, operations
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.fairness", description = "Compare one shared job queue with fair queueing across sources.")
+    parser.add_argument("--backfill", type = int, default = 2000, help = "files dropped at once in the backfill folder")
+    parser.add_argument("--interval", type = float, default = 120, help = "mean seconds between two same-day files")
+    parser.add_argument("--page-seconds", type = float, default = 3.0, help = "simulated processing time per page")
+    parser.add_argument("--weights", type = float, nargs = 2, default = [1, 1], metavar = ("BACKFILL", "SAME_DAY"))
+    parser.add_argument("--order", choices = ("fifo", "sjf"), default = "fifo")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    duration = args.backfill * 10.5 * args.page_seconds # about as long as the backfill takes
+    files = arrivals(args.backfill, args.interval, duration, rng)
+    sources = Sources([
+        Source(BACKFILL, f"/intake/{BACKFILL}", "/filed", args.weights[0]),
+        Source(SAME_DAY, f"/intake/{SAME_DAY}", "/filed", args.weights[1]),
+    ])
+
+    results = {}
+    for name, queue_sources in (("shared", None), ("fair", sources)):
+        waits, finished, operations = simulate(files, queue_sources, args.order, args.page_seconds)
+        results[name] = {
+            "hours": round(finished / 3600, 2),
+            "wait": {source: summarize(samples) for source, samples in waits.items()},
+            "queue_operation_p95_us": round(percentile(operations, 0.95) * 1e6, 2),
+        }
+
+    print(f"{'queue':<7} {'source':<9} {'files':>6} {'p50 wait':>10} {'p95 wait':>10}")
+    for name, result in results.items():
+        for source, wait in result["wait"].items():
+            print(f"{name:<7} {source:<9} {wait['count']:>6} {wait['p50'] / 60:>8.1f} m {wait['p95'] / 60:>8.1f} m")
+    for name, result in results.items():
+        print(f"{name}: all files done after {result['hours']} h, put/get p95 {result['queue_operation_p95_us']} us")
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump({"backfill": args.backfill, "interval": args.interval, "weights": args.weights, "runs": results}, f, indent = 4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
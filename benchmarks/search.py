@@ -0,0 +1,153 @@
+# search index benchmark: files N synthetic JSON sidecars (with CRE metadata) into a destination folder,
+# rebuilds the index from them, then times searches and single-document upserts
+#   python -m benchmarks.search [--documents 100000] [--queries 200] [--output search.json]
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.common import summarize
+from benchmarks.corpus import TEMPLATES
+from scripts.documentIndex import DocumentIndex
+
+WORDS = (
+    "rice yield drought soil banana cacao durian coconut fisheries mangrove watershed biodiversity climate "
+    "nutrition malaria dengue tuberculosis vaccine indigenous mindanao davao cotabato bukidnon policy "
+    "education mathematics physics chemistry algorithm network sensor irrigation livelihood tourism"
+).split()
+SYLLABLES = ["ba", "ka", "da", "ga", "la", "ma", "na", "pa", "ra", "sa", "ta", "bi", "ki", "li", "mi", "ni", "si", "ti", "bo", "ko", "lo", "mo", "no", "to", "bu", "ku", "lu", "mu", "nu", "tu"]
+
+# vocabulary of the abstracts and keywords: the topic words plus made-up words, picked with a skewed
+# (Zipf-like) distribution so a few words are common and most are rare, like real text
+def vocabulary(rng, size = 5000):
+    words = set(WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key = lambda word: (word not in WORDS, word))
+
+# HELPER: a word of the vocabulary, the first ones much more often than the last ones
+def pickWord(words, rng):
+    return words[min(len(words) - 1, int(rng.paretovariate(1.0)) - 1)]
+
+# HELPER: a made-up author name, e.g. "Bakilo M. Tusa", out of about a million
+def authorName(rng):
+    surname = lambda: "".join(rng.choice(SYLLABLES) for _ in range(3)).title()
+    return f"{surname()} {rng.choice('ABCDEFGHIJKLMNOPRSTUV')}. {surname()}"
+
+# JSON dict of a synthetic Document, CRE ones with research metadata
+def syntheticDocument(doc_type, rng, words = WORDS):
+    author = authorName(rng)
+    document = {
+        "classification": {
+            "subject": rng.choice(TEMPLATES[doc_type]) + " " + " ".join(rng.sample(WORDS, 2)).title(),
+            "author": author,
+            "type": doc_type,
+            "year_processed": str(rng.randint(2015, 2025)),
+            "funding": rng.choice(["INT", "EXT"]) if doc_type == "CRE" else None,
+        },
+        "metadata": None,
+    }
+    if doc_type == "CRE":
+        keywords = list(dict.fromkeys(pickWord(words, rng) for _ in range(4)))
+        document["metadata"] = {
+            "title": f"Effects of {pickWord(words, rng)} on {pickWord(words, rng)} in {pickWord(words, rng)}".title(),
+            "authors": [author, authorName(rng), authorName(rng)],
+            "presenting_author": author,
+            "conference": "Mindanao Research Conference",
+            "conference_date": "12 March 2024",
+            "location": "Davao City",
+            "abstract": " ".join(pickWord(words, rng) for _ in range(120)),
+            "keywords": keywords,
+        }
+    return document
+
+# write `count` sidecars into the type folders of `destination` (no PDFs, the index does not need them)
+def fileDocuments(destination, count, seed = 0):
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    types = sorted(TEMPLATES)
+    for doc_type in types:
+        os.makedirs(os.path.join(destination, doc_type), exist_ok = True)
+    for i in range(count):
+        doc_type = types[i % len(types)]
+        with open(os.path.join(destination, doc_type, f"doc-{i:06d}.json"), "w", encoding = "utf-8") as f:
+            json.dump(syntheticDocument(doc_type, rng, words), f)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.search", description = "Benchmark the search index.")
+    parser.add_argument("--documents", type = int, default = 100000)
+    parser.add_argument("--queries", type = int, default = 200)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    destination = tempfile.mkdtemp(prefix = "smartscanner-search-")
+    rng = random.Random(args.seed + 1)
+    words = vocabulary(random.Random(args.seed)) # same vocabulary as the filed documents
+    try:
+        started = time.perf_counter()
+        fileDocuments(destination, args.documents, args.seed)
+        write_seconds = time.perf_counter() - started
+
+        index = DocumentIndex(destination)
+        started = time.perf_counter()
+        index.rebuild(log = lambda message: print(message, file = sys.stderr))
+        rebuild_seconds = time.perf_counter() - started
+
+        # one and two word queries, a name prefix (broad: matches many names), and a query with a type filter; the words are drawn
+        # uniformly from the vocabulary, so both rare words and very common ones are searched
+        queries = []
+        for i in range(args.queries):
+            kind = i % 4
+            if kind == 0:
+                queries.append(rng.choice(words))
+            elif kind == 1:
+                queries.append(" ".join(rng.sample(words, 2)))
+            elif kind == 2:
+                queries.append(authorName(rng).split()[0][:4]) # first letters of a name
+            else:
+                queries.append(f"{rng.choice(words)} type:CRE")
+
+        latencies, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += len(index.search(query, limit = 50))
+            latencies.append(time.perf_counter() - started)
+
+        # what the commit stage pays per document
+        upserts = []
+        for i in range(min(200, args.documents)):
+            document = syntheticDocument("CRE", rng, words)
+            json_path = os.path.join(destination, "CRE", f"new-{i:04d}.json")
+            started = time.perf_counter()
+            index.upsert(document, json_path)
+            upserts.append(time.perf_counter() - started)
+        index.close()
+    finally:
+        shutil.rmtree(destination, ignore_errors = True)
+
+    results = {
+        "documents": args.documents,
+        "write_seconds": round(write_seconds, 3),
+        "rebuild_seconds": round(rebuild_seconds, 3),
+        "search": summarize(latencies),
+        "mean_results": round(hits / len(queries), 1) if queries else 0,
+        "upsert": summarize(upserts),
+    }
+    print(f"rebuild of {args.documents} documents: {rebuild_seconds:.2f} s")
+    for name in ("search", "upsert"):
+        summary = results[name]
+        print(f"{name:<7} {summary['count']:>5} x   p50 {summary['p50'] * 1000:8.2f} ms   p95 {summary['p95'] * 1000:8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump(results, f, indent = 4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
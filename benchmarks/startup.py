@@ -0,0 +1,146 @@
+# cold-start benchmark: time until the main window is shown, and time until the first document is
+# processed by a fresh `scripts.cli batch` process, each measured in new processes
+#   python -m benchmarks.startup [--runs 3] [--load-seconds 5] [--output startup.json] [--baseline before.json]
+# the window is shown off-screen (QT_QPA_PLATFORM=offscreen) unless --visible is given
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.common import summarize
+from benchmarks.corpus import generateCorpus
+from benchmarks.stub_ollama import StubOllama
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the child process: shows the main window like main.py, then prints the seconds since `started`
+WINDOW_SCRIPT = '''
+import sys, time
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
+app = QApplication(sys.argv)
+from mainWindow import MainWindow
+window = MainWindow()
+window.show()
+def shown():
+    print(time.time() - float(sys.argv[1]), flush = True)
+    app.quit()
+QTimer.singleShot(0, shown)
+app.exec()
+'''
+
+# HELPER: environment of the child processes, with its own config folder so the user's settings and cache are not used
+def childEnvironment(config_home, host, visible = False):
+    env = dict(os.environ, OLLAMA_HOST = host, APPDATA = config_home) # APPDATA is read first on every platform
+    if not visible:
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+# seconds from starting `python` to the main window being shown
+def timeToWindow(env):
+    started = time.time()
+    output = subprocess.run(
+        [sys.executable, "-c", WINDOW_SCRIPT, repr(started)], cwd = ROOT, env = env,
+        capture_output = True, text = True, timeout = 300
+    )
+    if output.returncode != 0:
+        raise RuntimeError(f"window did not open: {output.stderr.strip()[-500:]}")
+    return float(output.stdout.strip().splitlines()[-1])
+
+# seconds from starting `python -m scripts.cli batch` to its first result line
+def timeToFirstDocument(env, corpus, workdir):
+    source = os.path.join(workdir, "source")
+    destination = os.path.join(workdir, "destination")
+    shutil.rmtree(source, ignore_errors = True)
+    shutil.rmtree(destination, ignore_errors = True)
+    shutil.copytree(corpus, source, ignore = shutil.ignore_patterns("manifest.json"))
+
+    started = time.time()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "scripts.cli", "batch", source, destination, "--no-cache", "--quiet"],
+        cwd = ROOT, env = env, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True
+    )
+    try:
+        line = process.stdout.readline()
+        elapsed = time.time() - started
+    finally:
+        process.wait(timeout = 300)
+    result = json.loads(line) if line.strip() else {}
+    if result.get("status") != "ok":
+        raise RuntimeError(f"first document failed: {result.get('error', 'no output')}")
+    return elapsed
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.startup", description = "Benchmark time to first window and first document.")
+    parser.add_argument("--runs", type = int, default = 3)
+    parser.add_argument("--scan", action = "store_true", help = "use a scanned page (Docling) as the first document instead of a text-layer one")
+    parser.add_argument("--latency", type = float, default = 0.5, help = "stub Ollama seconds per chat request")
+    parser.add_argument("--load-seconds", type = float, default = 5.0, help = "stub Ollama model loading time, paid by the first request")
+    parser.add_argument("--skip-window", action = "store_true", help = "only measure the first document (e.g. without PySide6)")
+    parser.add_argument("--visible", action = "store_true", help = "show the window on the screen")
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    parser.add_argument("--baseline", help = "results JSON of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix = "smartscanner-startup-")
+    samples = {"window": [], "first_document": []}
+    failures = []
+    try:
+        # a single one-page document, of the requested kind
+        corpus = os.path.join(workdir, "corpus")
+        generateCorpus(corpus, per_type = 1, page_counts = (1,))
+        kind = "scan" if args.scan else "text"
+        for filename in os.listdir(corpus):
+            if filename != "manifest.json" and not filename.startswith(f"fin-1p-1-{kind}"):
+                os.remove(os.path.join(corpus, filename))
+
+        for run in range(args.runs):
+            # a new stub every run, so every run pays the model loading like after a reboot
+            stub = StubOllama(args.latency, load_seconds = args.load_seconds).start()
+            env = childEnvironment(os.path.join(workdir, f"config-{run}"), stub.host, args.visible)
+            try:
+                if not args.skip_window:
+                    samples["window"].append(timeToWindow(env))
+                samples["first_document"].append(timeToFirstDocument(env, corpus, workdir))
+            except Exception as e:
+                failures.append(str(e))
+                print(f"Run {run + 1} failed: {e}", file = sys.stderr)
+            finally:
+                stub.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors = True)
+
+    results = {
+        "runs": args.runs,
+        "failed": len(failures),
+        "failures": failures,
+        "stages": {name: summarize(values) for name, values in samples.items()},
+        "settings": {"scan": args.scan, "stub_latency": args.latency, "stub_load_seconds": args.load_seconds},
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            baseline = json.load(f)
+    print(f"{'measure':<16} {'runs':>5} {'p50 s':>8} {'p95 s':>8}" + (f" {'p50 before':>11}" if baseline else ""))
+    for name, summary in results["stages"].items():
+        if not summary["count"]:
+            continue
+        line = f"{name:<16} {summary['count']:>5} {summary['p50']:>8.3f} {summary['p95']:>8.3f}"
+        before = (baseline or {}).get("stages", {}).get(name) or {}
+        if before.get("p50"):
+            line += f" {before['p50']:>11.3f}"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump(results, f, indent = 4)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# fake Ollama HTTP server for the benchmarks: answers /api/chat with JSON matching the requested
+# schema after a configurable delay, so the pipeline can be timed without a GPU or a model
+#   python -m benchmarks.stub_ollama [--port 11435] [--latency 0.5] [--per-kchar 0.05] [--load-seconds 5]
+# the document type is guessed from the titles used by benchmarks.corpus
+
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.corpus import TEMPLATES
+
+EMBEDDING_SIZE = 64
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+SUBJECT_PATTERN = re.compile(r"SUBJECT:\s*(.+)")
+
+# HELPER: type of a synthetic document from its subject line, None if unknown
+# (the titles also appear as examples in the prompt instructions, so only the subject line is searched)
+def guessType(text):
+    subject = SUBJECT_PATTERN.search(text)
+    if subject is None:
+        return None
+    for doc_type, titles in TEMPLATES.items():
+        if any(title in subject.group(1) for title in titles):
+            return doc_type
+    return None
+
+# HELPER: plausible value for a field, guessed from its name and the prompt
+def fieldValue(name, prompt, doc_type):
+    if name == "type":
+        return doc_type
+    if name == "funding":
+        return "INT" if doc_type == "CRE" else None
+    if name == "year_processed":
+        year = YEAR_PATTERN.search(prompt)
+        return year.group(0) if year else "Unknown"
+    if name == "subject":
+        subject = SUBJECT_PATTERN.search(prompt)
+        return subject.group(1).strip() if subject else "Unknown"
+    if name == "author":
+        return "Dela Cruz JC"
+    return f"stub {name}"
+
+# answer matching a JSON schema (as sent by ollama.chat(format = ...)), with $ref, anyOf and enum support
+def fillSchema(schema, prompt, doc_type, definitions = None, name = None):
+    definitions = definitions if definitions is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fillSchema(definitions[schema["$ref"].split("/")[-1]], prompt, doc_type, definitions, name)
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        if not options or (name == "funding" and doc_type != "CRE") or (name == "metadata" and doc_type != "CRE"):
+            return None
+        return fillSchema(options[0], prompt, doc_type, definitions, name)
+    if "enum" in schema:
+        return doc_type if doc_type in schema["enum"] else schema["enum"][0]
+    if schema.get("type") == "object" or "properties" in schema:
+        return {field: fillSchema(child, prompt, doc_type, definitions, field) for field, child in schema.get("properties", {}).items()}
+    if schema.get("type") == "array":
+        return [f"stub {name}"]
+    if schema.get("type") in ("integer", "number"):
+        return 0
+    return fieldValue(name, prompt, doc_type)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": [{
+                "name": "qwen3:latest", "model": "qwen3:latest", "digest": "stub", "size": 0,
+                "modified_at": "2024-01-01T00:00:00Z", "details": {}
+            }]})
+        elif self.path == "/api/ps":
+            loaded = [{"name": "qwen3:latest", "model": "qwen3:latest", "digest": "stub", "size": 0}] if self.server.loaded else []
+            self.send_json({"models": loaded})
+        elif self.path == "/api/version":
+            self.send_json({"version": "0.0.0-stub"})
+        else:
+            self.send_json({})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        # the first request loads the model, like a real server after a restart
+        with server.load_lock:
+            if not server.loaded:
+                time.sleep(server.load_seconds)
+                server.loaded = True
+
+        if self.path == "/api/generate": # preload request without a prompt
+            self.send_json({"model": request.get("model"), "created_at": "2024-01-01T00:00:00Z", "response": "", "done": True})
+            return
+
+        if self.path == "/api/embed":
+            inputs = request.get("input")
+            inputs = inputs if isinstance(inputs, list) else [inputs or ""]
+            self.send_json({"model": request.get("model"), "embeddings": [embedding(text) for text in inputs]})
+            return
+
+        prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+        started = time.perf_counter()
+        with server.slots: # like OLLAMA_NUM_PARALLEL, extra requests wait for a free slot
+            time.sleep(server.latency + server.per_kchar * len(prompt) / 1000) # prompt processing grows with its length
+
+        schema = request.get("format")
+        doc_type = guessType(prompt) or "ADM"
+        answer = fillSchema(schema, prompt, doc_type) if isinstance(schema, dict) else {}
+        content = json.dumps(answer)
+        duration = int((time.perf_counter() - started) * 1e9)
+        self.send_json({
+            "model": request.get("model"),
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": duration,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": duration // 2,
+            "eval_count": len(content) // 4,
+            "eval_duration": duration // 2,
+        })
+
+# HELPER: deterministic unit vector of a text, similar texts do not get similar vectors
+def embedding(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    values = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(EMBEDDING_SIZE)]
+    norm = sum(value * value for value in values) ** 0.5
+    return [value / norm for value in values]
+
+# stub server running in a background thread, port 0 picks a free port
+class StubOllama:
+    def __init__(self, latency = 0.5, per_kchar = 0.0, port = 0, load_seconds = 0.0, slots = 4):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency       # seconds added to every chat request
+        self.server.per_kchar = per_kchar   # extra seconds per 1000 characters of prompt
+        self.server.load_seconds = load_seconds # paid once by the first request
+        self.server.loaded = False
+        self.server.load_lock = threading.Lock()
+        self.server.slots = threading.Semaphore(slots) # chat requests processed at the same time
+        self.server.requests = 0
+        self.server.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def host(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def start(self):
+        self.thread = threading.Thread(target = self.server.serve_forever, name = "stub-ollama", daemon = True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.stub_ollama", description = "Run a fake Ollama server.")
+    parser.add_argument("--port", type = int, default = 11435)
+    parser.add_argument("--latency", type = float, default = 0.5, help = "seconds per chat request")
+    parser.add_argument("--per-kchar", type = float, default = 0.0, help = "extra seconds per 1000 prompt characters")
+    parser.add_argument("--load-seconds", type = float, default = 0.0, help = "model loading time paid by the first request")
+    parser.add_argument("--slots", type = int, default = 4, help = "chat requests processed at the same time")
+    args = parser.parse_args(argv)
+
+    stub = StubOllama(args.latency, args.per_kchar, args.port, args.load_seconds, args.slots)
+    print(f"Stub Ollama listening on {stub.host}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
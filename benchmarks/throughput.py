@@ -0,0 +1,191 @@
+# end-to-end benchmark of parse -> analyze -> commit on a synthetic corpus, against a stub Ollama server
+#   python -m benchmarks.throughput [--per-type 2] [--pages 1 3 10] [--latency 0.5] [--output results.json]
+#   python -m benchmarks.throughput --baseline before.json --output after.json    compare with an earlier run
+# documents go through the real parseDocumentWithRoute, analyzeDocument and commit functions one at a time,
+# so the per-stage latencies are not mixed with queueing; pass --host to use a real Ollama server instead
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import ollama
+
+from scripts.documentParser import parseDocumentWithRoute, warmUpConverter, shutdownConverter, PAGE_RANGE
+from scripts.aiFunctions import analyzeDocument, ANALYSIS_MODES, TWO_CALL
+from scripts.fileFunctions import getNewFilename, reserveDestination, commitDocument, DEFAULT_SETTINGS
+from scripts import metrics
+from scripts.workerPool import peakRssMb
+from benchmarks.common import summarize
+from benchmarks.corpus import generateCorpus
+from benchmarks.stub_ollama import StubOllama
+
+STAGES = ("parse", "parse.text-layer", "parse.docling", "analyze", "commit", "total")
+
+# HELPER: git revision of the code being measured, None outside a checkout
+def gitRevision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True,
+            cwd = os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# run every document of `source` through the three stages, returns the results dict
+def runBenchmark(source, destination, manifest, client, mode = TWO_CALL, page_range = PAGE_RANGE, fast_path = True, budget = 0):
+    samples = {stage: [] for stage in STAGES}
+    failures = []
+    correct = 0
+    tokens_before = tokens_after = 0
+
+    started = time.perf_counter()
+    for filename in sorted(manifest):
+        filepath = os.path.join(source, filename)
+        try:
+            t0 = time.perf_counter()
+            markdown, route = parseDocumentWithRoute(filepath, page_range, fast_path)
+            t1 = time.perf_counter()
+            timing = metrics.newTiming()
+            metrics.activate(timing) # collects the compaction stats
+            try:
+                document = analyzeDocument(markdown, filename, mode, client, budget)
+            finally:
+                metrics.deactivate()
+            t2 = time.perf_counter()
+            name, doc_type = getNewFilename(document)
+            pdf_destination, json_destination = reserveDestination(os.path.join(destination, doc_type), name, ".pdf")
+            commitDocument(document, filepath, pdf_destination, json_destination)
+            t3 = time.perf_counter()
+        except Exception as e:
+            failures.append({"file": filename, "error": f"{type(e).__name__}: {e}"})
+            print(f"{filename} failed: {e}", file = sys.stderr)
+            continue
+
+        samples["parse"].append(t1 - t0)
+        samples[f"parse.{route}"].append(t1 - t0)
+        samples["analyze"].append(t2 - t1)
+        samples["commit"].append(t3 - t2)
+        samples["total"].append(t3 - t0)
+        correct += doc_type.upper() == manifest[filename]["type"]
+        compaction = timing.get("compaction") or {}
+        tokens_before += compaction.get("tokens_before", 0)
+        tokens_after += compaction.get("tokens_after", 0)
+    elapsed = time.perf_counter() - started
+
+    processed = len(samples["total"])
+    return {
+        "documents": len(manifest),
+        "processed": processed,
+        "failed": len(failures),
+        "seconds": round(elapsed, 3),
+        "docs_per_minute": round(processed / elapsed * 60, 2) if elapsed > 0 else None,
+        "type_accuracy": round(correct / processed, 4) if processed else None,
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+        "prompt_tokens": {"before": tokens_before, "after": tokens_after, "saved": tokens_before - tokens_after},
+        "failures": failures,
+    }
+
+# print the p50/p95 of each stage, next to the baseline run if one is given
+def printReport(results, baseline = None):
+    print(f"{'stage':<18} {'count':>6} {'p50 s':>9} {'p95 s':>9}" + (f" {'p50 before':>11} {'change':>8}" if baseline else ""))
+    for stage, summary in results["stages"].items():
+        if not summary["count"]:
+            continue
+        line = f"{stage:<18} {summary['count']:>6} {summary['p50']:>9.4f} {summary['p95']:>9.4f}"
+        before = (baseline or {}).get("stages", {}).get(stage) or {}
+        if baseline and before.get("p50"):
+            line += f" {before['p50']:>11.4f} {(summary['p50'] - before['p50']) / before['p50']:>+8.1%}"
+        print(line)
+
+    line = f"{results['docs_per_minute']} docs/min, peak RSS {results['peak_rss_mb']} MB, {results['failed']} failed"
+    tokens = results.get("prompt_tokens") or {}
+    if tokens.get("before"):
+        line += f", {tokens['saved']} of {tokens['before']} prompt tokens saved"
+    if baseline:
+        line += f" (before: {baseline.get('docs_per_minute')} docs/min, {baseline.get('peak_rss_mb')} MB)"
+    print(line)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks.throughput", description = "Benchmark the processing stages on a synthetic corpus.")
+    parser.add_argument("--corpus", help = "existing corpus folder (from benchmarks.corpus), generated in a temp folder if omitted")
+    parser.add_argument("--per-type", type = int, default = 2, help = "documents per type and page count")
+    parser.add_argument("--pages", type = int, nargs = "+", default = [1, 3, 10], help = "page counts to generate")
+    parser.add_argument("--parse-pages", type = int, default = PAGE_RANGE[1], help = "pages parsed per document")
+    parser.add_argument("--mode", choices = ANALYSIS_MODES, default = TWO_CALL)
+    parser.add_argument("--budget", type = int, default = DEFAULT_SETTINGS["prompt_token_budget"], help = "prompt_token_budget, 0 sends whole documents")
+    parser.add_argument("--no-fast-path", action = "store_true", help = "send every document through Docling")
+    parser.add_argument("--latency", type = float, default = 0.5, help = "stub Ollama seconds per chat request")
+    parser.add_argument("--per-kchar", type = float, default = 0.02, help = "stub Ollama extra seconds per 1000 prompt characters")
+    parser.add_argument("--host", help = "use this Ollama server instead of the stub")
+    parser.add_argument("--output", help = "save the results as JSON to this file")
+    parser.add_argument("--baseline", help = "results JSON of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix = "smartscanner-bench-")
+    stub = None
+    try:
+        # the corpus is copied, committing moves the PDFs out of the source folder
+        source = os.path.join(workdir, "source")
+        if args.corpus:
+            shutil.copytree(args.corpus, source)
+        else:
+            generateCorpus(source, args.per_type, args.pages)
+        with open(os.path.join(source, "manifest.json"), "r", encoding = "utf-8") as f:
+            manifest = json.load(f)
+
+        if args.host:
+            host = args.host
+        else:
+            stub = StubOllama(args.latency, args.per_kchar).start()
+            host = stub.host
+
+        # model loading is measured on its own, not as part of the first document
+        warm_up_started = time.perf_counter()
+        warmUpConverter(1).join()
+        warm_up = time.perf_counter() - warm_up_started
+
+        results = runBenchmark(
+            source, os.path.join(workdir, "destination"), manifest, ollama.Client(host = host),
+            args.mode, (1, args.parse_pages), not args.no_fast_path, args.budget
+        )
+        results["warm_up_seconds"] = round(warm_up, 3)
+        results["peak_rss_mb"] = peakRssMb()
+        results["settings"] = {
+            "mode": args.mode,
+            "budget": args.budget,
+            "parse_pages": args.parse_pages,
+            "fast_path": not args.no_fast_path,
+            "ollama": args.host or {"stub_latency": args.latency, "stub_per_kchar": args.per_kchar},
+            "corpus": args.corpus or {"per_type": args.per_type, "pages": args.pages},
+        }
+        results["environment"] = {
+            "revision": gitRevision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        }
+    finally:
+        if stub is not None:
+            stub.stop()
+        shutdownConverter()
+        shutil.rmtree(workdir, ignore_errors = True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as f:
+            baseline = json.load(f)
+    printReport(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump(results, f, indent = 4)
+    return 1 if results["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
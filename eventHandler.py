@@ -1,38 +1,168 @@
 import os
+import time
+import threading
 from watchdog.events import FileSystemEventHandler
 
-file_stack = [] # note: This could be moved to a shared module if needed
-stack_lock = None # will be passed into the handler to ensure thread-safe access
-
 class MyEventHandler(FileSystemEventHandler):
-    def __init__(self, source_folder, main_window, stack, lock):
+    def __init__(self, source_folder, main_window, job_queue, quiet_period = 2.0, poll_interval = 0.5, max_wait = 300):
         super().__init__()
         self.source_folder = source_folder          # folder being monitored
         self.main_window = main_window              # reference to the GUI's main window (for terminal printing)
         self.allowed_extensions = {'.pdf'}          # supported file types
-        self.file_stack = stack                     # reference to the shared file stack
-        self.stack_lock = lock                      # lock to prevent race conditions on the stack
+        self.job_queue = job_queue                  # reference to the shared, thread-safe job queue
+        self.quiet_period = quiet_period            # seconds a file's size and mtime must stay unchanged before it is queued
+        self.poll_interval = poll_interval          # seconds between two checks of the pending files
+        self.max_wait = max_wait                    # seconds after which a file that never became complete is queued anyway, or dropped if empty
+
+        # files seen but maybe still being written: path -> [size, mtime, time of last change, closed after writing,
+        # time first seen, stalled]. Stalled files stopped changing but can't be queued yet (empty, or locked by
+        # another program). Repeated events for the same path only update its entry, so a burst of events is coalesced
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.running = False
+        self.thread = None
 
     def is_valid_file(self, filepath):
         _, ext = os.path.splitext(filepath) # check if the file has a supported extension
         return ext.lower() in self.allowed_extensions
 
+    # start checking the pending files in the background
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target = self.run_stabilizer, name = "stabilizer", daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    # track the PDFs already in the source folder, returns how many were found
+    def scan(self, recursive = False):
+        found = 0
+        for root, folders, files in os.walk(self.source_folder):
+            for filename in sorted(files):
+                if self.track(os.path.join(root, filename)):
+                    found += 1
+            if not recursive:
+                break
+        return found
+
+    # check if some files are still waiting to finish being written; stalled ones (empty or locked files that
+    # stopped changing) are not counted, they may stay that way until max_wait
+    def has_pending(self):
+        with self.pending_lock:
+            return any(not entry[5] for entry in self.pending.values())
+
+    # files that stopped changing but could not be queued yet, e.g. left empty by a failed scan
+    def stalled(self):
+        with self.pending_lock:
+            return [filepath for filepath, entry in self.pending.items() if entry[5]]
+
+    # remember a file until it has finished being written, returns False if it is not a PDF
+    def track(self, filepath, closed = False):
+        if not self.is_valid_file(filepath):
+            return False
+        with self.pending_lock:
+            entry = self.pending.get(filepath)
+            if entry is None:
+                now = time.time()
+                self.pending[filepath] = [None, None, now, closed, now, False]
+            elif closed:
+                entry[3] = True
+        return True
+
+    # HELPER: check if a file can be opened for reading (Windows locks files that are still being copied)
+    def can_open(self, filepath):
+        try:
+            with open(filepath, "rb"):
+                return True
+        except OSError:
+            return False
+
+    # queue the pending files whose size and mtime stopped changing, logging once per batch; after max_wait
+    # a file is queued even if it is still changing or locked (the pipeline retries or quarantines it), and
+    # an empty one is dropped
+    def check_pending(self):
+        now = time.time()
+        ready, empty = [], []
+        with self.pending_lock:
+            for filepath, entry in list(self.pending.items()):
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    del self.pending[filepath] # deleted or moved away before it was complete
+                    continue
+
+                size, mtime, changed, closed, seen, _ = entry
+                expired = now - seen >= self.max_wait
+                if (stat.st_size, stat.st_mtime) != (size, mtime):
+                    entry[0], entry[1], entry[2], entry[5] = stat.st_size, stat.st_mtime, now, False
+                    if not closed and not expired:
+                        continue
+
+                # written and closed (inotify) or unchanged for the quiet period
+                quiet = closed or now - entry[2] >= self.quiet_period
+                if stat.st_size > 0 and (quiet or expired):
+                    ready.append((filepath, entry))
+                    del self.pending[filepath]
+                elif stat.st_size == 0 and expired:
+                    empty.append(filepath)
+                    del self.pending[filepath]
+                elif quiet:
+                    entry[5] = True # empty for the whole quiet period, e.g. a scan that failed
+
+        added = []
+        for filepath, entry in ready:
+            if not self.can_open(filepath) and now - entry[4] < self.max_wait:
+                with self.pending_lock:
+                    entry[5] = True
+                    self.pending.setdefault(filepath, entry) # still locked by the program writing it, check again later
+            elif self.job_queue.put(filepath):
+                added.append(filepath)
+        if len(added) == 1:
+            self.main_window.append_to_terminal(f"New file detected: <i>{os.path.splitext(os.path.basename(added[0]))[0]}</i>. Added to queue.")
+        elif added:
+            self.main_window.append_to_terminal(f"{len(added)} new files detected and added to queue.")
+        for filepath in empty:
+            print(f"{filepath} is still empty after {self.max_wait} seconds, ignored")
+            self.main_window.append_to_terminal(f"<b><i>{os.path.basename(filepath)}</i> is still empty after {self.max_wait:.0f} seconds, it was not queued.</b>")
+
+    def run_stabilizer(self):
+        while self.running:
+            self.check_pending()
+            time.sleep(self.poll_interval)
+
     # this function is triggered when a file is created in the source folder
     def on_created(self, event):
-        if not event.is_directory and self.is_valid_file(event.src_path):
-            with self.stack_lock:
-                self.file_stack.insert(0, event.src_path)
-                self.main_window.append_to_terminal(f"New file detected: <i>{os.path.splitext(os.path.basename(event.src_path))[0]}</i>. Added to queue.")
-                print(f"on created {self.file_stack}")
-        else:
+        if event.is_directory or not self.track(event.src_path):
             print("file not supported")
 
+    # triggered while a file is being written, keeps it pending until it is quiet
+    def on_modified(self, event):
+        if not event.is_directory:
+            with self.pending_lock:
+                entry = self.pending.get(event.src_path)
+                if entry is not None:
+                    entry[2] = time.time()
+
+    # triggered when a file that was opened for writing is closed (inotify on Linux only)
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.track(event.src_path, closed = True)
+
     # triggered when a file is moved/renamed within the source folder
     def on_moved(self, event):
-        if not event.is_directory and self.is_valid_file(event.dest_path):
-            with self.stack_lock:
-                self.file_stack.insert(0, event.dest_path)
-                self.main_window.append_to_terminal(f"New file detected: <i>{os.path.splitext(os.path.basename(event.dest_path))[0]}</i>. Added to queue.")
-                print(f"on moved {self.file_stack}")
-        else:
-            print("file not supported")
\ No newline at end of file
+        if event.is_directory:
+            return
+        with self.pending_lock:
+            entry = self.pending.pop(event.src_path, None)
+        self.job_queue.remove(event.src_path) # renamed while queued, keep only the new name
+        if self.track(event.dest_path, closed = entry is None):
+            return
+        print("file not supported")
+
+    # triggered when a file is deleted before it was processed
+    def on_deleted(self, event):
+        if not event.is_directory:
+            with self.pending_lock:
+                self.pending.pop(event.src_path, None)
+            self.job_queue.remove(event.src_path)
@@ -1,8 +1,10 @@
 import sys
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from mainWindow import MainWindow
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # needed by the parser processes in the PyInstaller build
     app = QApplication(sys.argv)
     window = MainWindow()
     window.resize(800, 600) # set initial window size to 800x600px
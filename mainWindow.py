@@ -1,46 +1,47 @@
 # standard lib imports
 import os
-import re
 import time
 import threading
-from datetime import datetime
 
 # PySide6 imports for GUI
-from PySide6 import QtGui
-from PySide6.QtCore import Signal
+from PySide6.QtCore import Signal, QTimer, QUrl, Qt
+from PySide6.QtGui import QDesktopServices
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton,
-    QLabel, QFileDialog, QTextEdit
+    QLabel, QFileDialog, QListView, QLineEdit
 )
 
 # watchdog for file monitoring
 from watchdog.observers import Observer
 
-# custom modules
-from scripts.documentParser import parseDocument
+# custom modules, the processing modules (Docling, Ollama) are imported by the warm-up thread so the window opens right away
 from scripts.fileFunctions import (
-    getFilename, writeToMarkdown, writeToJSON, loadConfig,
-    saveSource, saveDestination, sanitizeFilename, renameFile,
-    moveDocument, moveJSON
+    loadConfig, saveSource, saveDestination, getSetting, CONFIG_PATH
 )
-from scripts.aiFunctions import analyzeDocument
+from scripts.jobQueue import JobQueue
+from scripts.sources import loadSources
+from scripts.warmUp import startWarmUp, READY
+from scripts.documentIndex import DocumentIndex
 from eventHandler import MyEventHandler
+from viewModels import LogModel, QueueModel, SearchModel, createFileLogger
 
-# shared stack and lock for thread-safe file queue
-file_stack = []
-stack_lock = threading.Lock()
+CLOSE_TIMEOUT = 30 # seconds the window waits on close for the files being processed to finish
 
 # main application window
 class MainWindow(QMainWindow):
-    
-    # signals for thread-safe queue GUI updates
-    clearQueueSignal = Signal()
-    appendQueueSignal = Signal(str)
+
+    # signal for thread-safe updates of the readiness indicator
+    readinessSignal = Signal(str)
+    # emitted by the queue processing thread once the pipeline runs (True) or could not be built (False)
+    startedSignal = Signal(bool)
+    # emitted by the stopping thread once the pipeline has finished
+    stoppedSignal = Signal()
 
     def __init__(self):
         super().__init__()
-        self.clearQueueSignal.connect(self.clear_queue)
-        self.appendQueueSignal.connect(self.append_to_queue)
+        self.readinessSignal.connect(self.show_readiness)
+        self.startedSignal.connect(self.monitoring_started)
+        self.stoppedSignal.connect(self.monitoring_stopped)
 
         # window title
         self.setWindowTitle("UPMIN OR Smart Scanner")
@@ -49,33 +50,64 @@ class MainWindow(QMainWindow):
         config = loadConfig()
         self.selectedSrc = config.get("source_path")
         self.selectedDir = config.get("destination_path")
+        self.multiple_sources = bool(getSetting(config, "sources")) # several intake folders, set in config.json
 
         # variables for watchdog and bg threads
         self.observer = None
         self.observer_thread = None
         self.mover_thread = None
+        self.stop_thread = None
+        self.job_queue = None
+        self.pipeline = None
         self.monitoring = False
+        self.search_indexes = {} # destination folder -> DocumentIndex, opened on the first search
 
         # UI SETUP
         centralWidget = QWidget()
         self.setCentralWidget(centralWidget)
 
-        # terminal
+        # terminal: only the last log_scrollback messages are kept, the full history goes to smartscanner.log
+        file_logger = createFileLogger(getSetting(config, "log_file_max_mb"), getSetting(config, "log_file_backups"))
+        self.log_model = LogModel(getSetting(config, "log_scrollback"), file_logger, self)
         self.terminalWrapper = QVBoxLayout()
         self.terminal_label = QLabel("Terminal")
-        self.terminal = QTextEdit()
-        self.terminal.setReadOnly(True)
+        self.terminal = QListView()
+        self.terminal.setModel(self.log_model)
+        self.terminal.setUniformItemSizes(True)
+        self.terminal.setWordWrap(False)
         self.terminalWrapper.addWidget(self.terminal_label)
         self.terminalWrapper.addWidget(self.terminal)
 
         # queue
         self.queueWrapper = QVBoxLayout()
         self.queue_label = QLabel("Queue")
-        self.queue = QTextEdit()
-        self.queue.setReadOnly(True)
+        self.queue_model = QueueModel(self)
+        self.queue = QListView()
+        self.queue.setModel(self.queue_model)
+        self.queue.setUniformItemSizes(True)
         self.queueWrapper.addWidget(self.queue_label)
         self.queueWrapper.addWidget(self.queue)
 
+        # search of the filed documents, under the queue; double-click opens the PDF
+        self.search_label = QLabel("Search")
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('words, "phrase", type:CRE, year:2024')
+        self.search_model = SearchModel(self)
+        self.search_results = QListView()
+        self.search_results.setModel(self.search_model)
+        self.search_results.setUniformItemSizes(True)
+        self.search_results.doubleClicked.connect(self.open_search_result)
+        self.queueWrapper.addWidget(self.search_label)
+        self.queueWrapper.addWidget(self.search_input)
+        self.queueWrapper.addWidget(self.search_results)
+
+        # search once the user stops typing for a moment
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+
         # top layer of app: terminal 5/7, queue 2/7
         topLayout = QHBoxLayout()
         topLayout.addLayout(self.terminalWrapper, 5)
@@ -99,16 +131,33 @@ class MainWindow(QMainWindow):
         self.destinationWrapper.addWidget(self.labeldst)
         self.destinationWrapper.addWidget(self.buttonDst)
 
-        # run/stop button
+        # the folders of the "sources" list of config.json replace the two pickers
+        if self.multiple_sources:
+            try:
+                sources = loadSources(config)
+                self.labelsrc.setText("Source Folders: " + ", ".join(f"{source.name} ({source.source_path})" for source in sources))
+                self.labeldst.setText("Destination Folders: " + ", ".join(sources.destinations()))
+            except ValueError as e:
+                self.labelsrc.setText(f"Invalid sources in config.json: {e}")
+            for button in (self.buttonSrc, self.buttonDst):
+                button.setEnabled(False)
+                button.setToolTip(f"The folders are set in the sources list of {CONFIG_PATH}")
+
+        # run/stop button, with the readiness of the models under it
+        self.runWrapper = QVBoxLayout()
         self.buttonRun = QPushButton("Run")
         self.buttonRun.setFixedSize(60, 40)
         self.buttonRun.clicked.connect(self.toggle_monitoring)
+        self.readiness_label = QLabel("Starting...")
+        self.readiness_label.setWordWrap(True)
+        self.runWrapper.addWidget(self.buttonRun)
+        self.runWrapper.addWidget(self.readiness_label)
 
         # bottom layer of app
         bottomLayout = QHBoxLayout()
         bottomLayout.addLayout(self.sourceWrapper)
         bottomLayout.addLayout(self.destinationWrapper)
-        bottomLayout.addWidget(self.buttonRun)
+        bottomLayout.addLayout(self.runWrapper)
 
         # putting together top and bottom layouts
         layout = QVBoxLayout()
@@ -118,6 +167,14 @@ class MainWindow(QMainWindow):
         centralWidget.setLayout(layout)
         self.setCentralWidget(centralWidget)
 
+        # background threads only append to the models, the panels are updated in batches from the GUI thread
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_panels)
+        self.refresh_timer.start(100)
+
+        # load the processing modules and models once the window is shown, files can be queued in the meantime
+        QTimer.singleShot(0, lambda: startWarmUp(config, self.readinessSignal.emit))
+
     # HELPER: check if file is a supported doc, e.g. .pdf (change soon)
     def is_valid_file(self, filepath):
         _, ext = os.path.splitext(filepath)
@@ -143,6 +200,7 @@ class MainWindow(QMainWindow):
             self.labeldst.setText(f"Destination Folder: {selected}")
             self.append_to_terminal(f"Destination directory set and saved to {selected}")
             saveDestination(self.selectedDir)
+            self.close_search_indexes()
         else:
             self.labeldst.setText("No directory selected.")
             self.append_to_terminal(f"Destination directory set to none")
@@ -153,149 +211,248 @@ class MainWindow(QMainWindow):
             self.append_to_terminal("<b>File monitoring starting.</b>")
             self.start_observer()
         else:
-            self.append_to_terminal("<b>File monitoring stopped. File currently processed will continue processing.</b>")
+            self.append_to_terminal("<b>File monitoring stopped. Files currently being parsed or moved will continue processing, pending Ollama requests are cancelled.</b>")
             self.stop_observer()
 
-    # adding text to pseudoterminal panel with timestamp
+    # adding text to pseudoterminal panel with timestamp, safe to call from any thread
     def append_to_terminal(self, text: str):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.terminal.append(f"<b></b><i></i>[{timestamp}] {text}")
-        self.terminal.moveCursor(QtGui.QTextCursor.End)
-
-    # adding text to queue panel
-    def append_to_queue(self, text: str):
-        self.queue.append(text)
-
-    # delete content in queue panel
-    def clear_queue(self):
-        self.queue.clear()
+        self.log_model.append(text)
+
+    # readiness indicator, updated from the warm-up thread through readinessSignal
+    def show_readiness(self, state):
+        self.readiness_label.setText(state)
+        self.readiness_label.setStyleSheet("color: green;" if state == READY else "")
+        if state != READY and not state.endswith("..."):
+            self.append_to_terminal(f"<b>{state}</b>")
+
+    # insert the messages and queue changes received since the last refresh
+    def refresh_panels(self):
+        scrollbar = self.terminal.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum() # only follow new messages if the user has not scrolled up
+        if self.log_model.flush() and at_bottom:
+            self.terminal.scrollToBottom()
+        self.queue_model.flush()
+
+    # HELPER: destination folders searched, the ones of every source
+    def search_destinations(self):
+        if not self.multiple_sources:
+            return [self.selectedDir] if self.selectedDir else []
+        try:
+            return loadSources(loadConfig()).destinations()
+        except ValueError:
+            return []
+
+    # search the indexes of the destination folders for the text in the search box, best matches first
+    def run_search(self):
+        text = self.search_input.text().strip()
+        destinations = [destination for destination in self.search_destinations() if os.path.isdir(destination)]
+        if not text or not destinations:
+            self.search_model.set_results([])
+            return
+
+        started = time.perf_counter()
+        results = []
+        for destination in destinations:
+            index = self.search_indexes.get(destination)
+            if index is None:
+                try:
+                    index = self.search_indexes[destination] = DocumentIndex(destination)
+                except Exception as e:
+                    self.append_to_terminal(f"<b>Could not open the search index of {destination}: {e}</b>")
+                    continue
+                if not index.is_built():
+                    self.build_search_index(destination) # documents filed before the index existed
+            results.extend(index.search(text, limit = 200))
+        results = sorted(results, key = lambda result: result["rank"])[:200]
+        self.search_model.set_results(results)
+        self.search_label.setText(f"Search: {len(results)} result(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    # fill the index from the JSON files already in a destination, in the background (own connection,
+    # searches still work meanwhile and see the documents once the rebuild is committed)
+    def build_search_index(self, destination):
+        def build():
+            self.append_to_terminal(f"Building the search index of {destination}...")
+            index = DocumentIndex(destination)
+            try:
+                index.rebuild(log = self.append_to_terminal)
+            except Exception as e:
+                self.append_to_terminal(f"<b>Could not build the search index: {e}</b>")
+            finally:
+                index.close()
+        threading.Thread(target = build, name = "search-index", daemon = True).start()
+
+    # HELPER: the destination changed or the window is closing, the index is opened again on the next search
+    def close_search_indexes(self):
+        for index in self.search_indexes.values():
+            index.close()
+        self.search_indexes = {}
+        self.search_model.set_results([])
+
+    # open a search result (the PDF, or its JSON file when the PDF is gone) with the default application
+    def open_search_result(self, index):
+        path = self.search_model.data(index, Qt.UserRole)
+        if path and os.path.exists(path):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+        else:
+            self.append_to_terminal(f"{path} no longer exists, rebuild the search index with <i>python -m scripts.cli build-index</i>.")
 
     # start watchdog observer and queue processor thread
     def start_observer(self):
         print("Starting observer and stack mover...")
         self.monitoring = True
         self.buttonRun.setText("Stop")
-
-        # scan directory and add preexisting files to queue
-        for filename in os.listdir(self.selectedSrc):
-            full_path = os.path.join(self.selectedSrc, filename)
-            if os.path.isfile(full_path) and self.is_valid_file(full_path):
-                with stack_lock:
-                    if full_path not in file_stack:
-                        file_stack.append(full_path)
-                        self.append_to_terminal(f"Initial file detected: <i>{os.path.splitext(os.path.basename(full_path))[0]}</i>. Added to queue.")
-                    else:
-                        print(f"{full_path} already in queue. Skipping.")
-            else:
-                print(f"{full_path} not supported or is not a file.")
-        
-        print(file_stack)
-
-        # watchdog folder monitoring
+        self.buttonRun.setEnabled(False) # until the pipeline runs
+        config = loadConfig()
+        try:
+            sources = loadSources(config)
+        except ValueError as e:
+            self.append_to_terminal(f"<b>Invalid sources in config.json: {e}</b>")
+            self.stop_observer()
+            return
+        startWarmUp(config, self.readinessSignal.emit) # models are reloaded if monitoring was stopped before
+
+        # queue shared by the event handlers and the worker, the panel mirrors its changes;
+        # with several sources the files are taken from each one in turn according to their weights
+        self.queue_model.clear()
+        self.job_queue = JobQueue(getSetting(config, "queue_order"), on_change = self.queue_changed, sources = sources)
+
+        # files are only queued once they have finished being written, bursts of events are coalesced
+        recursive = getSetting(config, "recursive_watch")
+        event_handlers = []
+        for source in sources:
+            if not source.source_path or not os.path.isdir(source.source_path):
+                self.append_to_terminal(f"<b>Source folder {source.source_path} ({source.name}) does not exist, it is not watched.</b>")
+                continue
+            event_handler = MyEventHandler(
+                source.source_path, self, self.job_queue, quiet_period = getSetting(config, "quiet_period"), max_wait = getSetting(config, "pending_max_wait")
+            )
+
+            # scan directory and add preexisting files to queue
+            found = event_handler.scan(recursive)
+            where = f" in {source.name}" if len(sources) > 1 else ""
+            self.append_to_terminal(f"{found} initial file(s) detected{where}. They will be added to the queue once they are complete.")
+            event_handler.start()
+            event_handlers.append(event_handler)
+
+        # watchdog folder monitoring, one observer watches every source folder
         def run_observer():
-            event_handler = MyEventHandler(self.selectedSrc, self, file_stack, stack_lock)
             self.observer = Observer()
-            self.observer.schedule(event_handler, self.selectedSrc, recursive=False)
+            for event_handler in event_handlers:
+                self.observer.schedule(event_handler, event_handler.source_folder, recursive = recursive)
+                print(f"Watching folder: {event_handler.source_folder}")
             self.observer.start()
-            print(f"Watching folder: {self.selectedSrc}")
             try:
                 while self.monitoring:
                     time.sleep(1)
             finally:
+                for event_handler in event_handlers:
+                    event_handler.stop()
                 self.observer.stop()
                 self.observer.join()
                 print("Observer stopped.")
 
-        
         self.observer_thread = threading.Thread(target = run_observer, daemon = True)
         self.observer_thread.start()
 
-        # MAIN: queue processing
+        # MAIN: queue processing, files are fed into a parse -> analyze -> commit pipeline. It is built in this
+        # thread, not the GUI one: importing Docling, checking the Ollama servers and opening the caches take a while
         def move_files():
-            queue_was_empty = False # flag for empty queue
+            job_queue = self.job_queue
+
+            # the Docling models load in the background while the queue is being built; a document that fails is
+            # retried or quarantined by the pipeline, the others keep going. With shared_queue_enabled, files another
+            # scanner stopped working on are queued again
+            try:
+                from scripts.pipeline import createPipeline # already imported by the warm-up unless Run was clicked right away
+                pipeline = createPipeline(config, sources, log = self.append_to_terminal, on_expired = job_queue.put)
+            except Exception as e:
+                print(f"Could not start the pipeline: {e}")
+                self.append_to_terminal(f"<b>Could not start processing: {e}</b>")
+                self.startedSignal.emit(False)
+                return
+            self.pipeline = pipeline
+            pipeline.on_halt = lambda error: self.startedSignal.emit(False) # no document can be processed, monitoring stops
+            pipeline.start()
+            self.startedSignal.emit(True)
+
             while self.monitoring:
-                self.clearQueueSignal.emit() # used thread-safe function
-                if file_stack:
-                    queue_was_empty = False
-                    with stack_lock:
-                        # appending file names to queue panel
-                        count = 0
-                        for item in reversed(file_stack):
-                            match = re.search(r'([^\\/]+\.pdf)$', item)
-                            if match:
-                                filename = match.group(1)
-                                if count == 0:
-                                    self.appendQueueSignal.emit(f">> {filename}\n")
-                                else:
-                                    self.appendQueueSignal.emit(f"[{count}] {filename}\n")
-                                count += 1
-                        filepath = file_stack.pop() # top of the stack
-                    time.sleep(1) # for no crash
-
-                    if os.path.exists(filepath):
-                        try:
-                            # PROCESSING
-                            filename = getFilename(filepath, 0)
-                            print(f"Processing {filename}")
-                            self.append_to_terminal(f"<b>Processing <i>{filename}</i>.</b>")
-                            time.sleep(1)
-
-                            print(f"Parsing {filename}")
-                            self.append_to_terminal("Starting parsing...")
-                            doc = parseDocument(filepath) # parsing document using Docling
-
-                            print(f"{filename} parsed")
-                            self.append_to_terminal(f"{filename} successfully parsed.")
-                            time.sleep(1)
-
-                            # for checking purposes, uncomment if not needed
-                            """
-                            mdFilename = getFilename(filepath, 2)
-                            writeToMarkdown(doc, mdFilename)
-                            """
-
-                            print(f"Analyzing {filename}")
-                            self.append_to_terminal("Starting document analysis...")
-                            documentMetadata = analyzeDocument(doc, filename) # Ollama analysis
-
-                            print(f"done, file is {documentMetadata.classification.type.upper()}")
-                            self.append_to_terminal(f"Metadata successfully extracted, document classified as <b><i>{documentMetadata.classification.type.upper()}</i></b>.")
-                            jsonFilename = getFilename(filepath, 1)
-                            json_path = os.path.join(os.path.dirname(filepath), jsonFilename)
-                            writeToJSON(documentMetadata, json_path) # making JSON file
-
-                            print(f"Processed {filename}")
-
-                            new_filename, classification, original_filename, author, subject, year = renameFile(json_path, filepath)
-                            self.append_to_terminal(f"<i>{original_filename}</i> has been renamed to <b><i>{new_filename}</i></b>.")
-
-                            destination_path = moveDocument(filepath, new_filename, classification.get("type", "Uncategorized"), self.selectedDir)
-
-                            time.sleep(1)
-
-                            moveJSON(json_path, author, subject, year, classification.get("type", "Uncategorized"), self.selectedDir)
-
-                            self.append_to_terminal(f"<i>{new_filename}</i> and its associated JSON file has been moved to {os.path.dirname(destination_path)}.")
-                            self.append_to_terminal(f"<b><i>{new_filename}</i> is finished processing.</b>")
-                            self.clearQueueSignal.emit()
-
-                        except Exception as e:
-                            print(f"Error processing {filename}: {e}")
-                            self.append_to_terminal(f"<b>Error processing {filename}: {e}</b>")
-                            self.clearQueueSignal.emit()
-                            self.stop_observer()
-                else:
-                    # checker so that empty queue does not get printed forever and ever
-                    if not queue_was_empty:
-                        self.append_to_terminal("<b>Queue is empty, there are no files to process.</b>")
-                        queue_was_empty = True
-                    time.sleep(2) # avoid busy waiting
+                # checker so that empty queue does not get printed forever and ever
+                if len(job_queue) == 0:
+                    self.append_to_terminal("<b>Queue is empty, there are no files to process.</b>")
+
+                filepath = job_queue.get() # sleeps until a file is queued or monitoring stops
+                if filepath is None or not self.monitoring:
+                    break
+
+                if os.path.exists(filepath):
+                    pipeline.submit(filepath) # waits while the pipeline is full
 
         self.mover_thread = threading.Thread(target = move_files, daemon = True)
         self.mover_thread.start()
 
+    # JobQueue callback, called from the thread that changed the queue
+    def queue_changed(self, action, path):
+        key = self.job_queue.key_of(path) if action == "added" else None
+        self.queue_model.changed(action, path, key)
+
     # stops watchdog and bg thread
     def stop_observer(self):
         print("Stopping file observer...")
         self.monitoring = False
-        self.buttonRun.setText("Run")
\ No newline at end of file
+        if self.job_queue is not None:
+            self.job_queue.close() # wakes up the worker waiting for new files
+        mover_thread = self.mover_thread
+        if self.pipeline is not None:
+            self.pipeline.stop() # files already being processed will finish
+        self.buttonRun.setText("Stopping...")
+        self.buttonRun.setEnabled(False)
+
+        # wait for the files being processed in the background, the window stays responsive meanwhile
+        def finish():
+            if mover_thread is not None:
+                mover_thread.join() # it may still be building the pipeline
+            pipeline = self.pipeline
+            if pipeline is not None:
+                pipeline.stop()
+                pipeline.join() # saves and closes everything the pipeline opened, logs the memory report
+
+            # release the warm Docling converter and the parser processes once nothing uses them anymore
+            from scripts.documentParser import shutdownConverter
+            shutdownConverter()
+            self.stoppedSignal.emit()
+
+        self.stop_thread = threading.Thread(target = finish, name = "stop", daemon = True)
+        self.stop_thread.start()
+
+    # the pipeline runs, monitoring can be stopped; if it could not be built, or stopped itself because no
+    # document can be processed, monitoring stops right away
+    def monitoring_started(self, started):
+        if not self.monitoring:
+            return # stopped while the pipeline was being built
+        if started:
+            self.buttonRun.setEnabled(True)
+        else:
+            self.stop_observer()
+
+    # closing the window stops monitoring and waits for the files being processed, so the pipeline saves the
+    # pre-classifier index and closes its databases; after CLOSE_TIMEOUT seconds it closes anyway, the
+    # unfinished files are resumed from the journal on the next start
+    def closeEvent(self, event):
+        if self.monitoring:
+            self.stop_observer()
+        if self.stop_thread is not None:
+            self.stop_thread.join(CLOSE_TIMEOUT)
+            pipeline = self.pipeline
+            if self.stop_thread.is_alive() and pipeline is not None and pipeline.pre_classifier is not None:
+                print("Files are still being processed, saving the embedding index before closing.")
+                pipeline.pre_classifier.save()
+        self.close_search_indexes()
+        super().closeEvent(event)
+
+    # the pipeline has finished, monitoring can be started again
+    def monitoring_stopped(self):
+        self.pipeline = None
+        self.buttonRun.setText("Run")
+        self.buttonRun.setEnabled(True)
+        self.readiness_label.setText("Stopped")
+        self.readiness_label.setStyleSheet("")
\ No newline at end of file
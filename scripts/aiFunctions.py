@@ -1,7 +1,14 @@
-from ollama import chat
+import re
+import time
+import hashlib
+
+import ollama
 from pydantic import BaseModel
 from typing import Optional
 
+from scripts import metrics
+from scripts.promptCompactor import compactDocument, COMPACTION_VERSION
+
 # classes for JSON structuring
 # structure of metadata for CRE (Creative Work, Research, and Extension) documents
 class Metadata(BaseModel):
@@ -27,13 +34,12 @@ class Document(BaseModel):
     classification: Classification
     metadata: Optional[Metadata] = None
 
-# function to analyze a document and return a structured Document object
-def analyzeDocument(doc, filename) -> Document:
-
-    # FIRST PROMPT: classification
-    classifyPrompt = f'''{doc}
+# model used for every prompt
+MODEL = 'qwen3'
+KEEP_ALIVE = "30m" # default of how long Ollama keeps MODEL loaded after the last request, callers pass the ollama_keep_alive setting
 
-    QUERY: You are tasked with identifying the subject, classification type, author, year processed, and funding (if applicable) from the given document.
+# instructions of the FIRST PROMPT: classification
+CLASSIFY_INSTRUCTIONS = '''    QUERY: You are tasked with identifying the subject, classification type, author, year processed, and funding (if applicable) from the given document.
 
     Instructions:  
 
@@ -58,71 +64,219 @@ def analyzeDocument(doc, filename) -> Document:
              
     If the document is classified as CRE, determine the funding source: INT (internally funded), or EXT (externally funded). If the document is not CRE, the funding field must be set to null. For the type and funding, simply write the three letter code.
          
-    /nothink /no_think
+'''
+
+# instructions of the SECOND PROMPT: metadata of CRE documents
+METADATA_INSTRUCTIONS = '''        QUERY: You are a parsing assistant tasked to extract the following fields from the inputted research paper in READme format and return them strictly in JSON format:
+        {{
+            "title": "...",
+            "authors": [...],
+            "presenting_author": "...",
+            "conference": "...",
+            "conference_date": "...",
+            "location": "...",
+            "abstract": "...",
+            "keywords": [...]
+        }}
+        To help in finding the study's title, it is usually stylized as a ## MARKDOWN HEADING, with the other fields such as authors, abstract and keywords directly following it. The abstract usually starts with "Abstract: " while the keywords start with "Keywords: ".
+
+        For instances wherein a field is not stated within the document, leave it as null.
+
+'''
+
+# FIRST PROMPT: classification, {doc} is replaced by the parsed document
+CLASSIFY_PROMPT = "{doc}\n\n" + CLASSIFY_INSTRUCTIONS + '''    /nothink /no_think
     '''
 
+# SECOND PROMPT: metadata of CRE documents, {doc} is replaced by the parsed document
+METADATA_PROMPT = "{doc}\n\n" + METADATA_INSTRUCTIONS + '''        /nothink /no_think
+        '''
+
+# SECOND PROMPT as a follow-up turn after the FIRST PROMPT, the document is already in the conversation
+METADATA_FOLLOWUP_PROMPT = '''The document above was classified as CRE. Using the same document:
+
+''' + METADATA_INSTRUCTIONS + '''        /nothink /no_think
+        '''
+
+# both prompts in a single call, the response follows the Document schema
+COMBINED_PROMPT = "{doc}\n\n" + '''    Answer in two parts and return a single JSON object with a "classification" field and a "metadata" field.
+
+    PART 1, "classification":
+''' + CLASSIFY_INSTRUCTIONS + '''    PART 2, "metadata": only fill this part if the document is classified as CRE, otherwise set "metadata" to null.
+''' + METADATA_INSTRUCTIONS + '''    /nothink /no_think
+    '''
+
+# load MODEL into Ollama's memory ahead of the first document (a request without a prompt only loads it)
+def preloadModel(host = None, keep_alive = KEEP_ALIVE):
+    client = ollama.Client(host = host) if host else ollama
+    client.generate(model = MODEL, keep_alive = keep_alive)
+
+# HELPER: digest of MODEL on an Ollama server (None for the default one), "" if it is not installed there
+def modelDigest(host = None):
+    client = ollama.Client(host = host) if host else ollama
+    for model in client.list().models:
+        if model.model in (MODEL, f"{MODEL}:latest"):
+            return model.digest or ""
+    return ""
+
+# version of the prompts and model, results cached with a different version are not reused;
+# `budget` is the prompt_token_budget, the compaction changes what the model sees. The model is looked
+# up on the first of `hosts` that answers (None for the default server), the servers the analysis uses
+def getAnalysisVersion(budget = 0, hosts = (None,)):
+    digest = ""
+    for host in hosts:
+        try:
+            digest = modelDigest(host)
+            break
+        except Exception as e:
+            print(f"Could not read {MODEL} version from {host or 'the default Ollama server'}: {e}")
+
+    content = "\n".join([MODEL, digest, CLASSIFY_PROMPT, METADATA_PROMPT, METADATA_FOLLOWUP_PROMPT, COMBINED_PROMPT])
+    if budget:
+        content += f"\ncompaction-{COMPACTION_VERSION}-{budget}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+# every function below sends its prompts through `client`, anything with the same chat() as the
+# ollama module (e.g. analysisService.AnalysisService), the default blocking client if None
+
+# ways of sending a document to Ollama
+TWO_CALL = "two-call"       # two independent prompts, the document is sent (and prefilled) twice for CRE
+MULTI_TURN = "multi-turn"   # the metadata prompt is a second turn of the classification conversation
+COMBINED = "combined"       # a single prompt returning the whole Document schema
+ANALYSIS_MODES = (TWO_CALL, MULTI_TURN, COMBINED)
+
+# HELPER: ensure that funding is set to None if not CRE or explicitly set to "null"
+def cleanClassification(classification):
+    if classification.funding == "null" or classification.type.upper() != "CRE":
+        classification.funding = None
+    return classification
+
+# HELPER: convert "null" strings to actual None values
+def cleanMetadata(metadata):
+    for field, value in metadata.model_dump().items():
+        if isinstance(value, str) and value.strip().lower() == "null":
+            setattr(metadata, field, None)
+    return metadata
+
+# HELPER: ollama.chat (or client.chat) with its duration and token counts recorded under the name of the call
+def chat(call, client = None, keep_alive = KEEP_ALIVE, **kwargs):
+    if keep_alive is not None:
+        kwargs["keep_alive"] = keep_alive
+    started = time.perf_counter()
+    response = (client or ollama).chat(**kwargs)
+    metrics.observeOllama(call, response, time.perf_counter() - started)
+    return response
+
+# first step of the analysis: classify the document, raises ValidationError if the response does not fit the schema
+# if a conversation list is given, the prompt and the response are appended to it so it can be continued
+# with knownType (e.g. from the pre-classifier) the response schema only allows that type
+def classifyDocument(doc, filename, conversation = None, client = None, knownType = None, keep_alive = KEEP_ALIVE) -> Classification:
+
+    # FIRST PROMPT: classification
+    classifyPrompt = CLASSIFY_PROMPT.format(doc = doc)
+    schema = Classification.model_json_schema()
+    if knownType:
+        schema["properties"]["type"] = {"type": "string", "enum": [knownType.upper()]}
+    messages = [
+        {
+            'role': 'user',
+            'content': classifyPrompt
+        }
+    ]
+
     # PASS PROMPT TO AI, output a JSON-structured response
-    classifyResponse = chat(
-        model = 'qwen3',
+    classifyResponse = chat("classify", client, keep_alive,
+        model = MODEL,
+        messages = messages,
+        stream = False,
+        format = schema
+    )
+
+    # validate and parse the AI's response into a Classification object
+    classification = Classification.model_validate_json(classifyResponse.message.content)
+
+    if conversation is not None:
+        conversation.extend(messages)
+        conversation.append({'role': 'assistant', 'content': classifyResponse.message.content})
+
+    return cleanClassification(classification)
+
+# second step of the analysis: extract the metadata of a CRE document
+# with the conversation of classifyDocument, the document is not sent again and Ollama reuses its context
+def extractMetadata(doc, conversation = None, client = None, keep_alive = KEEP_ALIVE) -> Metadata:
+    if conversation:
+        messages = conversation + [
+            {
+                'role': 'user',
+                'content': METADATA_FOLLOWUP_PROMPT.format()
+            }
+        ]
+    else:
+        messages = [
+            {
+                'role': 'user',
+                'content': METADATA_PROMPT.format(doc = doc)
+            }
+        ]
+
+    # PASS PROMPT TO AI, output a JSON-structured response
+    metadataResponse = chat("metadata", client, keep_alive,
+        model = MODEL,
+        messages = messages,
+        stream = False,
+        format = Metadata.model_json_schema()
+    )
+
+    # validate and parse the response into a Metadata object
+    metadata = Metadata.model_validate_json(metadataResponse.message.content)
+    return cleanMetadata(metadata)
+
+# classification and metadata in a single call
+def analyzeCombined(doc, filename, client = None, keep_alive = KEEP_ALIVE) -> Document:
+    response = chat("combined", client, keep_alive,
+        model = MODEL,
         messages = [
             {
                 'role': 'user',
-                'content': classifyPrompt
+                'content': COMBINED_PROMPT.format(doc = doc)
             }
         ],
         stream = False,
-        format = Classification.model_json_schema()
+        format = Document.model_json_schema()
     )
 
-    # validate and parse the AI's response into a Classification object
-    classification = Classification.model_validate_json(classifyResponse.message.content)
+    document = Document.model_validate_json(response.message.content)
+    cleanClassification(document.classification)
+    if document.classification.type.upper() != "CRE":
+        document.metadata = None
+    elif document.metadata is not None:
+        cleanMetadata(document.metadata)
+    return document
 
-    # ensure that funding is set to None if not CRE or explicitly set to "null"
-    if classification.funding == "null" or classification.type.upper() != "CRE":
-        classification.funding = None
+# function to analyze a document and return a structured Document object
+# with a token budget, the document is compacted first (see promptCompactor.compactDocument)
+def analyzeDocument(doc, filename, mode = TWO_CALL, client = None, budget = None, keep_alive = KEEP_ALIVE) -> Document:
+    doc = compactDocument(doc, budget)
+    if mode == COMBINED:
+        return analyzeCombined(doc, filename, client, keep_alive)
+
+    conversation = [] if mode == MULTI_TURN else None
+    classification = classifyDocument(doc, filename, conversation, client, keep_alive = keep_alive)
 
     # SECOND PROMPT: metadata (ignore if not CRE)
     metadata = None
     if classification.type.upper() == "CRE":
-        metadataPrompt = f'''{doc}
+        metadata = extractMetadata(doc, conversation, client, keep_alive)
 
-        QUERY: You are a parsing assistant tasked to extract the following fields from the inputted research paper in READme format and return them strictly in JSON format:
-        {{
-            "title": "...",
-            "authors": [...],
-            "presenting_author": "...",
-            "conference": "...",
-            "conference_date": "...",
-            "location": "...",
-            "abstract": "...",
-            "keywords": [...]
-        }}
-        To help in finding the study's title, it is usually stylized as a ## MARKDOWN HEADING, with the other fields such as authors, abstract and keywords directly following it. The abstract usually starts with "Abstract: " while the keywords start with "Keywords: ".
-
-        For instances wherein a field is not stated within the document, leave it as null.
-
-        /nothink /no_think
-        '''
+    return Document(classification = classification, metadata = metadata) # return structured document
 
-        # PASS PROMPT TO AI, output a JSON-structured response
-        metadataResponse = chat(
-            model = 'qwen3',
-            messages = [
-                {
-                    'role': 'user',
-                    'content': metadataPrompt
-                }
-            ],
-            stream = False,
-            format = Metadata.model_json_schema()
-        )
-
-        # validate and parse the response into a Metadata object
-        metadata = Metadata.model_validate_json(metadataResponse.message.content)
-
-        # convert "null" strings to actual None values
-        for field, value in metadata.model_dump().items():
-            if isinstance(value, str) and value.strip().lower() == "null":
-                setattr(metadata, field, None)
-
-    return Document(classification = classification, metadata = metadata) # return structured document
\ No newline at end of file
+# required classification fields that came back empty, more pages may contain them
+def missingFields(classification):
+    missing = []
+    for field in ("subject", "author", "year_processed"):
+        value = (getattr(classification, field) or "").strip()
+        if not value or value.lower() in ("null", "unknown"):
+            missing.append(field)
+    if "year_processed" not in missing and not re.search(r"\d{4}", classification.year_processed):
+        missing.append("year_processed")
+    return missing
\ No newline at end of file
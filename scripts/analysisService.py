@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import concurrent.futures
+
+from ollama import AsyncClient
+
+# raised in the worker thread when its Ollama request was cancelled by close()
+class AnalysisCancelled(Exception):
+    pass
+
+# asyncio-based Ollama client shared by the analysis workers: one event loop thread, one pooled
+# HTTP connection and at most `concurrency` requests in flight, so an Ollama server started with
+# OLLAMA_NUM_PARALLEL can run several inferences at the same time
+class AnalysisService:
+    def __init__(self, host = None, concurrency = 2, timeout = 300):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout      # seconds before a single request is given up, None waits forever
+        self.tasks = set()          # in-flight requests, cancelled by close()
+        self.closed = False
+        self.lock = threading.Lock()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_forever, name = "ollama-client", daemon = True)
+        self.thread.start()
+
+        # the client and semaphore belong to the loop, so they are created inside it
+        async def setup():
+            self.client = AsyncClient(host = host)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        asyncio.run_coroutine_threadsafe(setup(), self.loop).result()
+
+    # one request (chat, embed, ...), waits for a free slot first
+    async def request_async(self, method, **kwargs):
+        async with self.semaphore:
+            return await asyncio.wait_for(getattr(self.client, method)(**kwargs), self.timeout)
+
+    # blocking chat() with the same arguments as ollama.chat, called from the worker threads
+    def chat(self, **kwargs):
+        return self.request("chat", **kwargs)
+
+    # blocking embed() with the same arguments as ollama.embed
+    def embed(self, **kwargs):
+        return self.request("embed", **kwargs)
+
+    # HELPER: run a request on the event loop and wait for its result
+    def request(self, method, **kwargs):
+        with self.lock:
+            if self.closed:
+                raise AnalysisCancelled("analysis service is stopped")
+            future = asyncio.run_coroutine_threadsafe(self.request_async(method, **kwargs), self.loop)
+            self.tasks.add(future)
+
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            raise AnalysisCancelled("Ollama request cancelled because monitoring was stopped")
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Ollama did not answer within {self.timeout} seconds")
+        finally:
+            with self.lock:
+                self.tasks.discard(future)
+
+    # cancel every in-flight request and stop the event loop
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            for future in self.tasks:
+                future.cancel()
+
+        async def shutdown():
+            await self.client._client.aclose() # close the pooled HTTP connection
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout = 5)
+        except Exception as e:
+            print(f"Error closing Ollama client: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
@@ -0,0 +1,183 @@
+import time
+import threading
+
+import httpx
+import ollama
+
+from scripts import metrics
+from scripts.fileFunctions import getSetting
+from scripts.analysisService import AnalysisService, AnalysisCancelled
+
+BACKEND_UP = metrics.REGISTRY.gauge("smartscanner_backend_up", "1 if the Ollama backend passed its last health check.")
+BACKEND_OUTSTANDING = metrics.REGISTRY.gauge("smartscanner_backend_outstanding", "Requests sent to the Ollama backend and not answered yet.")
+BACKEND_REQUESTS = metrics.REGISTRY.counter("smartscanner_backend_requests_total", "Requests answered per Ollama backend, by result (ok or failover).")
+
+# one Ollama server of the pool
+class Backend:
+    def __init__(self, host, concurrency = 1, timeout = 300):
+        self.host = host
+        self.concurrency = max(1, concurrency)      # requests it runs at the same time (its OLLAMA_NUM_PARALLEL)
+        self.service = AnalysisService(host, self.concurrency, timeout)
+        self.outstanding = 0                        # requests sent and not answered yet, changed under the pool lock
+        self.healthy = True                         # assumed up until a request or health check fails
+        self.models = set()                         # models loaded in its memory at the last health check
+        self.missing = set()                        # models it answered 404 for (not pulled), retried after a health check
+        self.failures = 0                           # failed requests in a row
+
+    # HELPER: ordering key, the least loaded backend first, then one that already has the model loaded
+    def load(self, model):
+        return (self.outstanding / self.concurrency, model not in self.models and f"{model}:latest" not in self.models)
+
+# several Ollama servers used as one client: each request goes to the healthy backend with the fewest
+# outstanding requests, and is sent to another backend if it times out or its backend is unreachable.
+# Has the same chat()/embed()/close() as AnalysisService, so it can be passed to the analysis functions
+class BackendPool:
+    def __init__(self, backends, timeout = 300, health_interval = 10, health_timeout = 5):
+        if not backends:
+            raise ValueError("the Ollama backend pool needs at least one backend")
+        self.backends = [Backend(host, concurrency, timeout) for host, concurrency in backends]
+        self.health_interval = health_interval  # seconds between two health checks of every backend
+        self.health_timeout = health_timeout    # seconds a health check may take before the backend is down
+        self.lock = threading.Lock()
+        self.closed = False
+
+        for backend in self.backends:
+            BACKEND_UP.set_function(lambda backend = backend: int(backend.healthy), host = backend.host)
+            BACKEND_OUTSTANDING.set_function(lambda backend = backend: backend.outstanding, host = backend.host)
+
+        self.check_health()
+        self.health_thread = threading.Thread(target = self.run_health_checks, name = "ollama-health", daemon = True)
+        self.health_thread.start()
+
+    # total number of requests the pool runs at the same time, used to size the analysis workers
+    @property
+    def concurrency(self):
+        return sum(backend.concurrency for backend in self.backends)
+
+    # HELPER: pick the backend for a request and count it as outstanding, None once every backend was tried
+    def acquire(self, model, exclude):
+        with self.lock:
+            if self.closed:
+                raise AnalysisCancelled("analysis service is stopped")
+            untried = [backend for backend in self.backends if backend not in exclude and model not in backend.missing]
+            # backends that failed their health check are only tried when no healthy one is left
+            candidates = [backend for backend in untried if backend.healthy] or untried
+            if not candidates:
+                return None
+            backend = min(candidates, key = lambda backend: backend.load(model))
+            backend.outstanding += 1
+            return backend
+
+    def release(self, backend):
+        with self.lock:
+            backend.outstanding -= 1
+
+    # HELPER: errors after which the request is sent to another backend
+    def is_transient(self, error):
+        if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+            return True
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code >= 500 or error.status_code == 404 # server error, or model not pulled there
+        return False
+
+    # send one request (chat, embed, ...) to the best backend, failing over to the others
+    def request(self, method, **kwargs):
+        model = kwargs.get("model", "")
+        tried = set()
+        last_error = None
+        while True:
+            backend = self.acquire(model, tried)
+            if backend is None:
+                raise last_error or ConnectionError(f"no Ollama backend has {model}")
+            tried.add(backend)
+            try:
+                response = backend.service.request(method, **kwargs)
+            except AnalysisCancelled:
+                raise
+            except Exception as e:
+                if not self.is_transient(e):
+                    raise
+                last_error = e
+                self.mark_failed(backend, model, e)
+                BACKEND_REQUESTS.inc(host = backend.host, result = "failover")
+                continue
+            finally:
+                self.release(backend)
+
+            with self.lock:
+                backend.failures = 0
+                backend.models.add(model)
+            BACKEND_REQUESTS.inc(host = backend.host, result = "ok")
+            return response
+
+    def chat(self, **kwargs):
+        return self.request("chat", **kwargs)
+
+    def embed(self, **kwargs):
+        return self.request("embed", **kwargs)
+
+    # HELPER: take a backend out of rotation until a health check passes again
+    def mark_failed(self, backend, model, error):
+        with self.lock:
+            backend.failures += 1
+            if isinstance(error, ollama.ResponseError) and error.status_code == 404:
+                backend.missing.add(model) # only this model is missing, the server itself is fine
+                return
+            if backend.healthy:
+                print(f"Ollama backend {backend.host} is down: {error}")
+            backend.healthy = False
+
+    # ask every backend which models it has loaded (/api/ps); a backend that answers is healthy
+    def check_health(self):
+        for backend in self.backends:
+            try:
+                running = ollama.Client(host = backend.host, timeout = self.health_timeout).ps()
+                models = {model.model or model.name for model in running.models}
+                healthy = True
+            except Exception:
+                models, healthy = set(), False
+
+            with self.lock:
+                if healthy and not backend.healthy:
+                    print(f"Ollama backend {backend.host} is back up.")
+                backend.healthy = healthy
+                backend.models = models
+                backend.missing = set() # models may have been pulled since
+
+    def run_health_checks(self):
+        while not self.closed:
+            time.sleep(self.health_interval)
+            if not self.closed:
+                self.check_health()
+
+    # state of every backend, e.g. for logging
+    def status(self):
+        with self.lock:
+            return [
+                {"host": backend.host, "healthy": backend.healthy, "outstanding": backend.outstanding, "models": sorted(backend.models)}
+                for backend in self.backends
+            ]
+
+    # cancel every in-flight request, like AnalysisService.close()
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        for backend in self.backends:
+            backend.service.close()
+
+# (host, concurrency) pairs from the ollama_backends setting: "host" strings or {"host": ..., "concurrency": ...}
+def parseBackends(setting, default_concurrency = 1):
+    backends = []
+    for entry in setting or []:
+        if isinstance(entry, str):
+            backends.append((entry, default_concurrency))
+        else:
+            backends.append((entry["host"], entry.get("concurrency", default_concurrency)))
+    return backends
+
+# Ollama servers the settings point to: the hosts of the backend pool, or the single ollama_host
+# (None for the default server)
+def ollamaHosts(config):
+    return [host for host, _ in parseBackends(getSetting(config, "ollama_backends"))] or [getSetting(config, "ollama_host")]
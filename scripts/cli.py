@@ -0,0 +1,338 @@
+# headless entry point for servers, never imports PySide6
+#   python -m scripts.cli batch SRC DST [--workers N]    process every PDF in SRC, then exit
+#   python -m scripts.cli watch SRC DST [--workers N]    keep watching SRC until Ctrl+C
+#   python -m scripts.cli watch                          watch the source folders of config.json
+#   python -m scripts.cli watch SRC DST --shared-queue   share SRC with other scanners (on this machine or others)
+#   python -m scripts.cli build-embeddings DST           rebuild the pre-classifier index from filed documents
+#   python -m scripts.cli build-index DST                rebuild the search index from the filed JSON files
+#   python -m scripts.cli search DST QUERY               search the filed documents
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import contextlib
+import argparse
+import threading
+
+from watchdog.observers import Observer
+
+# the processing modules (Docling, Ollama, numpy) are imported by the commands that use them, so search and build-index start right away
+from scripts.fileFunctions import loadConfig, getSetting
+from scripts.resultCache import ResultCache, hashFile
+from scripts.documentIndex import DocumentIndex, INDEX_FILENAME
+from scripts.jobQueue import JobQueue
+from scripts.sources import loadSources, SOURCE_LATENCY_SECONDS, SOURCE_WAIT_SECONDS
+from scripts.sharedQueue import NODE_ID
+from eventHandler import MyEventHandler
+
+# stands in for the GUI terminal, messages go to stderr without their HTML tags
+class ConsoleLog:
+    def __init__(self, quiet = False):
+        self.quiet = quiet
+
+    def append_to_terminal(self, text):
+        if not self.quiet:
+            timestamp = time.strftime("%H:%M:%S")
+            print(f"[{timestamp}] {re.sub(r'<[^>]+>', '', text)}", file = sys.stderr)
+
+# collects per-file results, printed as one JSON object per line on stdout
+class ResultWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.failed = 0
+        self.quarantined = 0
+        self.errors = {}    # error class -> documents that failed with it
+
+    def write(self, result):
+        with self.lock:
+            self.stream.write(json.dumps(result, ensure_ascii = False) + "\n")
+            self.stream.flush()
+
+    def on_done(self, job):
+        with self.lock: # called from the commit workers
+            self.processed += 1
+        self.write({
+            "file": job.filepath,
+            "source": job.source.name,
+            "status": "ok",
+            "type": job.document.classification.type.upper(),
+            "destination": job.destination,
+            "route": ",".join(dict.fromkeys(job.routes)),
+            "seconds": round(time.time() - job.started, 3),
+            "stages": job.timing["stages"],
+            "tokens_saved": job.timing.get("compaction", {}).get("tokens_saved", 0)
+        })
+
+    def on_error(self, job, error):
+        with self.lock:
+            self.failed += 1
+            self.quarantined += job.quarantined is not None
+            self.errors[type(error).__name__] = self.errors.get(type(error).__name__, 0) + 1
+        self.write({
+            "file": job.filepath,
+            "source": job.source.name,
+            "status": "quarantined" if job.quarantined else "error",
+            "error": f"{type(error).__name__}: {error}",
+            "retries": job.attempts,
+            "quarantined_as": job.quarantined,
+            "seconds": round(time.time() - job.started, 3)
+        })
+
+# HELPER: apply command line overrides on top of config.json
+def build_config(args):
+    config = loadConfig()
+    if args.workers is not None:
+        config["parse_workers"] = args.workers
+        config["analyze_workers"] = args.workers
+        config["commit_workers"] = args.workers
+    if args.parse_processes is not None:
+        config["parse_processes"] = args.parse_processes
+    if args.ollama_concurrency is not None:
+        config["ollama_concurrency"] = args.ollama_concurrency
+    if args.order is not None:
+        config["queue_order"] = args.order
+    if args.no_cache:
+        config["cache_enabled"] = False
+    if args.metrics_port is not None:
+        config["metrics_port"] = args.metrics_port
+    if args.metrics_file is not None:
+        config["metrics_file"] = args.metrics_file
+    if args.shared_queue:
+        config["shared_queue_enabled"] = True
+    return config
+
+def run(args):
+    # pipeline and library output goes to stderr, stdout only carries the JSONL results
+    results = ResultWriter(sys.stdout)
+    with contextlib.redirect_stdout(sys.stderr):
+        return process(args, results)
+
+# HELPER: body of run(), with print() going to stderr
+def process(args, results):
+    from scripts.pipeline import createPipeline, memoryReport
+    from scripts.documentParser import shutdownConverter
+
+    started = time.time()
+    log = ConsoleLog(args.quiet)
+    config = build_config(args)
+    if args.source is not None and args.destination is None:
+        print("DST is needed when SRC is given.", file = sys.stderr)
+        return 2
+    try:
+        sources = loadSources(config, args.source, args.destination)
+    except ValueError as e:
+        print(f"Invalid sources: {e}", file = sys.stderr)
+        return 2
+    if not any(os.path.isdir(source.source_path or "") for source in sources):
+        print("None of the source folders exist.", file = sys.stderr)
+        return 2
+    for source in sources:
+        os.makedirs(source.destination_path, exist_ok = True)
+
+    # files whose lease another scanner let expire are queued again (only while watching, a batch takes no new files)
+    job_queue = JobQueue(getSetting(config, "queue_order"), sources = sources)
+    pipeline = createPipeline(
+        config, sources, log = log.append_to_terminal, on_error = results.on_error, on_done = results.on_done, on_expired = job_queue.put
+    )
+
+    # files are only queued once they have finished being written, one handler per source folder
+    recursive = args.recursive or getSetting(config, "recursive_watch")
+    event_handlers = []
+    for source in sources:
+        if not os.path.isdir(source.source_path or ""):
+            log.append_to_terminal(f"Source folder {source.source_path} ({source.name}) does not exist, skipped.")
+            continue
+        event_handler = MyEventHandler(
+            source.source_path, log, job_queue, quiet_period = getSetting(config, "quiet_period"), max_wait = getSetting(config, "pending_max_wait")
+        )
+        found = event_handler.scan(recursive)
+        log.append_to_terminal(f"{found} file(s) found in {source.source_path}" + (f" ({source.name})." if len(sources) > 1 else "."))
+        event_handlers.append(event_handler)
+
+    # Ctrl+C while waiting for the files or processing them stops the run; the pipeline is closed either way,
+    # which closes the result cache, the journal and the search indexes it opened
+    observer = None
+    try:
+        if args.command == "watch":
+            observer = Observer()
+            for event_handler in event_handlers:
+                event_handler.start()
+                observer.schedule(event_handler, event_handler.source_folder, recursive = recursive)
+                log.append_to_terminal(f"Watching folder: {event_handler.source_folder}")
+            observer.start()
+
+            # Ctrl+C and service stop both end the watch, queued files are still processed
+            signal.signal(signal.SIGTERM, lambda signum, frame: job_queue.close())
+        else:
+            # batch: only the files that are there now, once they are complete
+            while any(event_handler.has_pending() for event_handler in event_handlers):
+                for event_handler in event_handlers:
+                    event_handler.check_pending()
+                time.sleep(event_handlers[0].poll_interval)
+            for event_handler in event_handlers:
+                for filepath in event_handler.stalled():
+                    log.append_to_terminal(f"{filepath} is empty or locked by another program, skipped.")
+            job_queue.close()
+
+        pipeline.on_halt = lambda error: job_queue.close() # no document can be processed, the run ends
+        pipeline.start()
+        while True:
+            filepath = job_queue.get()
+            if filepath is None:
+                break
+            if os.path.exists(filepath):
+                pipeline.submit(filepath)
+    except KeyboardInterrupt:
+        log.append_to_terminal("Stopping, files that are already being processed will finish.")
+        job_queue.close()
+        pipeline.stop()
+    finally:
+        for event_handler in event_handlers:
+            event_handler.stop()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        pipeline.close()
+        pipeline.join()
+        memory = memoryReport(pipeline.parser_pool) # before the parser processes are stopped
+        shutdownConverter()
+
+    elapsed = time.time() - started
+    summary = {
+        "processed": results.processed,
+        "failed": results.failed,
+        "quarantined": results.quarantined,
+        "errors": results.errors,
+        "seconds": round(elapsed, 3),
+        "docs_per_minute": round(results.processed / elapsed * 60, 2) if elapsed > 0 else 0.0,
+        "memory": memory
+    }
+    if len(sources) > 1:
+        summary["sources"] = {source.name: sourceSummary(source.name) for source in sources}
+    if pipeline.leases:
+        summary["shared_queue"] = sharedQueueSummary(pipeline.leases.values())
+    if pipeline.halted is not None:
+        summary["halted"] = f"{type(pipeline.halted).__name__}: {pipeline.halted}"
+    print(f"Summary: {json.dumps(summary)}", file = sys.stderr)
+    return 1 if results.failed or pipeline.halted is not None else 0
+
+# HELPER: files committed from a source, with their mean wait in the job queue and in the pipeline
+def sourceSummary(name):
+    waits = SOURCE_WAIT_SECONDS.summary(source = name)
+    latencies = SOURCE_LATENCY_SECONDS.summary(source = name)
+    return {
+        "processed": latencies["count"],
+        "mean_wait_seconds": round(waits["sum"] / waits["count"], 3) if waits["count"] else None,
+        "mean_pipeline_seconds": round(latencies["sum"] / latencies["count"], 3) if latencies["count"] else None,
+    }
+
+# HELPER: files this scanner claimed, took over from a scanner that stopped, left to the others and lost
+def sharedQueueSummary(shared_queues):
+    summary = {"node": NODE_ID}
+    for shared_queue in shared_queues:
+        for outcome, count in shared_queue.counts.items():
+            summary[outcome] = summary.get(outcome, 0) + count
+    return summary
+
+# rebuild the pre-classifier's embedding index from the documents already in DST
+def build_embeddings(args):
+    from scripts.documentParser import parseDocument, getParserVersion, shutdownConverter
+    from scripts.aiFunctions import getAnalysisVersion
+    from scripts.backendPool import ollamaHosts
+    from scripts.preClassifier import PreClassifier, rebuildIndex
+
+    config = loadConfig()
+    log = ConsoleLog()
+    initial_pages = getSetting(config, "initial_pages")
+    fast_path = getSetting(config, "text_layer_fast_path")
+    cache = ResultCache(getParserVersion((1, initial_pages), fast_path), getAnalysisVersion(getSetting(config, "prompt_token_budget"), ollamaHosts(config))) if getSetting(config, "cache_enabled") else None
+
+    # markdown of a filed PDF, from the result cache when the file went through the scanner
+    def get_markdown(pdf_path):
+        sha256 = hashFile(pdf_path) if cache is not None else None
+        markdown = cache.get(sha256)[0] if cache is not None else None
+        if markdown is None:
+            markdown = parseDocument(pdf_path, (1, initial_pages), fast_path)
+            if cache is not None:
+                cache.putMarkdown(sha256, markdown)
+        return markdown
+
+    pre_classifier = PreClassifier(args.destination, model = getSetting(config, "embedding_model"))
+    rebuildIndex(pre_classifier, args.destination, get_markdown, log = log.append_to_terminal)
+    shutdownConverter()
+    return 0
+
+# rebuild the search index from the JSON files already filed in DST
+def build_index(args):
+    index = DocumentIndex(args.destination)
+    started = time.time()
+    index.rebuild(log = ConsoleLog().append_to_terminal)
+    print(f"Done in {time.time() - started:.1f} s.", file = sys.stderr)
+    index.close()
+    return 0
+
+# print the documents of DST matching the query, one JSON object per line, best matches first
+def search(args):
+    if not os.path.exists(os.path.join(args.destination, INDEX_FILENAME)):
+        print(f"{args.destination} has no search index yet, run `python -m scripts.cli build-index {args.destination}` first.", file = sys.stderr)
+        return 1
+    index = DocumentIndex(args.destination)
+    if not index.is_built():
+        print(f"Only documents filed since the index was created are searched, run `python -m scripts.cli build-index {args.destination}` to add the older ones.", file = sys.stderr)
+    started = time.perf_counter()
+    results = index.search(" ".join(args.query), limit = args.limit, doc_type = args.type, year = args.year)
+    elapsed = time.perf_counter() - started
+    for result in results:
+        print(json.dumps(result, ensure_ascii = False))
+    print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms.", file = sys.stderr)
+    index.close()
+    return 0 if results else 1
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m scripts.cli", description = "Smart Scanner without the GUI.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    for command, description in (("batch", "process every PDF in SRC, then exit"), ("watch", "process SRC and keep watching it for new PDFs")):
+        subparser = subparsers.add_parser(command, help = description)
+        subparser.add_argument("source", metavar = "SRC", nargs = "?", help = "folder with the PDFs to process, the sources of config.json if left out")
+        subparser.add_argument("destination", metavar = "DST", nargs = "?", help = "folder where classified files are moved")
+        subparser.add_argument("--workers", type = int, help = "worker threads per pipeline stage")
+        subparser.add_argument("--parse-processes", type = int, help = "Docling processes, 0 parses in the worker threads")
+        subparser.add_argument("--ollama-concurrency", type = int, help = "Ollama requests in flight at once")
+        subparser.add_argument("--order", choices = ("fifo", "sjf"), help = "order in which queued files are processed")
+        subparser.add_argument("--recursive", action = "store_true", help = "also process PDFs in subfolders of SRC")
+        subparser.add_argument("--no-cache", action = "store_true", help = "do not reuse results of files processed before")
+        subparser.add_argument("--metrics-port", type = int, help = "serve Prometheus metrics on this port")
+        subparser.add_argument("--metrics-file", help = "write Prometheus metrics to this file every 15 seconds")
+        subparser.add_argument("--shared-queue", action = "store_true", help = "share the source folders with other scanners, each file is processed by one of them")
+        subparser.add_argument("--quiet", action = "store_true", help = "only print results and the summary")
+
+    subparser = subparsers.add_parser("build-embeddings", help = "rebuild the pre-classifier index from the documents filed in DST")
+    subparser.add_argument("destination", metavar = "DST", help = "destination folder with the filed documents")
+
+    subparser = subparsers.add_parser("build-index", help = "rebuild the search index from the JSON files filed in DST")
+    subparser.add_argument("destination", metavar = "DST", help = "destination folder with the filed documents")
+
+    subparser = subparsers.add_parser("search", help = "search the documents filed in DST")
+    subparser.add_argument("destination", metavar = "DST", help = "destination folder with the filed documents")
+    subparser.add_argument("query", metavar = "QUERY", nargs = "+", help = 'words to find (prefixes match), "exact phrases", type:CRE, year:2024')
+    subparser.add_argument("--type", help = "only documents of this classification type")
+    subparser.add_argument("--year", help = "only documents processed in this year")
+    subparser.add_argument("--limit", type = int, default = 20, help = "most results printed")
+
+    args = parser.parse_args(argv)
+    if args.command == "build-embeddings":
+        return build_embeddings(args)
+    if args.command == "build-index":
+        return build_index(args)
+    if args.command == "search":
+        return search(args)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
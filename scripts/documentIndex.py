@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from scripts import metrics
+from scripts.fileFunctions import findFiledPdf, QUARANTINE_FOLDER
+
+INDEX_FILENAME = ".smartscanner-index.sqlite" # kept in the destination root, next to the type folders
+REBUILD_BATCH = 1000                          # sidecars inserted per executemany() during a rebuild
+
+# searchable columns of the full-text index, with their weight in the ranking (a match in the subject counts more than one in the abstract)
+SEARCH_COLUMNS = {
+    "subject": 10.0,
+    "title": 10.0,
+    "author": 5.0,
+    "authors": 5.0,
+    "keywords": 4.0,
+    "conference": 2.0,
+    "location": 1.0,
+    "abstract": 1.0,
+}
+
+# HELPER: row of the documents table from a Document JSON dict (classification plus CRE metadata)
+def _documentRow(data):
+    classification = data.get("classification") or {}
+    metadata = data.get("metadata") or {}
+    return {
+        "type": (classification.get("type") or "").upper(),
+        "funding": classification.get("funding"),
+        "author": classification.get("author") or "",
+        "subject": classification.get("subject") or "",
+        "year": classification.get("year_processed") or "",
+        "title": metadata.get("title") or "",
+        "authors": "; ".join(metadata.get("authors") or []),
+        "keywords": "; ".join(metadata.get("keywords") or []),
+        "abstract": metadata.get("abstract") or "",
+        "conference": metadata.get("conference") or "",
+        "location": metadata.get("location") or "",
+    }
+
+# HELPER: INSERT of a documents row that replaces the row of the same sidecar
+def _upsertSql(columns):
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column != "json_path")
+    return (
+        f"INSERT INTO documents ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT(json_path) DO UPDATE SET {updates}"
+    )
+
+# HELPER: check whether any JSON sidecar was filed in the type folders of a destination root
+def _hasSidecars(destination_root):
+    if not os.path.isdir(destination_root):
+        return False
+    for folder in os.scandir(destination_root):
+        if folder.is_dir() and not folder.name.startswith(".") and folder.name != QUARANTINE_FOLDER:
+            if any(entry.name.lower().endswith(".json") for entry in os.scandir(folder.path)):
+                return True
+    return False
+
+# turn what the user typed into an FTS5 query and filters: every word must match (as a prefix),
+# "quoted words" must match as a phrase, and type:CRE / year:2024 filter on those fields
+def parseQuery(text):
+    terms, filters = [], {}
+    parts = text.split('"')
+    for i, part in enumerate(parts):
+        if i % 2 == 1: # inside quotes
+            words = part.split()
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        for word in part.split():
+            field, _, value = word.partition(":")
+            if value and field.lower() in ("type", "year"):
+                filters[field.lower()] = value.upper() if field.lower() == "type" else value
+                continue
+            word = "".join(c for c in word if c.isalnum() or c in "-_'").replace("'", "")
+            if word:
+                terms.append(f'"{word}"*') # quoted so words like AND/NOT or "-" are not read as operators
+    return " ".join(terms), filters
+
+# full-text index of the documents filed in a destination root, so they can be searched by keyword,
+# author, subject, ... without reading the JSON sidecars; paths are stored relative to the root.
+# `shared` is for a root several scanners file into, possibly from other machines over a network drive
+class DocumentIndex:
+    def __init__(self, destination_root, path = None, shared = False):
+        self.root = destination_root
+        self.path = path or os.path.join(destination_root, INDEX_FILENAME)
+        self.lock = threading.Lock()
+
+        is_new = not os.path.exists(self.path)
+
+        # the pipeline and a search panel or CLI may use the same index from different processes
+        self.connection = sqlite3.connect(self.path, timeout = 30, check_same_thread = False)
+        columns = ", ".join(SEARCH_COLUMNS)
+        new_columns = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+        old_columns = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+        with self.lock, self.connection:
+            # WAL needs memory shared between the processes, which a network drive doesn't provide; the mode is
+            # stored in the file, so an index switched to the rollback journal by a shared scanner stays that way
+            if is_new or shared:
+                self.connection.execute(f"PRAGMA journal_mode = {'DELETE' if shared else 'WAL'}")
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    json_path TEXT NOT NULL UNIQUE,
+                    pdf_path TEXT,
+                    type TEXT,
+                    funding TEXT,
+                    author TEXT,
+                    subject TEXT,
+                    year TEXT,
+                    title TEXT,
+                    authors TEXT,
+                    keywords TEXT,
+                    abstract TEXT,
+                    conference TEXT,
+                    location TEXT,
+                    updated REAL NOT NULL
+                )
+            ''')
+            self.connection.execute("CREATE INDEX IF NOT EXISTS documents_type_year ON documents (type, year)")
+
+            # external-content FTS5 table: the text is only stored once, in documents, and kept in sync by the triggers
+            self.connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5({columns}, content = 'documents', "
+                f"content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+            self.connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN "
+                f"INSERT INTO documents_fts (rowid, {columns}) VALUES (new.id, {new_columns}); END"
+            )
+            self.connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN "
+                f"INSERT INTO documents_fts (documents_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns}); END"
+            )
+            self.connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN "
+                f"INSERT INTO documents_fts (documents_fts, rowid, {columns}) VALUES ('delete', old.id, {old_columns}); "
+                f"INSERT INTO documents_fts (rowid, {columns}) VALUES (new.id, {new_columns}); END"
+            )
+            if is_new and not _hasSidecars(destination_root):
+                self.connection.execute("PRAGMA user_version = 1") # nothing filed before, it is complete as it is
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # HELPER: path relative to the destination root, as stored in the index
+    def relative(self, path):
+        return os.path.relpath(path, self.root) if path else None
+
+    # add or replace a filed document, keyed by its JSON sidecar; `document` is a Document or its JSON dict
+    def upsert(self, document, json_path, pdf_path = None):
+        data = document if isinstance(document, dict) else document.model_dump()
+        row = dict(_documentRow(data), json_path = self.relative(json_path), pdf_path = self.relative(pdf_path), updated = time.time())
+        with metrics.timed("index"):
+            with self.lock, self.connection:
+                self.connection.execute(_upsertSql(list(row)), list(row.values()))
+
+    # forget a document, e.g. when its sidecar was deleted
+    def remove(self, json_path):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM documents WHERE json_path = ?", (self.relative(json_path),))
+
+    # documents matching `text` (see parseQuery), best matches first; each result is a dict with the
+    # classification fields, the title, absolute pdf_path/json_path, a snippet around the match and
+    # its rank (lower is better, roughly comparable between the indexes of several destinations)
+    def search(self, text, limit = 50, doc_type = None, year = None):
+        match, filters = parseQuery(text)
+        doc_type = (doc_type or filters.get("type") or "").upper() or None
+        year = year or filters.get("year")
+
+        conditions, values = [], []
+        if doc_type:
+            conditions.append("d.type = ?")
+            values.append(doc_type)
+        if year:
+            conditions.append("d.year = ?")
+            values.append(year)
+
+        fields = "d.type, d.funding, d.author, d.subject, d.year, d.title, d.pdf_path, d.json_path"
+        if match:
+            weights = ", ".join(str(weight) for weight in SEARCH_COLUMNS.values())
+            sql = (
+                f"SELECT {fields}, snippet(documents_fts, -1, '[', ']', '...', 12), bm25(documents_fts, {weights}) FROM documents_fts "
+                f"JOIN documents d ON d.id = documents_fts.rowid WHERE documents_fts MATCH ?"
+                + "".join(f" AND {condition}" for condition in conditions)
+                + f" ORDER BY bm25(documents_fts, {weights}) LIMIT ?"
+            )
+            values = [match] + values
+        elif conditions:
+            sql = f"SELECT {fields}, '', 0 FROM documents d WHERE {' AND '.join(conditions)} ORDER BY d.updated DESC LIMIT ?"
+        else:
+            return []
+
+        with metrics.timed("search"):
+            with self.lock:
+                rows = self.connection.execute(sql, values + [limit]).fetchall()
+
+        results = []
+        for doc_type, funding, author, subject, year, title, pdf_path, json_path, snippet, rank in rows:
+            json_path = os.path.join(self.root, json_path)
+            pdf_path = os.path.join(self.root, pdf_path) if pdf_path else None
+            if pdf_path is None or not os.path.exists(pdf_path):
+                pdf_path = findFiledPdf(json_path) or pdf_path # renamed since, e.g. "[FOR REVIEW] " removed after review
+            results.append({
+                "type": doc_type, "funding": funding, "author": author, "subject": subject, "year": year,
+                "title": title, "pdf_path": pdf_path, "json_path": json_path, "snippet": snippet, "rank": rank,
+            })
+        return results
+
+    # True once the index was filled from the sidecars with rebuild(); an index created by the pipeline
+    # only has the documents committed since, not the ones filed before
+    def is_built(self):
+        with self.lock:
+            return self.connection.execute("PRAGMA user_version").fetchone()[0] >= 1
+
+    # replace the index with the JSON sidecars found in the type folders of the destination root;
+    # the sidecars are read first and written in a single short transaction, so a pipeline committing
+    # at the same time only waits for the write, and its documents are kept. Returns the number indexed
+    def rebuild(self, log = print):
+        started = time.time()
+        rows, skipped = [], 0
+        for doc_type in sorted(os.listdir(self.root)):
+            type_folder = os.path.join(self.root, doc_type)
+            if doc_type.startswith(".") or doc_type == QUARANTINE_FOLDER or not os.path.isdir(type_folder):
+                continue
+            for entry in os.scandir(type_folder):
+                if not entry.name.lower().endswith(".json") or not entry.is_file():
+                    continue
+                try:
+                    with open(entry.path, "r", encoding = "utf-8") as f:
+                        row = _documentRow(json.load(f))
+                except Exception as e:
+                    if entry.stat().st_size: # an empty file is a name reserved by a commit in progress
+                        log(f"Skipping {entry.name}: {e}")
+                    skipped += 1
+                    continue
+                row["type"] = row["type"] or doc_type.upper()
+                rows.append(dict(row, json_path = self.relative(entry.path), pdf_path = self.relative(findFiledPdf(entry.path))))
+
+        columns = list(_documentRow({})) + ["json_path", "pdf_path", "updated"]
+        sql = _upsertSql(columns)
+        updated = time.time()
+        with self.lock, self.connection:
+            for first in range(0, len(rows), REBUILD_BATCH):
+                self.connection.executemany(sql, [[row.get(column, updated) for column in columns] for row in rows[first:first + REBUILD_BATCH]])
+            # sidecars deleted or renamed since they were indexed; rows upserted by a commit during the scan are newer
+            self.connection.execute("DELETE FROM documents WHERE updated < ?", (started,))
+            self.connection.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+            self.connection.execute("PRAGMA user_version = 1")
+
+        log(f"Search index rebuilt with {len(rows)} document(s)" + (f", {skipped} skipped." if skipped else "."))
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,11 +1,260 @@
 # RESOURCE: https://docling-project.github.io/docling/examples/minimal/
 
+import queue
+import threading
+from importlib.metadata import version
+
+import pypdfium2
+from scripts import metrics
+from scripts.workerPool import RecyclingPool
+from docling.datamodel.base_models import InputFormat
 from docling.document_converter import DocumentConverter
 
-def parseDocument(filename):
-    pageRange = (1, 5) # adjust if needed
+# pool of warm converters shared by the worker threads, so the layout and OCR
+# models are only loaded once instead of on every file
+_converter_pool = queue.Queue()
+_pool_lock = threading.Lock()
+_pool_size = 1       # max number of converters alive at the same time
+_pool_created = 0    # number of converters created so far
+_pool_generation = 0 # bumped on shutdown so stale converters are not returned to the pool
+
+# optional pool of parser processes, used instead of the converter pool so parsing is not
+# limited to one core by the GIL, and so the memory Docling keeps can be given back by restarting them
+_process_pool = None
+_worker_converter = None # converter owned by a parser process
+
+PAGE_RANGE = (1, 5) # default pages to parse, adjust if needed
+
+# Docling could not build a converter (models missing or not downloadable, out of memory), no document can be parsed
+class ConverterUnavailable(RuntimeError):
+    pass
+
+# routes a document can take through parseDocumentWithRoute
+TEXT_LAYER = "text-layer"   # born-digital PDF, markdown built straight from its text layer
+DOCLING = "docling"         # scanned or complex PDF, full Docling layout and OCR pipeline
+
+# thresholds for trusting a page's text layer
+MIN_PAGE_CHARS = 40         # fewer characters than this is treated as a scan (or an empty text layer)
+MIN_READABLE_RATIO = 0.85   # share of letters, digits, spaces and common punctuation, broken font encodings fail this
+MAX_PATH_OBJECTS = 150      # more vector paths than this (table borders, forms) is left to Docling's layout model
+MAX_IMAGE_COVERAGE = 0.5    # pages mostly covered by images are scans, even with an OCR text layer
+
+# version of the parser output, cached markdown with a different version is parsed again
+def getParserVersion(pageRange = PAGE_RANGE, fastPath = True):
+    route = "textlayer-" if fastPath else ""
+    return f"{route}docling-{version('docling')}-pages-{pageRange[0]}-{pageRange[1]}"
+
+# number of pages in a PDF, read from the page tree without parsing any page
+def getPageCount(filename):
+    pdf = pypdfium2.PdfDocument(filename)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+# HELPER: build a converter and load its PDF pipeline (models) right away
+def _createConverter():
     converter = DocumentConverter()
-    result = converter.convert(filename, page_range = pageRange)
+    converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+# take a converter from the pool, creating one if the pool is not full yet
+def _acquireConverter():
+    global _pool_created
+
+    while True:
+        try:
+            return _converter_pool.get_nowait(), _pool_generation
+        except queue.Empty:
+            pass
+
+        with _pool_lock:
+            create = _pool_created < _pool_size
+            if create:
+                _pool_created += 1
+            generation = _pool_generation
+
+        if create:
+            try:
+                return _createConverter(), generation
+            except Exception as e:
+                with _pool_lock:
+                    _pool_created -= 1
+                raise ConverterUnavailable(f"Docling could not be started: {e}") from e
+
+        # pool is full, wait for another thread to give one back (re-check in case of a shutdown)
+        try:
+            return _converter_pool.get(timeout = 1), _pool_generation
+        except queue.Empty:
+            continue
+
+# give a converter back to the pool after use
+def _releaseConverter(converter, generation):
+    with _pool_lock:
+        if generation == _pool_generation:
+            _converter_pool.put(converter)
+
+# preload converters in a background thread so the first file does not pay for model loading
+def warmUpConverter(size = 1):
+    global _pool_size
+
+    with _pool_lock:
+        _pool_size = max(1, size)
+
+    def warm_up():
+        global _pool_created
+        while True:
+            with _pool_lock:
+                if _pool_created >= _pool_size:
+                    return
+                _pool_created += 1
+                generation = _pool_generation
+            try:
+                converter = _createConverter()
+            except Exception as e:
+                with _pool_lock:
+                    _pool_created -= 1
+                print(f"Converter warm-up failed: {e}")
+                return
+            _releaseConverter(converter, generation)
+            print("Docling converter ready.")
+
+    thread = threading.Thread(target = warm_up, daemon = True)
+    thread.start()
+    return thread
+
+# HELPER: runs once in every parser process, loads the models before the first document arrives
+def _initWorker():
+    global _worker_converter
+    _worker_converter = _createConverter()
+
+# HELPER: runs in a parser process, only the markdown string is sent back to the parent
+def _parseInWorker(filename, pageRange):
+    result = _worker_converter.convert(filename, page_range = pageRange)
+    return result.document.export_to_markdown()
+
+# start N parser processes, each with its own preloaded converter; a process is replaced by a fresh
+# one after `max_documents` documents or once it uses more than `max_rss_mb` MB (0 for no limit)
+def startParserProcesses(processes, max_documents = 0, max_rss_mb = 0):
+    global _process_pool
+
+    stopParserProcesses()
+    _process_pool = RecyclingPool(processes, _initWorker, max_documents = max_documents, max_rss_mb = max_rss_mb, name = "parser")
+    return _process_pool
+
+# stop the parser processes, documents that are mid-parse still finish
+def stopParserProcesses():
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown()
+        _process_pool = None
+
+# drop all pooled converters so their models can be freed, in-flight conversions finish normally
+def shutdownConverter():
+    global _pool_created, _pool_generation
+
+    with _pool_lock:
+        _pool_generation += 1
+        _pool_created = 0
+        while True:
+            try:
+                _converter_pool.get_nowait()
+            except queue.Empty:
+                break
+
+    stopParserProcesses()
+
+# HELPER: markdown of one page's text layer, None if the page should go through Docling
+def _pageTextLayer(page):
+    textpage = page.get_textpage()
+    try:
+        text = textpage.get_text_range()
+    finally:
+        textpage.close()
+
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < MIN_PAGE_CHARS:
+        return None
+    readable = sum(1 for c in visible if c.isalnum() or c in ".,;:!?'\"()[]-/&%$#@*+=_") / len(visible)
+    if readable < MIN_READABLE_RATIO:
+        return None
+
+    page_area = page.get_width() * page.get_height()
+    image_area = 0.0
+    paths = 0
+    for obj in page.get_objects():
+        if obj.type == pypdfium2.raw.FPDF_PAGEOBJ_IMAGE:
+            left, bottom, right, top = obj.get_bounds() if hasattr(obj, "get_bounds") else obj.get_pos() # get_pos before pypdfium2 5
+            image_area += max(0.0, right - left) * max(0.0, top - bottom)
+        elif obj.type == pypdfium2.raw.FPDF_PAGEOBJ_PATH:
+            paths += 1
+    if paths > MAX_PATH_OBJECTS or (page_area and image_area / page_area > MAX_IMAGE_COVERAGE):
+        return None
+
+    # one markdown line per text line, runs of blank lines collapsed into paragraph breaks
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+# markdown straight from the PDF text layer of the given pages, None if any page needs Docling
+def parseTextLayer(filename, pageRange = PAGE_RANGE):
+    try:
+        pdf = pypdfium2.PdfDocument(filename)
+    except pypdfium2.PdfiumError:
+        return None
+
+    try:
+        first, last = pageRange[0], min(pageRange[1], len(pdf))
+        pages = []
+        for index in range(first - 1, last):
+            page = pdf[index]
+            try:
+                markdown = _pageTextLayer(page)
+            finally:
+                page.close()
+            if markdown is None:
+                return None
+            pages.append(markdown)
+        if not pages:
+            return None
+        metrics.PAGES.inc(len(pages), route = TEXT_LAYER)
+        return "\n\n".join(pages)
+    finally:
+        pdf.close()
+
+# parse the given pages and report which route was used (TEXT_LAYER or DOCLING),
+# `pool` is the RecyclingPool returned by startParserProcesses() if Docling runs there
+def parseDocumentWithRoute(filename, pageRange = PAGE_RANGE, fastPath = True, pool = None):
+    if fastPath:
+        with metrics.timed(TEXT_LAYER):
+            markdown = parseTextLayer(filename, pageRange)
+        if markdown is not None:
+            return markdown, TEXT_LAYER
+
+    with metrics.timed(DOCLING):
+        markdown = parseDocument(filename, pageRange, fastPath = False, pool = pool)
+    metrics.PAGES.inc(max(0, min(pageRange[1], getPageCount(filename)) - pageRange[0] + 1), route = DOCLING)
+    return markdown, DOCLING
+
+# parse the given pages (first and last page, 1-based) of a PDF into markdown
+def parseDocument(filename, pageRange = PAGE_RANGE, fastPath = False, pool = None):
+    if fastPath:
+        return parseDocumentWithRoute(filename, pageRange, pool = pool)[0]
+
+    # parser processes were started for the caller, let one of them do the work; once they are stopped
+    # this raises PoolStopped rather than loading Docling into this process
+    if pool is not None:
+        return pool.call(_parseInWorker, filename, pageRange)
+
+    converter, generation = _acquireConverter()
+    try:
+        result = converter.convert(filename, page_range = pageRange)
+    finally:
+        _releaseConverter(converter, generation)
 
     # convert to markdown file
     doc = result.document.export_to_markdown()
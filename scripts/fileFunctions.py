@@ -1,12 +1,17 @@
 import os
 import sys
 import json
-import time
+import errno
 import shutil
+import itertools
+
+from scripts import metrics
 
 # returns the path to the configuration JSON file
 def get_config_path():
     appdata_dir = os.environ.get("APPDATA") # get %AppData% directory of current user
+    if not appdata_dir:
+        appdata_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config") # Linux/macOS
     app_folder = os.path.join(appdata_dir, "SmartScanner") # create subfolder
 
     os.makedirs(app_folder, exist_ok = True)
@@ -15,6 +20,60 @@ def get_config_path():
 
 CONFIG_PATH = get_config_path() # global constant for config path
 
+QUARANTINE_FOLDER = "Quarantine" # folder of the destination root where documents that could not be processed are moved
+
+# default values for the optional tuning settings in config.json
+DEFAULT_SETTINGS = {
+    "parse_workers": 1,     # threads running Docling
+    "parse_processes": 1,   # processes running Docling, 0 parses inside the worker threads
+    "worker_max_documents": 500, # documents parsed by a parser process before it is replaced by a fresh one, 0 for no limit
+    "worker_max_rss_mb": 4096,   # memory above which a parser process is replaced after its current document, 0 for no limit
+    "analyze_workers": 1,   # threads sending documents to Ollama
+    "retry_attempts": 3,    # times a document is tried again after a connection error or timeout
+    "retry_backoff": 5.0,   # seconds before the first retry, doubled for each of the next ones
+    "retry_max_delay": 300, # longest wait before a retry, in seconds
+    "quarantine_enabled": True, # move documents that fail for another reason to the Quarantine folder of the destination
+    "commit_workers": 1,    # threads writing JSON files and moving documents
+    "queue_size": 4,        # max jobs waiting between two pipeline stages
+    "queue_order": "fifo",  # "fifo" or "sjf" (shortest job first, by estimated page count)
+    "quiet_period": 2.0,    # seconds a new file must stay unchanged before it is queued
+    "pending_max_wait": 300, # seconds after which a file that never became complete is queued anyway (dropped if empty)
+    "recursive_watch": False, # also watch the subfolders of the source folder
+    "shared_queue_enabled": False, # coordinate with other scanners watching the same source folders through leases, see sharedQueue
+    "lease_ttl": 60,        # seconds without a heartbeat before another scanner takes over a file
+    "lease_heartbeat": 10,  # seconds between two renewals of the leases held by this scanner
+    "sources": [],          # several intake folders, each {"name", "source_path", "destination_path", "weight"}; empty uses source_path/destination_path
+    "log_scrollback": 5000, # messages kept in the terminal panel, older ones are only in the log file
+    "log_file_max_mb": 10,  # size of smartscanner.log before it is rotated
+    "log_file_backups": 5,  # rotated log files kept
+    "timing_in_json": True, # add a "timing" block (seconds per stage, step and Ollama call) to each JSON file
+    "metrics_port": 0,      # serve Prometheus metrics on http://127.0.0.1:PORT/metrics, 0 to disable
+    "metrics_file": None,   # also write them to this file every 15 seconds (node_exporter textfile collector)
+    "search_index_enabled": True, # keep a full-text index of the filed documents in the destination root
+    "journal_enabled": True, # record each stage per file so a restart resumes where it stopped
+    "cache_enabled": True,  # reuse results of files that were already processed
+    "cache_max_mb": 512,    # size of the result cache before old entries are evicted
+    "text_layer_fast_path": True, # read born-digital PDFs from their text layer, Docling only for scans
+    "initial_pages": 1,     # pages parsed before the first classification
+    "page_limits": {        # max pages parsed per document type when more are needed
+        "CRE": 5,
+        "default": 5,
+    },
+    "prompt_token_budget": 3000, # estimated tokens of the document put in a prompt, the rest is compacted away, 0 to disable
+    "analysis_mode": "two-call", # "two-call", "multi-turn" or "combined", see aiFunctions.ANALYSIS_MODES
+    "ollama_host": None,        # Ollama server, None uses OLLAMA_HOST or the local default
+    "ollama_concurrency": 0,    # Ollama requests in flight at once, 0 uses the blocking client
+    "ollama_timeout": 300,      # seconds before an Ollama request is given up
+    "ollama_keep_alive": "30m", # how long Ollama keeps the model loaded after the last request
+    "ollama_backends": [],      # several Ollama servers: "http://host:11434" or {"host": ..., "concurrency": N}
+    "ollama_health_interval": 10, # seconds between two health checks of the Ollama backends
+    "preclassify_enabled": False,           # pick the type from similar filed documents instead of the LLM
+    "embedding_model": "nomic-embed-text",  # Ollama model used for the document embeddings
+    "preclassify_threshold": 0.9,           # min cosine similarity to accept the type of the nearest documents
+    "preclassify_neighbours": 5,            # number of nearest documents voting on the type
+    "template_threshold": None,             # reuse a whole earlier classification above this similarity, None to disable
+}
+
 # UNUSED FUNC
 def getSource(parentFolder):
     source = parentFolder + input("Enter PDF name with extension (should be in testDocuments folder): ")
@@ -80,8 +139,6 @@ def moveDocument(filepath, new_filename, file_type, destination_root):
     type_folder = os.path.join(destination_root, file_type)
     os.makedirs(type_folder, exist_ok = True)
 
-    time.sleep(1) # giving the program a quick rest
-
     destination_path = os.path.join(type_folder, f"[FOR REVIEW] {new_filename}")
     shutil.move(filepath, destination_path)
     print(f"Renamed file and moved file to destination: {destination_path}")
@@ -95,6 +152,119 @@ def moveJSON(json_path, author, subject, year, file_type, destination_root):
     shutil.move(json_path, json_destination_path)
     print(f"JSON file created at: {json_destination_path}\n")
 
+# new filename (without extension) and type folder of a document, built from its classification
+def getNewFilename(document):
+    classification = document.classification
+    author = sanitizeFilename(classification.author or "") or "UnknownAuthor"
+    subject = sanitizeFilename(classification.subject or "") or "NoSubject"
+    year = sanitizeFilename(classification.year_processed or "") or "UnknownYear"
+    return f"{author} - {subject} - {year}", classification.type or "Uncategorized"
+
+# pick free destination paths for the PDF and its JSON file, adding " (2)", " (3)", ... when a document
+# with the same name was already filed; the name is reserved by creating the JSON file exclusively,
+# so two commits running at the same time can never choose the same one
+def reserveDestination(type_folder, name, extension = ".pdf"):
+    with metrics.timed("reserve"):
+        return _reserveDestination(type_folder, name, extension)
+
+def _reserveDestination(type_folder, name, extension):
+    os.makedirs(type_folder, exist_ok = True)
+    for counter in itertools.count(1):
+        candidate = name if counter == 1 else f"{name} ({counter})"
+        pdf_destination = os.path.join(type_folder, f"[FOR REVIEW] {candidate}{extension}")
+        json_destination = os.path.join(type_folder, f"{candidate}.json")
+        if os.path.exists(pdf_destination) or os.path.exists(os.path.join(type_folder, f"{candidate}{extension}")):
+            continue # filed earlier, possibly already reviewed (prefix removed)
+        try:
+            os.close(os.open(json_destination, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        return pdf_destination, json_destination
+
+# write the JSON file of a document in place: a temp file in the same folder replaces the destination,
+# so the destination is never half-written; `timing` is added as a "timing" block when given
+def writeJSONAtomic(document, json_destination, timing = None):
+    data = document.model_dump()
+    if timing is not None:
+        data["timing"] = timing
+    temp_path = f"{json_destination}.tmp"
+    with metrics.timed("json_write"):
+        with open(temp_path, "w", encoding = "utf-8") as f:
+            json.dump(data, f, ensure_ascii = False, indent = 4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, json_destination)
+
+# move a file without overwriting: a rename on the same filesystem, a streamed copy to another one
+def moveFile(source, destination):
+    if os.path.exists(destination):
+        raise FileExistsError(f"{destination} already exists")
+    with metrics.timed("move"):
+        _moveFile(source, destination)
+
+def _moveFile(source, destination):
+    try:
+        os.rename(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        temp_path = f"{destination}.tmp"
+        shutil.copyfile(source, temp_path) # chunked copy, uses sendfile/CopyFile when available
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, destination)
+        os.remove(source)
+
+# write the JSON and then move the PDF to their final paths; safe to call again after a crash at any point,
+# and since the PDF is moved last, a filed PDF always has its JSON file next to it
+def commitDocument(document, filepath, pdf_destination, json_destination, timing = None):
+    os.makedirs(os.path.dirname(json_destination), exist_ok = True)
+    writeJSONAtomic(document, json_destination, timing)
+    print(f"JSON file created at: {json_destination}\n")
+
+    if os.path.exists(filepath):
+        moveFile(filepath, pdf_destination)
+        print(f"Renamed file and moved file to destination: {pdf_destination}")
+    elif not os.path.exists(pdf_destination):
+        raise FileNotFoundError(f"{filepath} is gone and was never moved to {pdf_destination}")
+
+    return pdf_destination
+
+# move a document that could not be processed to the quarantine folder of a destination root, with an
+# "<name>.error.json" sidecar describing the error (`details`, a dict); a number is added to the name
+# when another document with the same name is already there. Returns the new path of the document
+def quarantineDocument(filepath, destination_root, details):
+    folder = os.path.join(destination_root, QUARANTINE_FOLDER)
+    os.makedirs(folder, exist_ok = True)
+    name, extension = os.path.splitext(os.path.basename(filepath))
+    for counter in itertools.count(1):
+        candidate = name if counter == 1 else f"{name} ({counter})"
+        quarantine_path = os.path.join(folder, f"{candidate}{extension}")
+        error_path = os.path.join(folder, f"{candidate}.error.json")
+        if os.path.exists(quarantine_path):
+            continue
+        try:
+            os.close(os.open(error_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)) # reserved like reserveDestination()
+        except FileExistsError:
+            continue
+        break
+
+    temp_path = f"{error_path}.tmp"
+    with open(temp_path, "w", encoding = "utf-8") as f:
+        json.dump(dict(details, quarantined_as = quarantine_path), f, ensure_ascii = False, indent = 4)
+    os.replace(temp_path, error_path)
+    moveFile(filepath, quarantine_path)
+    print(f"Moved {filepath} to quarantine: {quarantine_path}")
+    return quarantine_path
+
+# find the PDF filed next to a JSON sidecar, with or without the "[FOR REVIEW] " prefix
+def findFiledPdf(json_path):
+    folder = os.path.dirname(json_path)
+    name = os.path.splitext(os.path.basename(json_path))[0]
+    for candidate in (f"[FOR REVIEW] {name}.pdf", f"{name}.pdf"):
+        if os.path.exists(os.path.join(folder, candidate)):
+            return os.path.join(folder, candidate)
+    return None
+
 # return working directory
 def getDefaultPath():
     return os.getcwd()  # Use current directory as default
@@ -112,6 +282,10 @@ def loadConfig():
         saveConfig(getDefaultPath(), getDefaultPath())
         return {"source": getDefaultPath(), "destination": getDefaultPath()}
 
+# read an optional setting from the loaded config, falling back to its default value
+def getSetting(config, key):
+    return config.get(key, DEFAULT_SETTINGS[key])
+
 # save the set src and dst folders to config file
 def saveConfig(source, destination):
     config = {
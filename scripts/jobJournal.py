@@ -0,0 +1,73 @@
+import os
+import time
+import sqlite3
+import threading
+
+from scripts.fileFunctions import CONFIG_PATH
+
+JOURNAL_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "journal.sqlite") # stored next to config.json
+
+# stages a file goes through, in order; a committed file is removed from the journal
+PARSED = "parsed"           # markdown saved
+ANALYZED = "analyzed"       # Document JSON saved
+COMMITTING = "committing"   # destination paths decided, files are being written/moved
+
+# durable write-ahead journal of the pipeline: every stage is recorded before the next one starts,
+# so after a crash each file resumes at the stage where it stopped instead of starting over
+class JobJournal:
+    def __init__(self, path = JOURNAL_PATH):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout = 30, check_same_thread = False) # shared by the scanners running on this machine
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = FULL") # a recorded stage survives a power cut
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    path TEXT PRIMARY KEY,
+                    sha256 TEXT,
+                    stage TEXT NOT NULL,
+                    markdown TEXT,
+                    pages INTEGER,
+                    document TEXT,
+                    pdf_destination TEXT,
+                    json_destination TEXT,
+                    updated REAL NOT NULL
+                )
+            ''')
+
+    # save the stage a file has reached, with the data needed to resume from it
+    def record(self, path, stage, **fields):
+        columns = ["path", "stage", "updated"] + list(fields)
+        values = [path, stage, time.time()] + list(fields.values())
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT(path) DO UPDATE SET {updates}",
+                values
+            )
+
+    # the journal entry of a file as a dict, None if it has none
+    def lookup(self, path):
+        with self.lock:
+            cursor = self.connection.execute("SELECT * FROM jobs WHERE path = ?", (path,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    # entries that were interrupted while committing
+    def interruptedCommits(self):
+        with self.lock:
+            cursor = self.connection.execute("SELECT * FROM jobs WHERE stage = ?", (COMMITTING,))
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # the file is committed, nothing left to resume
+    def finish(self, path):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM jobs WHERE path = ?", (path,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
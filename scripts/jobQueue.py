@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+
+from scripts import metrics
+from scripts.sources import SOURCE_QUEUE_DEPTH, SOURCE_WAIT_SECONDS
+
+PAGE_COUNT_PATTERN = re.compile(rb"/Count\s+(\d+)")
+MAX_SCAN_BYTES = 8 * 1024 * 1024 # files are only scanned up to this size for their page count
+BYTES_PER_PAGE = 100 * 1024      # rough page estimate for files where /Count can't be found
+
+# estimate how expensive a PDF is to process, in pages
+def estimateCost(filepath):
+    try:
+        size = os.path.getsize(filepath)
+        with open(filepath, "rb") as f:
+            data = f.read(MAX_SCAN_BYTES)
+    except OSError:
+        return 1
+
+    # the page tree root holds the total page count, so it is the biggest /Count in the file
+    counts = [int(count) for count in PAGE_COUNT_PATTERN.findall(data)]
+    if counts:
+        return max(1, max(counts))
+    return max(1, size // BYTES_PER_PAGE)
+
+# orderings for the job queue, each one maps (cost, sequence number) to a sort key
+ORDERINGS = {
+    "fifo": lambda cost, seq: (seq,),       # first come, first served
+    "sjf": lambda cost, seq: (cost, seq),   # shortest job first, small memos skip past big reports
+}
+
+# thread-safe queue of files waiting to be processed, shared by the event handlers and the worker.
+# With several sources each one has its own queue in `ordering`, and the next file comes from the source
+# that used the least pipeline time for its weight so far (weighted fair queueing, the time being the
+# estimated pages), so a backfill of thousands of files in one folder can't hold back the others
+class JobQueue:
+    def __init__(self, ordering = "fifo", on_change = None, sources = None):
+        self.key = ORDERINGS[ordering] if isinstance(ordering, str) else ordering
+        self.on_change = on_change          # called as on_change(action, path) with action "added" or "removed"
+        self.sources = sources              # optional Sources the files are shared fairly between, None for one queue
+        self.condition = threading.Condition()
+        self.heaps = {}                     # source name -> heap of [key, path, source name, cost, time queued, projected time],
+                                            # removed entries stay in the heap with path None
+        self.counts = {}                    # source name -> files queued
+        self.backlog = {}                   # source name -> estimated pages queued
+        self.vtimes = {}                    # source name -> virtual time: pages taken so far divided by its weight
+        self.clock = 0.0                    # virtual time of the source the last file was taken from
+        self.entries = {}                   # path -> heap entry, for O(1) dedup and removal
+        self.inodes = {}                    # (device, inode) -> path, catches the same file under another name
+        self.file_ids = {}                  # path -> (device, inode), reverse of inodes
+        self.sequence = itertools.count()
+        self.closed = False
+        metrics.QUEUE_DEPTH.set_function(self.__len__, stage = "waiting") # files not yet submitted to the pipeline
+        for source in sources or []:
+            SOURCE_QUEUE_DEPTH.set_function(lambda name = source.name: self.counts.get(name, 0), source = source.name, state = "waiting")
+
+    def __len__(self):
+        with self.condition:
+            return len(self.entries)
+
+    def __contains__(self, path):
+        with self.condition:
+            return path in self.entries
+
+    # sort key of a queued file, None if it is not queued (anymore); with several sources it is the
+    # virtual time the file was expected to be taken at when it was queued, so the order is approximate
+    def key_of(self, path):
+        with self.condition:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            return (entry[5], entry[0]) if self.sources is not None and len(self.sources) > 1 else entry[0]
+
+    # HELPER: (device, inode) of a file, None if it can't be read
+    def file_id(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not stat.st_ino:
+            return None # some filesystems don't report inodes
+        return (stat.st_dev, stat.st_ino)
+
+    # HELPER: name of the source a file belongs to, None without sources
+    def source_of(self, path):
+        return self.sources.match(path).name if self.sources is not None else None
+
+    # HELPER: weight of a source
+    def weight(self, name):
+        return self.sources[name].weight if self.sources is not None else 1.0
+
+    # add a file, returns False if it is already queued
+    def put(self, path, cost = None):
+        file_id = self.file_id(path)
+        if cost is None:
+            cost = estimateCost(path)
+        name = self.source_of(path)
+
+        renamed_from = None
+        with self.condition:
+            if self.closed or path in self.entries:
+                return False
+
+            # same file already queued under another name (renamed in the source folder)
+            previous = self.inodes.get(file_id) if file_id else None
+            if previous is not None:
+                renamed_from = previous
+                self.discard(previous)
+
+            if not self.counts.get(name):
+                # idle until now: it starts at the current virtual time instead of making up for the time it did not use
+                self.vtimes[name] = max(self.vtimes.get(name, 0.0), self.clock)
+            projected = self.vtimes[name] + self.backlog.get(name, 0) / self.weight(name)
+            entry = [self.key(cost, next(self.sequence)), path, name, cost, time.perf_counter(), projected]
+            heapq.heappush(self.heaps.setdefault(name, []), entry)
+            self.entries[path] = entry
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.backlog[name] = self.backlog.get(name, 0) + cost
+            if file_id:
+                self.inodes[file_id] = path
+                self.file_ids[path] = file_id
+            self.condition.notify()
+
+        if self.on_change:
+            if renamed_from is not None:
+                self.on_change("removed", renamed_from)
+            self.on_change("added", path)
+        return True
+
+    # HELPER: remove a path from the indexes, caller must hold the condition
+    def discard(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return False
+        entry[1] = None # lazily dropped from the heap by get()
+        self.counts[entry[2]] -= 1
+        self.backlog[entry[2]] -= entry[3]
+        file_id = self.file_ids.pop(path, None)
+        if file_id is not None:
+            del self.inodes[file_id]
+        return True
+
+    # remove a file that is no longer wanted (e.g. deleted from the source folder)
+    def remove(self, path):
+        with self.condition:
+            removed = self.discard(path)
+        if removed and self.on_change:
+            self.on_change("removed", path)
+        return removed
+
+    # HELPER: (name, heap) of the source the next file is taken from, the one with files queued and the
+    # lowest virtual time, None if no file is queued; caller must hold the condition
+    def next_source(self):
+        best = None
+        for name, heap in self.heaps.items():
+            while heap and heap[0][1] is None:
+                heapq.heappop(heap)
+            if heap and (best is None or self.vtimes[name] < self.vtimes[best[0]]):
+                best = (name, heap)
+        return best
+
+    # take the next file, waits until one is available, returns None on timeout or when closed
+    def get(self, timeout = None):
+        with self.condition:
+            while True:
+                source = self.next_source()
+                if source is not None:
+                    name, heap = source
+                    entry = heapq.heappop(heap)
+                    path = entry[1]
+                    self.clock = self.vtimes[name]
+                    self.vtimes[name] += entry[3] / self.weight(name) # charged for the pages it will use
+                    self.discard(path)
+                    break
+                if self.closed or not self.condition.wait(timeout):
+                    return None
+
+        if self.sources is not None:
+            SOURCE_WAIT_SECONDS.observe(time.perf_counter() - entry[4], source = name)
+        if self.on_change:
+            self.on_change("removed", path)
+        return path
+
+    # queued files in the order they will be processed
+    def snapshot(self):
+        with self.condition:
+            queues = {name: sorted(entry for entry in heap if entry[1] is not None) for name, heap in self.heaps.items()}
+            vtimes = dict(self.vtimes)
+
+        # replay get() on a copy of the virtual times
+        order, positions = [], dict.fromkeys(queues, 0)
+        while True:
+            waiting = [name for name in queues if positions[name] < len(queues[name])]
+            if not waiting:
+                return order
+            name = min(waiting, key = lambda name: vtimes[name])
+            entry = queues[name][positions[name]]
+            positions[name] += 1
+            vtimes[name] += entry[3] / self.weight(name)
+            order.append(entry[1])
+
+    # wake up every waiting worker, no more files are accepted
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,275 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# upper bounds of the latency histogram buckets, in seconds (from JSON writes to long Ollama calls)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# HELPER: label dict as a sorted tuple, used as key of the values of a metric
+def _labelKey(labels):
+    return tuple(sorted((labels or {}).items()))
+
+# HELPER: labels in the Prometheus text format, e.g. {stage="parse"}
+def _formatLabels(key, extra = ()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+# HELPER: float in the Prometheus text format
+def _formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# value that only goes up, e.g. documents processed
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount = 1, **labels):
+        key = _labelKey(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            return [f"{self.name}{_formatLabels(key)} {_formatValue(value)}" for key, value in sorted(self.values.items())]
+
+# value that goes up and down, either set directly or read from a function when exported (e.g. queue depth)
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self.lock = threading.Lock()
+        self.values = {}
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_labelKey(labels)] = value
+
+    # read the value from `function` at export time, replaces an earlier function with the same labels
+    def set_function(self, function, **labels):
+        with self.lock:
+            self.functions[_labelKey(labels)] = function
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return [f"{self.name}{_formatLabels(key)} {_formatValue(value)}" for key, value in sorted(values.items())]
+
+# distribution of observed values in cumulative buckets, e.g. latencies
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets = LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {} # label key -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        key = _labelKey(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[bisect.bisect_left(self.buckets, value)] += 1 # the last bucket is +Inf
+            entry[-1] += value
+
+    # number and sum of the values observed with these labels
+    def summary(self, **labels):
+        with self.lock:
+            entry = self.values.get(_labelKey(labels))
+            if entry is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(entry[:-1]), "sum": entry[-1]}
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted((key, list(entry)) for key, entry in self.values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_formatLabels(key, [('le', _formatValue(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_count{_formatLabels(key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_formatLabels(key)} {_formatValue(entry[-1])}")
+        return lines
+
+# all the metrics of the app, rendered together in the Prometheus text format
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    # HELPER: existing metric with this name, or a new one
+    def register(self, cls, name, help, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help):
+        return self.register(Counter, name, help)
+
+    def gauge(self, name, help):
+        return self.register(Gauge, name, help)
+
+    def histogram(self, name, help, buckets = LATENCY_BUCKETS):
+        return self.register(Histogram, name, help, buckets = buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# metrics recorded by the pipeline and the functions it calls
+STAGE_SECONDS = REGISTRY.histogram("smartscanner_stage_seconds", "Time spent in each pipeline stage per document.")
+STEP_SECONDS = REGISTRY.histogram("smartscanner_step_seconds", "Time spent in each step (Docling, text layer, Ollama calls, JSON write, move).")
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("smartscanner_queue_wait_seconds", "Time a document waited in the queue before each stage.")
+QUEUE_DEPTH = REGISTRY.gauge("smartscanner_queue_depth", "Documents waiting in front of each stage.")
+DOCUMENTS = REGISTRY.counter("smartscanner_documents_total", "Documents committed, by classification type.")
+FAILURES = REGISTRY.counter("smartscanner_failures_total", "Errors while processing documents (retried ones included), by stage and error class.")
+PAGES = REGISTRY.counter("smartscanner_pages_parsed_total", "Pages parsed, by route.")
+OLLAMA_SECONDS = REGISTRY.histogram("smartscanner_ollama_request_seconds", "Duration of Ollama chat requests as seen by the client, by call.")
+OLLAMA_TOKENS = REGISTRY.counter("smartscanner_ollama_tokens_total", "Tokens processed by Ollama, by call and kind (prompt or eval).")
+OLLAMA_SERVER_SECONDS = REGISTRY.counter("smartscanner_ollama_server_seconds_total", "Time reported by Ollama, by call and phase (load, prompt_eval, eval).")
+
+# per-document timing block of the job being processed by the current thread, see activate()
+_current = threading.local()
+
+# new, empty per-document timing block
+def newTiming():
+    return {"stages": {}, "waits": {}, "steps": {}, "ollama": []}
+
+# record the steps run by this thread into `timing` until deactivate() is called
+def activate(timing):
+    _current.timing = timing
+
+def deactivate():
+    _current.timing = None
+
+# the timing block of the document processed by this thread, None outside the pipeline
+def currentTiming():
+    return getattr(_current, "timing", None)
+
+# time a step, e.g. `with timed("docling"):`; it is added to the histogram and to the document's timing block
+@contextmanager
+def timed(step):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STEP_SECONDS.observe(seconds, step = step)
+        timing = currentTiming()
+        if timing is not None:
+            timing["steps"][step] = round(timing["steps"].get(step, 0.0) + seconds, 4)
+
+# record an Ollama chat response: client-side duration plus the token counts and durations Ollama reports
+def observeOllama(call, response, seconds):
+    OLLAMA_SECONDS.observe(seconds, call = call)
+    STEP_SECONDS.observe(seconds, step = call)
+
+    entry = {"call": call, "seconds": round(seconds, 4)}
+    for field, kind in (("prompt_eval_count", "prompt"), ("eval_count", "eval")):
+        count = getattr(response, field, None)
+        if count is not None:
+            OLLAMA_TOKENS.inc(count, call = call, kind = kind)
+            entry[f"{kind}_tokens"] = count
+    for field, phase in (("load_duration", "load"), ("prompt_eval_duration", "prompt_eval"), ("eval_duration", "eval")):
+        duration = getattr(response, field, None)
+        if duration is not None:
+            OLLAMA_SERVER_SECONDS.inc(duration / 1e9, call = call, phase = phase) # reported in nanoseconds
+            entry[f"{phase}_seconds"] = round(duration / 1e9, 4)
+
+    timing = currentTiming()
+    if timing is not None:
+        timing["ollama"].append(entry)
+        timing["steps"][call] = round(timing["steps"].get(call, 0.0) + seconds, 4)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+# HELPER: write the metrics to a file for the node_exporter textfile collector (temp file + rename)
+def writeMetricsFile(path):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding = "utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(temp_path, path)
+
+_server = None
+_file_thread = None
+_file_path = None
+
+# export the metrics over HTTP (http://127.0.0.1:PORT/metrics) and/or to a file rewritten every `interval`
+# seconds; calling it again (e.g. when monitoring is restarted) keeps the running exporters
+def startExport(port = 0, path = None, interval = 15, host = "127.0.0.1"):
+    global _server, _file_thread, _file_path
+
+    if port and _server is None:
+        try:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target = _server.serve_forever, name = "metrics-http", daemon = True).start()
+            print(f"Metrics available at http://{host}:{port}/metrics")
+        except OSError as e:
+            _server = None
+            print(f"Could not start the metrics server on port {port}: {e}")
+
+    if path and _file_thread is None:
+        _file_path = path
+        def write_forever():
+            while True:
+                try:
+                    writeMetricsFile(path)
+                except OSError as e:
+                    print(f"Could not write metrics to {path}: {e}")
+                time.sleep(interval)
+        _file_thread = threading.Thread(target = write_forever, name = "metrics-file", daemon = True)
+        _file_thread.start()
+
+# write the metrics file right away, e.g. when the pipeline has finished
+def flushExport():
+    if _file_path is not None:
+        try:
+            writeMetricsFile(_file_path)
+        except OSError as e:
+            print(f"Could not write metrics to {_file_path}: {e}")
@@ -0,0 +1,760 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import traceback
+
+from pydantic import ValidationError
+
+from scripts.documentParser import (
+    parseDocumentWithRoute, getPageCount, warmUpConverter, startParserProcesses, getParserVersion, ConverterUnavailable
+)
+from scripts.aiFunctions import (
+    classifyDocument, extractMetadata, analyzeCombined, missingFields, getAnalysisVersion,
+    Document, MULTI_TURN, COMBINED, KEEP_ALIVE
+)
+from scripts import metrics
+from scripts.promptCompactor import compactDocument
+from scripts.workerPool import currentRssMb, peakRssMb, PoolStopped, PoolUnavailable
+from scripts.resultCache import ResultCache, hashFile
+from scripts.analysisService import AnalysisService, AnalysisCancelled
+from scripts.backendPool import BackendPool, parseBackends, ollamaHosts
+from scripts.preClassifier import PreClassifier
+from scripts.documentIndex import DocumentIndex
+from scripts.sources import Source, Sources, DEFAULT_SOURCE, SOURCE_QUEUE_DEPTH, SOURCE_LATENCY_SECONDS
+from scripts.jobJournal import JobJournal, PARSED, ANALYZED, COMMITTING
+from scripts.sharedQueue import SharedQueue, LeaseLost
+from scripts.retryQueue import RetryQueue, isTransient, isEnvironmentError, errorClass, backoffDelay, RETRIES, QUARANTINED
+from scripts.warmUp import startWarmUp
+from scripts.fileFunctions import (
+    getFilename, getNewFilename, reserveDestination, commitDocument, quarantineDocument, findFiledPdf,
+    getSetting, DEFAULT_SETTINGS
+)
+
+# a single PDF travelling through the pipeline, each stage fills in its part
+class Job:
+    def __init__(self, filepath, source):
+        self.filepath = filepath                        # original path in the source folder
+        self.source = source                            # Source it came from, its destination root is where it is filed
+        self.filename = getFilename(filepath, 0)        # filename without extension, for logging
+        self.sha256 = None                              # hash of the file contents, used as cache key
+        self.started = time.time()                      # when the job entered the pipeline
+        self.destination = None                         # final path of the PDF, filled by the commit stage
+        self.markdown = None                            # filled by the parse stage
+        self.pages = 0                                  # number of pages parsed so far
+        self.routes = []                                # where each part of the result came from (text layer, Docling, cache, journal)
+        self.total_pages = None                         # number of pages in the PDF, read when more pages are needed
+        self.document = None                            # filled by the analysis stage (or the cache)
+        self.embedding = None                           # filled by the pre-classifier, added to its index on commit
+        self.plan = None                                # journal entry of an interrupted commit, reused as it is
+        self.timing = metrics.newTiming()               # seconds per stage and step, written to the JSON file
+        self.queued = time.perf_counter()               # when the job was put in its current queue
+        self.attempts = 0                               # retries so far after transient errors
+        self.errors = []                                # every error it ran into, for the quarantine sidecar
+        self.quarantined = None                         # path of the PDF in the quarantine folder, if it was moved there
+
+# one stage of the pipeline: a pool of worker threads reading from a bounded input queue
+class Stage:
+    def __init__(self, name, work, workers, input_queue, output_queue):
+        self.name = name
+        self.work = work                    # function that processes one job
+        self.workers = max(1, workers)
+        self.input_queue = input_queue
+        self.output_queue = output_queue    # None for the last stage
+        self.threads = []
+        self.upstream = None                # previous stage, None for the first one
+
+    # a stage is alive while at least one of its workers is still running
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+# staged parse -> analyze -> commit pipeline, stages run at the same time and are joined
+# by bounded queues, so a slow stage makes the earlier ones wait instead of piling up work
+class Pipeline:
+    def __init__(self, sources, log = print, parse_workers = 1, analyze_workers = 1,
+                 commit_workers = 1, queue_size = 4, on_error = None, on_done = None, cache = None,
+                 initial_pages = 1, page_limits = None, analysis_mode = "two-call", client = None,
+                 pre_classifier = None, text_layer = True, journal = None, timing_in_json = True, indexes = None,
+                 prompt_budget = 0, retry_attempts = 3, retry_backoff = 5.0, retry_max_delay = 300, quarantine = True,
+                 leases = None, parser_pool = None, keep_alive = KEEP_ALIVE):
+        if not isinstance(sources, Sources):
+            sources = Sources([Source(DEFAULT_SOURCE, None, sources)]) # a destination root, files from anywhere are filed there
+        self.sources = sources                  # Sources served by this pipeline, each file is filed into the destination of its own
+        self.initial_pages = initial_pages      # pages parsed before the first classification
+        self.page_limits = page_limits or {}    # max pages per document type, "default" for the other types
+        self.analysis_mode = analysis_mode      # one of aiFunctions.ANALYSIS_MODES
+        self.client = client                    # optional AnalysisService or BackendPool, None uses the blocking ollama.chat
+        self.pre_classifier = pre_classifier    # optional PreClassifier, picks the type of familiar documents
+        self.text_layer = text_layer            # read born-digital PDFs from their text layer instead of Docling
+        self.journal = journal                  # optional JobJournal, lets files resume after a crash
+        self.timing_in_json = timing_in_json    # add the per-document timing block to the JSON file
+        self.indexes = indexes or {}            # destination root -> DocumentIndex, every committed document is added to the one of its root
+        self.prompt_budget = prompt_budget      # estimated tokens of the document sent to Ollama, 0 sends it whole
+        self.retry_attempts = retry_attempts    # retries of a document after transient errors, see retryQueue.isTransient
+        self.retry_backoff = retry_backoff      # seconds before the first retry, doubled for each of the next ones
+        self.retry_max_delay = retry_max_delay  # longest wait before a retry
+        self.quarantine = quarantine            # move documents that fail for other reasons to the quarantine folder
+        self.leases = leases or {}              # source name -> SharedQueue, its files are only processed once this scanner holds their lease
+        self.parser_pool = parser_pool          # optional RecyclingPool of parser processes, Docling then never runs in this process
+        self.keep_alive = keep_alive            # how long Ollama keeps the model loaded after each request
+        self.cache = cache              # optional ResultCache, identical files are not parsed or analyzed again
+        self.log = log                  # function used to report progress (GUI terminal or stdout)
+        self.on_error = on_error        # called as on_error(job, exception) when a job fails
+        self.on_done = on_done          # called as on_done(job) when a job is committed
+        self.on_halt = None             # called as on_halt(error) when the pipeline stops itself, see halt()
+        self.closed = False             # no more jobs will be submitted
+        self.stopped = False            # stop() was called, waiting jobs are dropped and nothing is retried
+        self.halted = None              # error that made the pipeline stop itself, see handle_failure
+        self.embedding_error = None     # first error of the pre-classifier's embeddings, reported once
+        self.failure_lock = threading.Lock() # guards halted and embedding_error, set from the worker threads
+        self.in_flight = {source.name: 0 for source in sources} # files of each source submitted and not committed or failed yet
+        self.in_flight_lock = threading.Lock()
+
+        self.parse_queue = queue.Queue(maxsize = queue_size)
+        self.analyze_queue = queue.Queue(maxsize = queue_size)
+        self.commit_queue = queue.Queue(maxsize = queue_size)
+
+        self.stages = [
+            Stage("parse", self.parse, parse_workers, self.parse_queue, self.analyze_queue),
+            Stage("analyze", self.analyze, analyze_workers, self.analyze_queue, self.commit_queue),
+            Stage("commit", self.commit, commit_workers, self.commit_queue, None),
+        ]
+        for previous, stage in zip(self.stages, self.stages[1:]):
+            stage.upstream = previous
+        for stage in self.stages:
+            metrics.QUEUE_DEPTH.set_function(stage.input_queue.qsize, stage = stage.name)
+        for source in sources:
+            SOURCE_QUEUE_DEPTH.set_function(lambda name = source.name: self.in_flight[name], source = source.name, state = "processing")
+
+        # jobs that failed with a transient error wait here, then go back to the stage they failed in
+        self.retry_queue = RetryQueue(self.requeue)
+        metrics.QUEUE_DEPTH.set_function(self.retry_queue.__len__, stage = "retry")
+
+    # start the worker threads of every stage
+    def start(self):
+        self.recover()
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target = self.run_stage, args = (stage,), name = f"{stage.name}-{i}", daemon = True)
+                stage.threads.append(thread)
+                thread.start()
+
+    # finish commits that were interrupted after their PDF had already left the source folder,
+    # the other interrupted files are resumed when they are submitted again
+    def recover(self):
+        if self.journal is None:
+            return
+        for entry in self.journal.interruptedCommits():
+            if os.path.exists(entry["path"]):
+                continue
+            if not os.path.exists(entry["pdf_destination"]) and findFiledPdf(entry["json_destination"]) is None:
+                # it left the source folder without being moved here: deleted, or filed by another scanner that took it over
+                if os.path.exists(entry["json_destination"]):
+                    os.remove(entry["json_destination"])
+                self.journal.finish(entry["path"])
+                continue
+            try:
+                document = Document.model_validate_json(entry["document"])
+                commitDocument(document, entry["path"], entry["pdf_destination"], entry["json_destination"])
+                self.add_to_index(document, entry["json_destination"], entry["pdf_destination"])
+
+                # JSON file written next to the PDF by older versions before it was moved
+                json_path = os.path.join(os.path.dirname(entry["path"]), getFilename(entry["path"], 1))
+                if os.path.exists(json_path):
+                    os.remove(json_path)
+                self.journal.finish(entry["path"])
+                self.log(f"Finished the interrupted commit of <i>{os.path.basename(entry['pdf_destination'])}</i>.")
+            except Exception as e:
+                print(f"Could not recover {entry['path']}: {e}")
+
+    # add a file to the pipeline, blocks while the parse queue is full (backpressure);
+    # the file is filed into the destination of the source folder it is in. Returns False if it was not
+    # added: the pipeline is closed, or another scanner sharing the source folder is processing the file
+    def submit(self, filepath):
+        job = Job(filepath, self.sources.match(filepath))
+        if not self.claim(job):
+            return False
+        job.queued = time.perf_counter()
+        self.count_in_flight(job, 1)
+        while not self.closed:
+            try:
+                self.parse_queue.put(job, timeout = 0.5)
+                return True
+            except queue.Full:
+                continue
+        self.job_left(job)
+        return False
+
+    # HELPER: take the lease of a job's file in the shared queue of its source, always True without one
+    def claim(self, job):
+        shared_queue = self.leases.get(job.source.name)
+        if shared_queue is None:
+            return True
+        try:
+            claimed = shared_queue.claim(job.filepath)
+        except sqlite3.Error as e:
+            print(f"Could not claim {job.filepath}: {e}")
+            self.log(f"<b><i>{job.filename}</i> was skipped, the shared queue could not be reached ({e}).</b>")
+            return False
+        if not claimed:
+            print(f"{job.filename} is being processed by another scanner, skipped")
+            return False
+        if not os.path.exists(job.filepath): # filed by another scanner between the moment it was queued and the claim
+            shared_queue.release(job.filepath)
+            return False
+        return True
+
+    # HELPER: check that this scanner still holds the lease of a job, always True without a shared queue
+    def holds_lease(self, job):
+        shared_queue = self.leases.get(job.source.name)
+        return shared_queue is None or shared_queue.renew(job.filepath)
+
+    # HELPER: a file of a source entered the pipeline
+    def count_in_flight(self, job, change):
+        with self.in_flight_lock:
+            self.in_flight[job.source.name] += change
+
+    # HELPER: a job left the pipeline (committed, failed or dropped), its lease is given back
+    def job_left(self, job):
+        self.count_in_flight(job, -1)
+        shared_queue = self.leases.get(job.source.name)
+        if shared_queue is not None:
+            try:
+                shared_queue.release(job.filepath)
+            except sqlite3.Error as e:
+                print(f"Could not release the lease of {job.filepath}, it expires on its own: {e}")
+
+    # stop accepting files, everything already submitted is still processed
+    def close(self):
+        self.closed = True
+
+    # stop accepting files and drop jobs that have not started parsing yet,
+    # jobs that are already being processed continue until they are committed
+    def stop(self):
+        self.closed = True
+        self.stopped = True
+        while True:
+            try:
+                self.job_left(self.parse_queue.get_nowait())
+            except queue.Empty:
+                break
+        for _, job in self.retry_queue.clear():
+            self.job_left(job) # stays in the source folder, the journal resumes it on the next run
+
+        # pending Ollama requests are cancelled, those files stay in the source folder for the next run
+        if self.client is not None:
+            self.client.close()
+
+    # wait for all stages to finish, only returns after close() or stop()
+    def join(self, timeout = None):
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join(timeout)
+
+        if not any(stage.is_alive() for stage in self.stages):
+            self.retry_queue.close()
+            if self.pre_classifier is not None:
+                self.pre_classifier.save()
+            if self.client is not None:
+                self.client.close()
+            if self.cache is not None:
+                self.cache.close()
+            if self.journal is not None:
+                self.journal.close()
+            for index in self.indexes.values():
+                index.close()
+            for shared_queue in self.leases.values():
+                shared_queue.close() # files that were not processed are left to the other scanners
+            self.log(formatMemoryReport(memoryReport(self.parser_pool)))
+            metrics.flushExport()
+
+    # HELPER: check whether a stage will never receive another job
+    def upstream_finished(self, stage):
+        if len(self.retry_queue):
+            return False # a job waiting for its retry goes back to this stage or one before it
+        if stage.upstream is None:
+            return self.closed
+        return not stage.upstream.is_alive()
+
+    # worker loop shared by all stages
+    def run_stage(self, stage):
+        while True:
+            try:
+                job = stage.input_queue.get(timeout = 0.5)
+            except queue.Empty:
+                # nothing can be put into the queue once upstream is finished, so empty() is reliable here
+                if self.upstream_finished(stage) and stage.input_queue.empty():
+                    return
+                continue
+
+            # after halt() the jobs waiting for parsing or analysis would fail the same way, they stay in the
+            # source folder; analyzed ones are still committed
+            if self.halted is not None and stage.name != "commit":
+                self.job_left(job)
+                continue
+
+            waited = time.perf_counter() - job.queued
+            metrics.QUEUE_WAIT_SECONDS.observe(waited, stage = stage.name)
+            job.timing["waits"][stage.name] = round(waited, 4)
+
+            started = time.perf_counter()
+            metrics.activate(job.timing) # steps run by this thread are recorded in the job's timing block
+            try:
+                stage.work(job)
+            except Exception as e:
+                self.handle_failure(stage, job, e)
+                continue
+            finally:
+                metrics.deactivate()
+                seconds = time.perf_counter() - started
+                metrics.STAGE_SECONDS.observe(seconds, stage = stage.name)
+                job.timing["stages"][stage.name] = round(seconds, 4)
+
+            output_queue = stage.output_queue
+            if output_queue is self.analyze_queue and job.document is not None:
+                output_queue = self.commit_queue # cached result, skip straight to the commit
+
+            if output_queue is not None:
+                job.queued = time.perf_counter()
+                output_queue.put(job) # blocks while the next stage is busy
+            else:
+                metrics.DOCUMENTS.inc(type = job.document.classification.type.upper())
+                SOURCE_LATENCY_SECONDS.observe(time.time() - job.started, source = job.source.name)
+                self.job_left(job)
+                if self.on_done:
+                    self.on_done(job)
+
+    # a job failed in a stage: errors from the environment (see retryQueue.isTransient) send it back to the
+    # same stage after a growing delay, other errors move the document to the quarantine folder with a
+    # sidecar describing the error; either way the workers go on with the next documents. Errors no document
+    # can get past (model not installed, Docling can't start) stop the pipeline instead, see halt()
+    def handle_failure(self, stage, job, error):
+        error_class = errorClass(error)
+        metrics.FAILURES.inc(stage = stage.name, error = error_class)
+        print(f"Error processing {job.filename} ({stage.name}): {error_class}: {error}")
+        job.errors.append({"stage": stage.name, "error_class": error_class, "error": str(error), "time": time.strftime("%Y-%m-%d %H:%M:%S")})
+
+        transient = isTransient(error)
+        if transient and job.attempts < self.retry_attempts and not self.stopped:
+            job.attempts += 1
+            delay = backoffDelay(job.attempts, self.retry_backoff, self.retry_max_delay)
+            RETRIES.inc(stage = stage.name, error = error_class)
+            self.log(f"<i>{job.filename}</i> failed ({error_class}: {error}), trying again in {delay:.0f} seconds (retry {job.attempts} of {self.retry_attempts}).")
+            self.retry_queue.put((stage, job), delay)
+            return
+
+        # the setup of the scanner is broken, not the document: it stays in the source folder for the next run
+        if isEnvironmentError(error) or isinstance(error, (ConverterUnavailable, PoolUnavailable)):
+            self.job_left(job)
+            self.halt(error)
+            if self.on_error:
+                self.on_error(job, error)
+            return
+
+        # a file another scanner took over is theirs now, this one leaves it alone
+        if isinstance(error, LeaseLost):
+            self.job_left(job)
+            self.log(f"<i>{job.filename}</i> was taken over by another scanner.")
+            return
+
+        cancelled = self.stopped or isinstance(error, (AnalysisCancelled, PoolStopped))
+        # a commit that failed is a problem of the destination, not of the document: the journal finishes it on the next run
+        if self.quarantine and not transient and not cancelled and stage.name != "commit" and os.path.exists(job.filepath):
+            try:
+                if not self.holds_lease(job):
+                    raise LeaseLost(f"{job.filepath} was taken over by another scanner")
+                job.quarantined = quarantineDocument(job.filepath, job.source.destination_path, self.error_details(stage, job, error))
+                QUARANTINED.inc(stage = stage.name, error = error_class)
+                if self.journal is not None:
+                    self.journal.finish(job.filepath)
+                self.log(f"<b><i>{job.filename}</i> could not be processed ({error_class}: {error}), moved to {job.quarantined}.</b>")
+            except Exception as e:
+                print(f"Could not quarantine {job.filepath}: {e}")
+                self.log(f"<b>Error processing {job.filename}: {error}. It could not be moved to the quarantine folder ({e}).</b>")
+        elif transient and not cancelled:
+            self.log(f"<b>Error processing {job.filename}: {error}. Gave up after {job.attempts} retries, it stays in the source folder until the next run.</b>")
+        elif not cancelled:
+            self.log(f"<b>Error processing {job.filename}: {error}</b>")
+        self.job_left(job) # only now, so no other scanner claims the file while it is being quarantined
+        if self.on_error:
+            self.on_error(job, error)
+
+    # HELPER: stop the pipeline after an error every other document would run into too, instead of failing
+    # them one by one; the files stay in the source folder until the problem is fixed and processing restarted
+    def halt(self, error):
+        with self.failure_lock:
+            if self.halted is not None or self.stopped:
+                return
+            self.halted = error
+        print(f"Stopping the pipeline: {errorClass(error)}: {error}")
+        self.log(f"<b>Processing stopped, no document can be processed: {error}. The files stay in the source folder, start again once this is fixed.</b>")
+        self.stop()
+        if self.on_halt:
+            self.on_halt(error)
+
+    # HELPER: contents of the error sidecar of a quarantined document
+    def error_details(self, stage, job, error):
+        return {
+            "file": job.filepath,
+            "source": job.source.name,
+            "stage": stage.name,
+            "error_class": errorClass(error),
+            "error": str(error),
+            "traceback": "".join(traceback.format_exception(type(error), error, error.__traceback__)),
+            "attempts": job.attempts + 1,
+            "errors": job.errors,
+            "sha256": job.sha256,
+            "pages_parsed": job.pages,
+            "routes": job.routes,
+        }
+
+    # HELPER: put a job whose retry delay has passed back in the input queue of the stage it failed in
+    def requeue(self, item):
+        stage, job = item
+        job.queued = time.perf_counter()
+        while not self.stopped:
+            try:
+                stage.input_queue.put(job, timeout = 0.5)
+                return
+            except queue.Full:
+                continue
+        self.job_left(job)
+
+    # STAGE 1: parsing document using Docling
+    def parse(self, job):
+        if not os.path.exists(job.filepath):
+            raise FileNotFoundError(f"{job.filepath} no longer exists")
+
+        print(f"Processing {job.filename}")
+        self.log(f"<b>Processing <i>{job.filename}</i>.</b>")
+
+        if self.cache is not None or self.journal is not None:
+            with metrics.timed("hash"):
+                job.sha256 = hashFile(job.filepath)
+
+        # resume where an earlier run stopped
+        entry = self.journal.lookup(job.filepath) if self.journal is not None else None
+        if entry is not None and entry["sha256"] == job.sha256:
+            job.routes.append("journal")
+            if entry["stage"] in (ANALYZED, COMMITTING):
+                job.document = Document.model_validate_json(entry["document"])
+                job.plan = entry if entry["stage"] == COMMITTING else None
+                self.log(f"Resuming <i>{job.filename}</i> at the {'commit' if job.plan else 'move'} step.")
+                return
+            if entry["stage"] == PARSED:
+                job.markdown = entry["markdown"]
+                job.pages = entry["pages"]
+                self.log(f"Resuming <i>{job.filename}</i> at the analysis step.")
+                return
+
+        if self.cache is not None:
+            markdown, document = self.cache.get(job.sha256)
+            if markdown is not None or document is not None:
+                job.routes.append("cache")
+            if document is not None:
+                job.document = Document.model_validate_json(document)
+                self.log(f"<i>{job.filename}</i> was already analyzed before, using the saved result.")
+                return
+            if markdown is not None:
+                job.markdown = markdown
+                job.pages = self.initial_pages
+                self.log(f"<i>{job.filename}</i> was already parsed before, using the saved result.")
+                return
+
+        print(f"Parsing {job.filename}")
+        self.log("Starting parsing...")
+        job.markdown, route = parseDocumentWithRoute(job.filepath, (1, self.initial_pages), self.text_layer, self.parser_pool)
+        job.routes.append(route)
+        job.pages = self.initial_pages
+
+        if self.cache is not None:
+            self.cache.putMarkdown(job.sha256, job.markdown)
+        if self.journal is not None:
+            self.journal.record(job.filepath, PARSED, sha256 = job.sha256, markdown = job.markdown, pages = job.pages)
+
+        print(f"{job.filename} parsed ({route})")
+        self.log(f"{job.filename} successfully parsed ({route}).")
+
+    # STAGE 2: Ollama analysis
+    def analyze(self, job):
+        print(f"Analyzing {job.filename}")
+        self.log(f"Starting document analysis of <i>{job.filename}</i>...")
+        job.document = self.analyze_progressive(job)
+
+        if self.cache is not None:
+            self.cache.putDocument(job.sha256, job.document.model_dump_json())
+        if self.journal is not None:
+            self.journal.record(job.filepath, ANALYZED, sha256 = job.sha256, document = job.document.model_dump_json())
+
+        compaction = job.timing.get("compaction")
+        if compaction and compaction["tokens_saved"] > 0:
+            print(f"{job.filename}: prompt compacted from {compaction['tokens_before']} to {compaction['tokens_after']} tokens")
+            self.log(f"Prompt of <i>{job.filename}</i> compacted, {compaction['tokens_saved']} of {compaction['tokens_before']} tokens saved.")
+        print(f"done, file is {job.document.classification.type.upper()}")
+        self.log(f"Metadata successfully extracted, <i>{job.filename}</i> classified as <b><i>{job.document.classification.type.upper()}</i></b>.")
+
+    # HELPER: max pages to parse for a document type
+    def page_limit(self, doc_type = None):
+        limit = self.page_limits.get((doc_type or "").upper(), self.page_limits.get("default", self.initial_pages))
+        return max(limit, self.initial_pages)
+
+    # HELPER: parse the pages after the ones already parsed, up to the given limit,
+    # returns False when there is nothing more to parse
+    def parse_more(self, job, limit):
+        if job.total_pages is None:
+            job.total_pages = getPageCount(job.filepath)
+        limit = min(limit, job.total_pages)
+        if job.pages >= limit:
+            return False
+
+        print(f"Parsing pages {job.pages + 1}-{limit} of {job.filename}")
+        self.log(f"Parsing pages {job.pages + 1} to {limit} of <i>{job.filename}</i>...")
+        markdown, route = parseDocumentWithRoute(job.filepath, (job.pages + 1, limit), self.text_layer, self.parser_pool)
+        job.markdown += "\n\n" + markdown
+        job.routes.append(route)
+        job.pages = limit
+        return True
+
+    # HELPER: report the first failed embedding only, the next documents would fill the log with the same error
+    def embedding_failed(self, error):
+        with self.failure_lock:
+            if self.embedding_error is not None:
+                return
+            self.embedding_error = error
+        print(f"Embedding failed, documents are classified without the pre-classifier: {errorClass(error)}: {error}")
+        self.log(f"<b>The pre-classifier is not available ({error}), documents are classified by the model only.</b>")
+
+    # classify using the pages parsed so far, and only parse more pages when the document
+    # is CRE (metadata extraction), required fields are empty, or the response is invalid
+    def analyze_progressive(self, job):
+        known_type = None
+        if self.pre_classifier is not None:
+            try:
+                job.embedding = self.pre_classifier.embed(job.markdown)
+            except Exception as e:
+                # e.g. the embedding model is not pulled: the LLM classifies the document without a hint
+                job.embedding = None
+                self.embedding_failed(e)
+        if job.embedding is not None:
+            known_type, similarity, template = self.pre_classifier.predict(job.embedding)
+            if template is not None:
+                self.log(f"<i>{job.filename}</i> matches an earlier document ({similarity:.3f}), reusing its classification.")
+                return Document.model_validate_json(template)
+            if known_type is not None:
+                print(f"{job.filename} pre-classified as {known_type} ({similarity:.3f})")
+
+        classification = None
+        while classification is None:
+            conversation = [] if self.analysis_mode == MULTI_TURN else None
+            combined = None
+            doc = compactDocument(job.markdown, self.prompt_budget) # again after every parse_more()
+            try:
+                if self.analysis_mode == COMBINED and known_type is None:
+                    combined = analyzeCombined(doc, job.filename, self.client, self.keep_alive)
+                    classification = combined.classification
+                else:
+                    classification = classifyDocument(doc, job.filename, conversation, self.client, known_type, self.keep_alive)
+            except ValidationError:
+                if not self.parse_more(job, self.page_limit()):
+                    raise
+                continue
+
+            missing = missingFields(classification)
+            if missing and self.parse_more(job, self.page_limit(classification.type)):
+                print(f"{job.filename} is missing {', '.join(missing)}, classifying again")
+                classification = None
+
+        # SECOND PROMPT: metadata (ignore if not CRE)
+        metadata = None
+        if classification.type.upper() == "CRE":
+            if self.parse_more(job, self.page_limit("CRE")):
+                conversation = combined = None # new pages, the earlier context can't be reused
+                doc = compactDocument(job.markdown, self.prompt_budget)
+
+            if combined is not None and combined.metadata is not None:
+                metadata = combined.metadata
+            else:
+                metadata = extractMetadata(doc, conversation, self.client, self.keep_alive)
+
+        return Document(classification = classification, metadata = metadata)
+
+    # STAGE 3: writing the JSON file and moving both files to the destination
+    def commit(self, job):
+        # renewed right before any file is touched, so two scanners can never move the same file
+        if not self.holds_lease(job):
+            raise LeaseLost(f"{job.filepath} was taken over by another scanner")
+
+        if job.plan is not None:
+            # interrupted commit, reuse the destinations it had chosen
+            pdf_destination, json_destination = job.plan["pdf_destination"], job.plan["json_destination"]
+            new_filename = os.path.basename(pdf_destination)
+        else:
+            print(f"Processed {job.filename}")
+
+            # the name comes from the Document in memory, a number is added if it is already taken
+            name, doc_type = getNewFilename(job.document)
+            pdf_destination, json_destination = reserveDestination(
+                os.path.join(job.source.destination_path, doc_type), name, os.path.splitext(job.filepath)[1]
+            )
+            new_filename = os.path.splitext(os.path.basename(json_destination))[0] + os.path.splitext(job.filepath)[1]
+            self.log(f"<i>{os.path.basename(job.filepath)}</i> has been renamed to <b><i>{new_filename}</i></b>.")
+            job.plan = {"pdf_destination": pdf_destination, "json_destination": json_destination} # reused if the commit is retried
+
+            # record the destinations before touching any file, so a crash can be finished the same way
+            if self.journal is not None:
+                self.journal.record(
+                    job.filepath, COMMITTING, sha256 = job.sha256, document = job.document.model_dump_json(),
+                    pdf_destination = pdf_destination, json_destination = json_destination
+                )
+
+        timing = None
+        if self.timing_in_json:
+            timing = dict(job.timing, total = round(time.time() - job.started, 4)) # the commit stage itself is still running
+        destination_path = commitDocument(job.document, job.filepath, pdf_destination, json_destination, timing)
+        if self.journal is not None:
+            self.journal.finish(job.filepath)
+
+        job.destination = destination_path
+        self.add_to_index(job.document, json_destination, destination_path)
+        if self.pre_classifier is not None and job.embedding is not None:
+            self.pre_classifier.add(job.embedding, job.document.classification.type, job.document.model_dump_json())
+        self.log(f"<i>{new_filename}</i> and its associated JSON file has been moved to {os.path.dirname(destination_path)}.")
+        self.log(f"<b><i>{new_filename}</i> is finished processing.</b>")
+
+    # HELPER: add a committed document to the search index of its destination root; the files are already
+    # in place, so a failure is only reported (`python -m scripts.cli build-index` adds the missing ones later)
+    def add_to_index(self, document, json_destination, pdf_destination):
+        index = self.index_for(json_destination)
+        if index is None:
+            return
+        try:
+            index.upsert(document, json_destination, pdf_destination)
+        except Exception as e:
+            print(f"Could not add {os.path.basename(json_destination)} to the search index: {e}")
+
+    # HELPER: search index of the destination root a filed JSON file is in, None if there is none
+    def index_for(self, json_destination):
+        folder = os.path.abspath(os.path.dirname(os.path.dirname(json_destination))) # root/TYPE/name.json
+        for root, index in self.indexes.items():
+            if os.path.abspath(root) == folder:
+                return index
+        return None
+
+# memory of the app, and of the parser processes in `pool` when they are used, see RecyclingPool.memory_report()
+def memoryReport(pool = None):
+    if pool is not None:
+        return pool.memory_report()
+    return {"main_rss_mb": currentRssMb(), "main_peak_mb": peakRssMb()}
+
+# HELPER: one line summary of memoryReport() for the log
+def formatMemoryReport(report):
+    line = f"Memory: app {report['main_rss_mb']} MB now, {report['main_peak_mb']} MB peak"
+    if report.get("worker_peak_mb") is not None:
+        restarts = sum(report["restarts"].values())
+        line += f"; parser processes {report['worker_steady_mb']} MB steady, {report['worker_peak_mb']} MB peak, restarted {restarts} time(s)"
+    return line + "."
+
+# build a pipeline from the settings in config.json: starts the Docling warm-up
+# (threads or processes) and opens the result cache, shared by the GUI and the CLI.
+# `sources` is the Sources to serve (see sources.loadSources), or a single destination root. With
+# shared_queue_enabled, `on_expired(path)` is called for files another scanner stopped working on
+def createPipeline(config, sources, log = print, on_error = None, on_done = None, on_expired = None):
+    if not isinstance(sources, Sources):
+        sources = Sources([Source(DEFAULT_SOURCE, None, sources)])
+    destinations = sources.destinations()
+    metrics.startExport(getSetting(config, "metrics_port"), getSetting(config, "metrics_file"))
+
+    parse_workers = getSetting(config, "parse_workers")
+    parse_processes = getSetting(config, "parse_processes")
+    parser_pool = None
+    if parse_processes > 0:
+        # the processes are restarted after worker_max_documents documents or above worker_max_rss_mb
+        parser_pool = startParserProcesses(parse_processes, getSetting(config, "worker_max_documents"), getSetting(config, "worker_max_rss_mb"))
+        parse_workers = max(parse_workers, parse_processes) # one feeding thread per process
+    else:
+        warmUpConverter(parse_workers)
+    startWarmUp(config, report = lambda state: None) # preloads the language model, unless the GUI already started it
+
+    # pages parsed before classifying, and the most pages each document type may need
+    initial_pages = getSetting(config, "initial_pages")
+    page_limits = dict(DEFAULT_SETTINGS["page_limits"])
+    page_limits.update(getSetting(config, "page_limits"))
+
+    # results of files that were already processed, keyed by file contents
+    prompt_budget = getSetting(config, "prompt_token_budget")
+    cache = None
+    if getSetting(config, "cache_enabled"):
+        cache = ResultCache(getParserVersion((1, initial_pages), getSetting(config, "text_layer_fast_path")), getAnalysisVersion(prompt_budget, ollamaHosts(config)), max_bytes = getSetting(config, "cache_max_mb") * 1024 * 1024)
+
+    # concurrent Ollama requests, one analysis thread per inference slot
+    client = None
+    analyze_workers = getSetting(config, "analyze_workers")
+    concurrency = getSetting(config, "ollama_concurrency")
+    backends = parseBackends(getSetting(config, "ollama_backends"), max(1, concurrency))
+    if backends:
+        # several Ollama servers, requests go to the least busy one
+        client = BackendPool(backends, getSetting(config, "ollama_timeout"), getSetting(config, "ollama_health_interval"))
+        analyze_workers = max(analyze_workers, client.concurrency)
+    elif concurrency > 0:
+        client = AnalysisService(getSetting(config, "ollama_host"), concurrency, getSetting(config, "ollama_timeout"))
+        analyze_workers = max(analyze_workers, concurrency)
+
+    # embedding index of the documents filed in the first destination, the document types are the same
+    # for every source so its documents vote for the others too
+    pre_classifier = None
+    if getSetting(config, "preclassify_enabled"):
+        pre_classifier = PreClassifier(
+            destinations[0],
+            model = getSetting(config, "embedding_model"),
+            threshold = getSetting(config, "preclassify_threshold"),
+            neighbours = getSetting(config, "preclassify_neighbours"),
+            template_threshold = getSetting(config, "template_threshold"),
+            client = client
+        )
+
+    # leases on the files of each source folder, shared with the other scanners watching it
+    shared = getSetting(config, "shared_queue_enabled")
+    leases = {}
+    if shared:
+        for source in sources:
+            if source.source_path and os.path.isdir(source.source_path):
+                leases[source.name] = SharedQueue(
+                    source.source_path, getSetting(config, "lease_ttl"), getSetting(config, "lease_heartbeat"), on_expired, name = source.name
+                )
+
+    # full-text index of each destination root
+    indexes = {}
+    if getSetting(config, "search_index_enabled"):
+        for destination in destinations:
+            os.makedirs(destination, exist_ok = True)
+            indexes[destination] = DocumentIndex(destination, shared = shared)
+
+    return Pipeline(
+        sources,
+        log = log,
+        parse_workers = parse_workers,
+        analyze_workers = analyze_workers,
+        commit_workers = getSetting(config, "commit_workers"),
+        queue_size = getSetting(config, "queue_size"),
+        on_error = on_error,
+        on_done = on_done,
+        cache = cache,
+        initial_pages = initial_pages,
+        page_limits = page_limits,
+        analysis_mode = getSetting(config, "analysis_mode"),
+        client = client,
+        pre_classifier = pre_classifier,
+        text_layer = getSetting(config, "text_layer_fast_path"),
+        journal = JobJournal() if getSetting(config, "journal_enabled") else None,
+        timing_in_json = getSetting(config, "timing_in_json"),
+        indexes = indexes,
+        prompt_budget = prompt_budget,
+        retry_attempts = getSetting(config, "retry_attempts"),
+        retry_backoff = getSetting(config, "retry_backoff"),
+        retry_max_delay = getSetting(config, "retry_max_delay"),
+        quarantine = getSetting(config, "quarantine_enabled"),
+        leases = leases,
+        parser_pool = parser_pool,
+        keep_alive = getSetting(config, "ollama_keep_alive")
+    )
@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import ollama
+
+from scripts import metrics
+from scripts.fileFunctions import findFiledPdf, QUARANTINE_FOLDER
+
+INDEX_FILENAME = ".smartscanner-embeddings.npz" # kept in the destination root, next to the type folders
+MAX_EMBED_CHARS = 8000                          # only the start of the document is embedded
+SAVE_INTERVAL = 30                              # seconds between two saves of the index
+
+# HELPER: hold the lock file of an index ("<index>.lock") while it is read, merged and replaced, so two
+# scanners saving into the same destination root at the same time don't drop each other's rows
+@contextmanager
+def lockedIndex(path):
+    with open(f"{path}.lock", "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX) # released when the file is closed
+            yield
+            return
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1) # raises OSError after trying for 10 seconds
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# nearest-neighbour index of the documents filed so far, used to pick the classification type
+# of a new document without asking the LLM when it is very similar to earlier ones
+class PreClassifier:
+    def __init__(self, destination_root, model = "nomic-embed-text", threshold = 0.9, neighbours = 5,
+                 template_threshold = None, client = None):
+        self.path = os.path.join(destination_root, INDEX_FILENAME)
+        self.model = model                          # Ollama embedding model
+        self.threshold = threshold                  # min cosine similarity to accept a type
+        self.neighbours = neighbours                # k in the kNN vote
+        self.template_threshold = template_threshold # reuse the whole classification above this similarity, None to disable
+        self.client = client                        # AnalysisService or None for the blocking ollama module
+        self.lock = threading.Lock()
+        self.last_saved = time.time()
+        self.dirty = False
+        self.unsaved = 0        # rows added since the last save
+        self.rebuilding = False # rebuildIndex() is filling the index, it is saved once at the end
+
+        self.vectors = None     # (n, dim) float32, rows normalized to length 1
+        self.types = []         # classification type of each row
+        self.documents = []     # Document JSON of each row, for template reuse
+        self.load()
+
+    def __len__(self):
+        return len(self.types)
+
+    # load the index saved in the destination root, if any
+    def load(self):
+        saved = self.read()
+        if saved is not None:
+            self.vectors, self.types, self.documents = saved
+
+    # HELPER: (vectors, types, documents) saved in the destination root, None if there is no usable index
+    def read(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path, allow_pickle = False) as data:
+                if str(data["model"]) != self.model:
+                    print(f"Embedding index was built with {data['model']}, starting a new one for {self.model}")
+                    return None
+                return (
+                    data["vectors"].astype(np.float32),
+                    [str(doc_type) for doc_type in data["types"]],
+                    [str(document) for document in data["documents"]],
+                )
+        except Exception as e:
+            print(f"Could not load embedding index {self.path}: {e}")
+            return None
+
+    # write the index to disk (temp file + rename so a crash never leaves half an index). Other scanners
+    # may file into the same root, so the rows added since the last save are appended to the index on disk
+    # rather than replacing it, and the rows the others saved are picked up; merge = False writes it as it is
+    def save(self, merge = True):
+        with self.lock:
+            if not self.dirty or self.vectors is None:
+                return
+            vectors, types, documents = self.vectors, list(self.types), list(self.documents)
+            count, added = len(types), min(self.unsaved, len(types))
+            self.dirty = False
+            self.unsaved = 0
+            self.last_saved = time.time()
+
+        try:
+            with lockedIndex(self.path):
+                saved = self.read() if merge else None
+                merged = saved is not None and saved[0].shape[1] == vectors.shape[1]
+                if merged:
+                    vectors = np.vstack([saved[0], vectors[count - added:]])
+                    types = saved[1] + types[count - added:]
+                    documents = saved[2] + documents[count - added:]
+
+                temp_path = f"{self.path}.{os.getpid()}.tmp.npz" # one per process, two scanners may save at the same time
+                np.savez(temp_path, vectors = vectors, types = np.array(types), documents = np.array(documents), model = np.array(self.model))
+                os.replace(temp_path, self.path)
+        except Exception:
+            with self.lock: # saved again next time
+                self.dirty = True
+                self.unsaved += added
+            raise
+
+        if merged:
+            with self.lock: # keep the rows added while it was being saved
+                if self.vectors is not None and self.vectors.shape[1] == vectors.shape[1]:
+                    self.vectors = np.vstack([vectors, self.vectors[count:]])
+                    self.types = types + self.types[count:]
+                    self.documents = documents + self.documents[count:]
+
+    # embedding of a parsed document, normalized so a dot product is the cosine similarity
+    def embed(self, markdown):
+        with metrics.timed("embed"):
+            response = (self.client or ollama).embed(model = self.model, input = markdown[:MAX_EMBED_CHARS])
+        vector = np.asarray(response.embeddings[0], dtype = np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # returns (type, similarity, template Document JSON or None); type is None when not confident
+    def predict(self, vector):
+        with self.lock:
+            if self.vectors is None or not len(self.types) or self.vectors.shape[1] != vector.shape[0]:
+                return None, 0.0, None
+            similarities = self.vectors @ vector
+            k = min(self.neighbours, len(similarities))
+            nearest = np.argpartition(-similarities, k - 1)[:k]
+            nearest = nearest[np.argsort(-similarities[nearest])]
+            best = int(nearest[0])
+
+            # similarity-weighted vote among the k nearest documents
+            votes = {}
+            for i in nearest:
+                votes[self.types[i]] = votes.get(self.types[i], 0.0) + float(similarities[i])
+            doc_type = max(votes, key = votes.get)
+            best_type = self.types[best]
+            similarity = float(similarities[best])
+            template = self.documents[best] if self.template_threshold is not None and similarity >= self.template_threshold else None
+
+        # the vote must be a clear majority that agrees with the best match, which must be similar enough
+        if similarity < self.threshold or votes[doc_type] < 0.5 * sum(votes.values()) or best_type != doc_type:
+            return None, similarity, None
+        return doc_type, similarity, template
+
+    # add a filed document to the index, saved to disk at most every SAVE_INTERVAL seconds
+    def add(self, vector, doc_type, document_json):
+        with self.lock:
+            row = vector.reshape(1, -1).astype(np.float32)
+            if self.vectors is None or self.vectors.shape[1] != row.shape[1]:
+                self.vectors, self.types, self.documents = row, [], []
+            else:
+                self.vectors = np.vstack([self.vectors, row])
+            self.types.append(doc_type.upper())
+            self.documents.append(document_json)
+            self.unsaved += 1
+            self.dirty = True
+            save_now = not self.rebuilding and time.time() - self.last_saved > SAVE_INTERVAL
+
+        if save_now:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Could not save embedding index {self.path}: {e}")
+
+# build the index from the documents already filed in the destination root;
+# `getMarkdown(pdf_path)` returns the parsed document (e.g. from the result cache or Docling)
+def rebuildIndex(preClassifier, destination_root, getMarkdown, log = print):
+    with preClassifier.lock:
+        preClassifier.vectors, preClassifier.types, preClassifier.documents = None, [], []
+        preClassifier.unsaved = 0
+        preClassifier.rebuilding = True # merging the rows into the old index on disk would keep its rows twice
+    try:
+        added = addFiledDocuments(preClassifier, destination_root, getMarkdown, log)
+    finally:
+        preClassifier.rebuilding = False
+
+    preClassifier.dirty = True
+    preClassifier.save(merge = False)
+    log(f"Embedding index rebuilt with {added} document(s).")
+    return added
+
+# HELPER: add the documents filed in the type folders of a destination root, returns how many were added
+def addFiledDocuments(preClassifier, destination_root, getMarkdown, log):
+    added = 0
+    for doc_type in sorted(os.listdir(destination_root)):
+        type_folder = os.path.join(destination_root, doc_type)
+        if doc_type == QUARANTINE_FOLDER or not os.path.isdir(type_folder):
+            continue
+        for filename in sorted(os.listdir(type_folder)):
+            if not filename.lower().endswith(".json"):
+                continue
+            json_path = os.path.join(type_folder, filename)
+            pdf_path = findFiledPdf(json_path)
+            if pdf_path is None:
+                continue
+            try:
+                with open(json_path, "r", encoding = "utf-8") as f:
+                    document = json.load(f)
+                vector = preClassifier.embed(getMarkdown(pdf_path))
+            except Exception as e:
+                log(f"Skipping {filename}: {e}")
+                continue
+            doc_type_found = (document.get("classification") or {}).get("type") or doc_type
+            preClassifier.add(vector, doc_type_found, json.dumps(document, ensure_ascii = False))
+            added += 1
+    return added
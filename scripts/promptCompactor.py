@@ -0,0 +1,194 @@
+import re
+import math
+
+from scripts import metrics
+
+COMPACTION_VERSION = 1  # bumped when the compaction changes, so cached analyses made with another one are redone
+CHARS_PER_TOKEN = 4     # rough size of a token of English text, used to estimate the prompt size without a tokenizer
+MAX_TABLE_ROWS = 8      # data rows kept of a table, the others are replaced by one "more rows" line
+MAX_CHUNK_LINES = 12    # paragraphs longer than this are ranked in pieces (text layers have no blank lines inside a page)
+GAP_MARKER = "[...]"    # put where sections were left out
+
+PROMPT_TOKENS = metrics.REGISTRY.counter("smartscanner_prompt_tokens_total", "Estimated document tokens sent to Ollama, before and after compaction.")
+
+# noise removed from every document
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)              # Docling placeholders, e.g. <!-- image -->
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")                 # markdown images
+LEADER_PATTERN = re.compile(r"([._\-=~*·•])\1{3,}")                 # dot leaders and blanks to fill in, e.g. "........" or "____"
+PAGE_NUMBER_PATTERN = re.compile(r"^\W*(page\s*\d{1,4}(\s*(of|/)\s*\d{1,4})?|\d{1,3}(\s*(of|/)\s*\d{1,3})?)\W*$", re.IGNORECASE) # not "2024"
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+
+# cues of the sections the analysis needs, see scoreChunk
+DATE_PATTERN = re.compile(
+    r"\b\d{1,2}\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?,?\s+\d{4}\b"
+    r"|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2},?\s+\d{4}\b"
+    r"|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}/\d{4}\b",
+    re.IGNORECASE
+)
+HEADER_PATTERN = re.compile(r"^\W*(subject|re|memorandum|memo|to|from|thru|through|for|date|title)\b\s*:?", re.IGNORECASE | re.MULTILINE)
+SIGNATURE_PATTERN = re.compile(
+    r"^\W*(sincerely|respectfully( yours| submitted)?|(very )?truly yours|(best |kind |warm )?regards|noted by|approved by|"
+    r"prepared by|submitted by|endorsed by|recommending approval|certified (by|true|correct)|conforme)\b",
+    re.IGNORECASE | re.MULTILINE
+)
+CREDENTIAL_PATTERN = re.compile(r"\b(ph\.?\s?d|dr|prof|professor|director|dean|chancellor|chair(person)?|head|coordinator|officer)\b\.?", re.IGNORECASE)
+RESEARCH_PATTERN = re.compile(r"^\W*(abstract|keywords?|key words|authors?|title)\b", re.IGNORECASE | re.MULTILINE)
+
+# estimated number of tokens of a text
+def estimateTokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+# HELPER: shorten one markdown table: cells without their padding, at most MAX_TABLE_ROWS data rows
+def _collapseTable(rows):
+    rows = [re.sub(r"\s{2,}", " ", row.strip()) for row in rows]
+    rows = [re.sub(r"-{3,}", "---", row) if TABLE_SEPARATOR_PATTERN.match(row) else row for row in rows]
+    header = 2 if len(rows) > 1 and TABLE_SEPARATOR_PATTERN.match(rows[1]) else 0
+    body = rows[header:]
+    if len(body) <= MAX_TABLE_ROWS:
+        return rows
+    # the first rows show what the table is about, the last one is often a total
+    kept = body[:MAX_TABLE_ROWS - 1]
+    return rows[:header] + kept + [f"| ... {len(body) - len(kept) - 1} more rows ... |", body[-1]]
+
+# remove what carries no information for the analysis: image placeholders, dot leaders, page numbers,
+# headers and footers repeated on every page, table padding and the middle of long tables
+def cleanMarkdown(markdown):
+    markdown = COMMENT_PATTERN.sub("", markdown)
+    markdown = IMAGE_PATTERN.sub("", markdown)
+    markdown = LEADER_PATTERN.sub(lambda match: match.group(1) * 3, markdown)
+    lines = [line.rstrip() for line in markdown.splitlines()]
+
+    # lines repeated three times or more are page headers and footers, only their first occurrence is kept
+    counts = {}
+    for line in lines:
+        key = line.strip().lower()
+        if key and not key.startswith("|"):
+            counts[key] = counts.get(key, 0) + 1
+    seen = set()
+
+    cleaned, table = [], []
+    signature = 0 # lines left of a signature block, where a repeated name is the signer and must stay
+    for line in lines + [""]:
+        if line.lstrip().startswith("|"):
+            table.append(line)
+            continue
+        if table:
+            cleaned.extend(_collapseTable(table))
+            table = []
+
+        key = line.strip().lower()
+        if PAGE_NUMBER_PATTERN.match(key) or re.fullmatch(r"[\W_]+", key or "x"):
+            continue # page numbers, and lines left with only punctuation
+        signature = 4 if SIGNATURE_PATTERN.search(key) else max(0, signature - 1)
+        if counts.get(key, 0) >= 3 and not signature:
+            if key in seen:
+                continue
+            seen.add(key)
+        if line.strip() or (cleaned and cleaned[-1].strip()): # runs of blank lines become one
+            cleaned.append(line)
+    return "\n".join(cleaned).strip()
+
+# HELPER: split markdown into chunks: a heading starts a new one, blank lines end one,
+# and chunks of more than MAX_CHUNK_LINES lines are cut into pieces (tables are never cut)
+def _splitChunks(markdown):
+    chunks, current = [], []
+
+    def close():
+        if current:
+            chunks.append("\n".join(current))
+            current.clear()
+
+    for line in markdown.splitlines():
+        if not line.strip():
+            close()
+        elif line.startswith("#"):
+            close()
+            current.append(line)
+        else:
+            if len(current) >= MAX_CHUNK_LINES and not line.lstrip().startswith("|"):
+                close()
+            current.append(line)
+    close()
+    return chunks
+
+# how much a chunk matters for the classification and metadata prompts: the header and date block
+# (subject, author, year), the signature block (author), and the title, abstract and keywords of
+# research papers (CRE metadata); the other chunks are worth less the further they are in the document
+def scoreChunk(chunk, index):
+    score = 10.0 / (1 + index)
+    if index == 0:
+        score += 100
+    elif index == 1:
+        score += 60
+    if DATE_PATTERN.search(chunk):
+        score += 50
+    if HEADER_PATTERN.search(chunk):
+        score += 50
+    if SIGNATURE_PATTERN.search(chunk):
+        score += 60
+    if CREDENTIAL_PATTERN.search(chunk):
+        score += 20
+    if RESEARCH_PATTERN.search(chunk):
+        score += 70
+    if chunk.startswith("#"):
+        score += 15
+    if chunk.lstrip().startswith("|"):
+        score -= 20 # tables rarely hold the fields the prompts ask for
+    return score
+
+# shorten a document to about `budget` tokens: the noise is removed, and if it is still too long
+# the highest scoring chunks are kept in their original order, with GAP_MARKER where others were left out.
+# Returns (markdown, stats) where stats has tokens_before, tokens_after, tokens_saved and dropped_chunks
+def compactMarkdown(markdown, budget):
+    tokens_before = estimateTokens(markdown)
+    cleaned = cleanMarkdown(markdown)
+
+    dropped = 0
+    if estimateTokens(cleaned) > budget:
+        chunks = _splitChunks(cleaned)
+        scores = [scoreChunk(chunk, index) for index, chunk in enumerate(chunks)]
+
+        # the chunk after a signature cue holds the signer's name and title
+        for index in range(len(chunks) - 1):
+            if SIGNATURE_PATTERN.search(chunks[index]):
+                scores[index + 1] = max(scores[index + 1], scores[index] - 1)
+
+        kept, used = set(), 0
+        for index in sorted(range(len(chunks)), key = lambda index: (-scores[index], index)):
+            cost = estimateTokens(chunks[index]) + 1
+            if used + cost <= budget:
+                kept.add(index)
+                used += cost
+
+        parts = []
+        for index, chunk in enumerate(chunks):
+            if index in kept:
+                parts.append(chunk)
+            elif not parts or parts[-1] != GAP_MARKER:
+                parts.append(GAP_MARKER)
+        if not kept: # not even the first chunk fits, keep its beginning
+            parts = [chunks[0][:budget * CHARS_PER_TOKEN], GAP_MARKER] if chunks else []
+        dropped = len(chunks) - len(kept)
+        cleaned = "\n\n".join(parts)
+
+    tokens_after = estimateTokens(cleaned)
+    return cleaned, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "dropped_chunks": dropped,
+    }
+
+# compactMarkdown() for a prompt, with its token counts added to the metrics and to the timing block
+# of the document being processed; a budget of 0 or None leaves the document as it is
+def compactDocument(markdown, budget):
+    if not budget:
+        return markdown
+    with metrics.timed("compaction"):
+        compacted, stats = compactMarkdown(markdown, budget)
+    PROMPT_TOKENS.inc(stats["tokens_before"], stage = "before")
+    PROMPT_TOKENS.inc(stats["tokens_after"], stage = "after")
+    timing = metrics.currentTiming()
+    if timing is not None:
+        timing["compaction"] = stats # the last compaction is the one the final analysis used
+    return compacted
@@ -0,0 +1,103 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from scripts.fileFunctions import CONFIG_PATH
+
+CACHE_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "cache.sqlite") # stored next to config.json
+
+# returns the SHA-256 of the file contents, identical scans get the same key whatever their name
+def hashFile(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# persistent cache of parsed markdown and analyzed Document JSON, keyed by file hash
+class ResultCache:
+    def __init__(self, parser_version, analysis_version, path = CACHE_PATH, max_bytes = 512 * 1024 * 1024):
+        self.parser_version = parser_version        # markdown from another parser version is ignored
+        self.analysis_version = analysis_version    # documents from another prompt/model version are ignored
+        self.max_bytes = max_bytes                  # evict least recently used entries above this size
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, timeout = 30, check_same_thread = False) # shared by the scanners running on this machine
+        with self.lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS results (
+                    sha256 TEXT PRIMARY KEY,
+                    parser_version TEXT,
+                    markdown TEXT,
+                    analysis_version TEXT,
+                    document TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL
+                )
+            ''')
+
+            # invalidate results made with an older parser, prompt or model
+            self.connection.execute("DELETE FROM results WHERE parser_version IS NOT ?", (parser_version,))
+            self.connection.execute(
+                "UPDATE results SET document = NULL, analysis_version = NULL, size = LENGTH(markdown) WHERE analysis_version IS NOT ?",
+                (analysis_version,)
+            )
+
+    # returns (markdown, document JSON), either can be None if not cached
+    def get(self, sha256):
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT markdown, document FROM results WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is None:
+                return None, None
+            self.connection.execute("UPDATE results SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+        return row
+
+    # store the parsed markdown of a file
+    def putMarkdown(self, sha256, markdown):
+        with self.lock, self.connection:
+            self.connection.execute('''
+                INSERT INTO results (sha256, parser_version, markdown, size, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET
+                    parser_version = excluded.parser_version,
+                    markdown = excluded.markdown,
+                    size = excluded.size + COALESCE(LENGTH(results.document), 0),
+                    last_used = excluded.last_used
+            ''', (sha256, self.parser_version, markdown, len(markdown), time.time()))
+        self.evict()
+
+    # store the validated Document of a file as JSON
+    def putDocument(self, sha256, document_json):
+        with self.lock, self.connection:
+            self.connection.execute('''
+                INSERT INTO results (sha256, parser_version, analysis_version, document, size, last_used) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET
+                    analysis_version = excluded.analysis_version,
+                    document = excluded.document,
+                    size = excluded.size + COALESCE(LENGTH(results.markdown), 0),
+                    last_used = excluded.last_used
+            ''', (sha256, self.parser_version, self.analysis_version, document_json, len(document_json), time.time()))
+        self.evict()
+
+    # delete least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        with self.lock, self.connection:
+            total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            rows = self.connection.execute("SELECT sha256, size FROM results ORDER BY last_used").fetchall()
+            removed = []
+            for sha256, size in rows:
+                if total <= self.max_bytes:
+                    break
+                removed.append((sha256,))
+                total -= size
+            self.connection.executemany("DELETE FROM results WHERE sha256 = ?", removed)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,103 @@
+import time
+import heapq
+import random
+import sqlite3
+import itertools
+import threading
+
+import httpx
+import ollama
+
+from scripts import metrics
+
+RETRIES = metrics.REGISTRY.counter("smartscanner_retries_total", "Documents sent back to a stage after a transient error, by stage and error class.")
+QUARANTINED = metrics.REGISTRY.counter("smartscanner_quarantined_total", "Documents moved to the quarantine folder, by stage and error class.")
+
+JITTER = 0.2 # delays are stretched by up to 20% at random, so documents that failed together don't all come back at once
+
+# check whether an error comes from the environment rather than from the document: Ollama unreachable,
+# overloaded or timing out, a file still locked by the scanner software, a database busy in another process.
+# The same document is likely to work a little later
+def isTransient(error):
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500 or error.status_code == 429
+    if isinstance(error, PermissionError):
+        return True # Windows locks a file while another program has it open
+    if isinstance(error, sqlite3.OperationalError):
+        return "locked" in str(error) or "busy" in str(error)
+    return False
+
+# check whether an error means the scanner can't process any document until someone fixes its setup: the model
+# is not installed on the Ollama server (404) or the server rejects the requests the app builds (400). Neither
+# the document nor waiting is to blame, so such errors are not retried and the document is not quarantined
+def isEnvironmentError(error):
+    return isinstance(error, ollama.ResponseError) and error.status_code in (400, 404)
+
+# name failures are counted under, the class of the exception (e.g. ValidationError, ReadTimeout)
+def errorClass(error):
+    return type(error).__name__
+
+# seconds to wait before retry number `attempt` (1 for the first): `base` doubled for each earlier
+# retry, at most `max_delay`, plus the jitter
+def backoffDelay(attempt, base, max_delay):
+    delay = min(base * 2 ** (attempt - 1), max_delay)
+    return delay * (1 + random.uniform(0, JITTER))
+
+# items waiting for their retry: a thread hands each one to `deliver(item)` once its delay has passed,
+# so the workers that put them there go on with other documents in the meantime
+class RetryQueue:
+    def __init__(self, deliver, name = "retry"):
+        self.deliver = deliver
+        self.condition = threading.Condition()
+        self.heap = []                  # [due time, sequence number, item]
+        self.sequence = itertools.count()
+        self.delivering = 0             # items taken from the heap and not delivered yet, still counted by len()
+        self.closed = False
+        self.thread = threading.Thread(target = self.run, name = name, daemon = True)
+        self.thread.start()
+
+    # items waiting, including one that is being delivered
+    def __len__(self):
+        with self.condition:
+            return len(self.heap) + self.delivering
+
+    # deliver an item after `delay` seconds
+    def put(self, item, delay):
+        with self.condition:
+            heapq.heappush(self.heap, [time.monotonic() + delay, next(self.sequence), item])
+            self.condition.notify()
+
+    # drop the waiting items and return them
+    def clear(self):
+        with self.condition:
+            items = [entry[2] for entry in sorted(self.heap)]
+            self.heap = []
+        return items
+
+    # stop the thread, the waiting items are dropped and returned; an item being delivered is delivered first
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+        return self.clear()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                if self.closed:
+                    return
+                item = heapq.heappop(self.heap)[2]
+                self.delivering += 1
+            try:
+                self.deliver(item)
+            except Exception as e:
+                print(f"Could not retry {item}: {e}")
+            finally:
+                with self.condition:
+                    self.delivering -= 1
@@ -0,0 +1,168 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+from scripts import metrics
+
+LEASES = metrics.REGISTRY.counter("smartscanner_leases_total", "Files of the shared queue, by source and outcome (claimed, taken_over, busy, lost).")
+LEASES_HELD = metrics.REGISTRY.gauge("smartscanner_leases_held", "Files of each source this scanner holds the lease of.")
+
+QUEUE_FILENAME = ".smartscanner-queue.sqlite" # kept in the source folder, on the same drive as the files it coordinates
+
+# name of this scanner in the shared queues, unique per process so two copies on one machine don't mix up their leases
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# another scanner took over a file whose lease ran out while this one was still working on it
+class LeaseLost(RuntimeError):
+    pass
+
+# leases on the files of one source folder, shared by every scanner watching it (GUI or headless, on this
+# machine or another one). A scanner only processes a file once it holds its lease; the lease is renewed
+# every `heartbeat` seconds while the file is in its pipeline and removed once the file has left the source
+# folder or was given up. A scanner that crashes or loses the drive stops renewing, and after `ttl` seconds
+# the others see the lease as expired and `on_expired(path)` queues the file again so one of them takes it over.
+# Expiry compares wall-clock times written by different machines, so their clocks must agree to well within `ttl`
+class SharedQueue:
+    def __init__(self, source_folder, ttl = 60, heartbeat = 10, on_expired = None, name = None, path = None):
+        self.folder = source_folder
+        self.path = path or os.path.join(source_folder, QUEUE_FILENAME)
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_expired = on_expired    # called as on_expired(path) for files whose lease ran out, from the heartbeat thread
+        self.name = name or os.path.basename(os.path.normpath(source_folder)) # source name, used as metric label
+        self.node = NODE_ID
+        self.lock = threading.Lock()
+        self.held = set()               # keys of the files this scanner holds the lease of
+        self.counts = {"claimed": 0, "taken_over": 0, "busy": 0, "lost": 0}
+        self.closed = threading.Event()
+
+        # rollback journal instead of WAL: WAL needs shared memory between the processes, which a network drive doesn't provide
+        self.connection = sqlite3.connect(self.path, timeout = 30, check_same_thread = False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode = DELETE")
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    path TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    claimed REAL NOT NULL,
+                    expires REAL NOT NULL,
+                    attempts INTEGER NOT NULL
+                )
+            ''')
+        LEASES_HELD.set_function(lambda: len(self.held), source = self.name)
+
+        self.thread = threading.Thread(target = self.run, name = f"lease-{self.name}", daemon = True)
+        self.thread.start()
+
+    # HELPER: key of a file in the queue, its path relative to the source folder with "/" separators,
+    # so scanners that mount the shared drive under different paths (Z:\Scans, /mnt/scans) agree on it
+    def key(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.folder)).replace(os.sep, "/")
+
+    # HELPER: path of a key on this machine
+    def local_path(self, key):
+        return os.path.join(self.folder, *key.split("/"))
+
+    # HELPER: count an outcome for the summary and the metrics
+    def count(self, outcome):
+        self.counts[outcome] += 1
+        LEASES.inc(source = self.name, outcome = outcome)
+
+    # take the lease of a file, returns False if another scanner (or this one) holds a lease on it that has
+    # not expired yet; an expired lease is taken over
+    def claim(self, path):
+        key, now = self.key(path), time.time()
+        with self.lock, self.connection:
+            claimed = self.connection.execute(
+                "INSERT INTO leases (path, owner, claimed, expires, attempts) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT(path) DO UPDATE SET owner = excluded.owner, claimed = excluded.claimed, "
+                "expires = excluded.expires, attempts = leases.attempts + 1 WHERE leases.expires < excluded.claimed",
+                (key, self.node, now, now + self.ttl)
+            ).rowcount == 1
+            attempts = self.connection.execute("SELECT attempts FROM leases WHERE path = ?", (key,)).fetchone()[0] if claimed else 0
+            if claimed:
+                self.held.add(key)
+
+        if not claimed:
+            self.count("busy")
+        elif attempts > 1:
+            self.count("taken_over") # its scanner stopped renewing it, e.g. crashed
+            print(f"Took over {key} from a scanner that stopped responding (attempt {attempts}).")
+        else:
+            self.count("claimed")
+        return claimed
+
+    # renew the lease of one file, e.g. right before its files are moved; False if it was lost to another scanner
+    def renew(self, path):
+        key, now = self.key(path), time.time()
+        with self.lock, self.connection:
+            renewed = self.connection.execute(
+                "UPDATE leases SET expires = ? WHERE path = ? AND owner = ?", (now + self.ttl, key, self.node)
+            ).rowcount == 1
+            if not renewed and key in self.held:
+                self.held.discard(key)
+                self.count("lost")
+        return renewed
+
+    # give the lease of a file back: it was filed, quarantined or given up, or the scanner is stopping
+    def release(self, path):
+        key = self.key(path)
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM leases WHERE path = ? AND owner = ?", (key, self.node))
+            self.held.discard(key)
+
+    # HELPER: renew every lease held by this scanner at once, and forget the ones another scanner took over
+    def renew_all(self):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE leases SET expires = ? WHERE owner = ?", (now + self.ttl, self.node))
+            owned = {row[0] for row in self.connection.execute("SELECT path FROM leases WHERE owner = ?", (self.node,))}
+            lost = self.held - owned
+            self.held &= owned
+        for key in lost:
+            self.count("lost")
+            print(f"Lost the lease of {key} to another scanner.")
+
+    # HELPER: files whose lease expired; the ones that left the source folder (filed by a scanner that died
+    # before releasing them) are removed, the others are handed to on_expired() to be queued again
+    def expired(self):
+        now = time.time()
+        with self.lock:
+            keys = [row[0] for row in self.connection.execute("SELECT path FROM leases WHERE expires < ?", (now,))]
+        paths = []
+        for key in keys:
+            path = self.local_path(key)
+            if os.path.exists(path):
+                paths.append(path)
+                continue
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM leases WHERE path = ? AND expires < ?", (key, now))
+        return paths
+
+    # heartbeat: renew this scanner's leases and look for the ones other scanners let expire; errors
+    # (e.g. the drive is unreachable for a moment) are reported and tried again on the next beat
+    def run(self):
+        while not self.closed.wait(self.heartbeat):
+            try:
+                self.renew_all()
+                for path in self.expired():
+                    if self.on_expired is not None:
+                        self.on_expired(path)
+            except Exception as e:
+                print(f"Shared queue {self.path} could not be updated: {e}")
+
+    # stop the heartbeat and give back the leases still held, so other scanners take those files right away
+    def close(self):
+        self.closed.set()
+        self.thread.join(self.heartbeat + 1)
+        with self.lock:
+            try:
+                with self.connection:
+                    self.connection.execute("DELETE FROM leases WHERE owner = ?", (self.node,))
+            except sqlite3.Error as e:
+                print(f"Could not release the leases in {self.path}: {e}")
+            self.held.clear()
+            self.connection.close()
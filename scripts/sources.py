@@ -0,0 +1,85 @@
+import os
+
+from scripts import metrics
+from scripts.fileFunctions import getSetting
+
+SOURCE_QUEUE_DEPTH = metrics.REGISTRY.gauge("smartscanner_source_queue_depth", "Files of each source waiting in the job queue or being processed by the pipeline, by state.")
+SOURCE_WAIT_SECONDS = metrics.REGISTRY.histogram("smartscanner_source_wait_seconds", "Time a file waited in the job queue before it entered the pipeline, by source.")
+SOURCE_LATENCY_SECONDS = metrics.REGISTRY.histogram("smartscanner_source_latency_seconds", "Time from when a file entered the pipeline until it was committed, by source.")
+
+DEFAULT_SOURCE = "default" # name of the source_path/destination_path pair of config.json
+
+# one watched intake folder and the destination root its documents are filed into
+class Source:
+    def __init__(self, name, source_path, destination_path, weight = 1.0):
+        self.name = name
+        self.source_path = source_path
+        self.destination_path = destination_path
+        self.weight = weight    # share of the pipeline it gets while other sources also have files waiting
+
+    def __repr__(self):
+        return f"Source({self.name!r}, {self.source_path!r} -> {self.destination_path!r}, weight {self.weight})"
+
+    # check whether a file is in this source's folder (or one of its subfolders)
+    def contains(self, path):
+        if not self.source_path:
+            return False
+        folder = os.path.normcase(os.path.abspath(self.source_path))
+        path = os.path.normcase(os.path.abspath(path))
+        # compared as prefixes: commonpath() raises ValueError for a path on another drive, or under a share root like \\server\share
+        return path == folder or path.startswith(folder.rstrip(os.path.sep) + os.path.sep)
+
+# the sources served by one pipeline, in the order they were configured
+class Sources:
+    def __init__(self, sources):
+        if not sources:
+            raise ValueError("at least one source folder is needed")
+        names = [source.name for source in sources]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"source names must be unique: {', '.join(duplicates)}")
+        self.sources = list(sources)
+        self.by_name = {source.name: source for source in sources}
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    # source a file belongs to: the one with the deepest folder containing it, so a department
+    # folder inside another source's folder keeps its own files; the first source if none matches
+    def match(self, path):
+        matches = [source for source in self.sources if source.contains(path)]
+        if not matches:
+            return self.sources[0]
+        return max(matches, key = lambda source: len(os.path.abspath(source.source_path)))
+
+    # distinct destination roots, in the order of the sources
+    def destinations(self):
+        return list(dict.fromkeys(source.destination_path for source in self.sources))
+
+# sources of a run: the folders given on the command line, otherwise the "sources" list of config.json,
+# otherwise its source_path/destination_path pair. Each entry of the list is
+# {"name": ..., "source_path": ..., "destination_path": ..., "weight": 1}, raises ValueError if one is invalid
+def loadSources(config, source_path = None, destination_path = None):
+    if source_path is not None:
+        return Sources([Source(DEFAULT_SOURCE, source_path, destination_path or config.get("destination_path"))])
+
+    entries = getSetting(config, "sources")
+    if not entries:
+        return Sources([Source(DEFAULT_SOURCE, config.get("source_path"), config.get("destination_path"))])
+
+    sources = []
+    for i, entry in enumerate(entries):
+        if not entry.get("source_path") or not entry.get("destination_path"):
+            raise ValueError(f"source #{i + 1} of config.json needs a source_path and a destination_path")
+        weight = float(entry.get("weight", 1))
+        if weight <= 0:
+            raise ValueError(f"the weight of source #{i + 1} of config.json must be above 0")
+        name = entry.get("name") or os.path.basename(os.path.normpath(entry["source_path"]))
+        sources.append(Source(name, entry["source_path"], entry["destination_path"], weight))
+    return Sources(sources)
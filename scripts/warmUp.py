@@ -0,0 +1,57 @@
+# background warm-up: nothing heavy is imported here, so the GUI can open before Docling, ollama
+# and the pydantic schemas are loaded; they are imported and their models loaded in a thread instead
+
+import threading
+
+from scripts.fileFunctions import getSetting
+
+# readiness states reported to the callback
+LOADING_LIBRARIES = "Loading libraries..."
+LOADING_DOCLING = "Loading Docling models..."
+LOADING_MODEL = "Loading the language model..."
+READY = "Ready"
+OLLAMA_UNAVAILABLE = "Ollama not reachable"
+WARM_UP_FAILED = "Loading failed, see the console"
+
+_thread = None
+_lock = threading.Lock()
+
+# import the processing modules and load the Docling and Ollama models in a background thread;
+# `report(state)` is called from that thread with each readiness state, ending with READY, OLLAMA_UNAVAILABLE or WARM_UP_FAILED.
+# Calling it again while a warm-up is running returns the running thread
+def startWarmUp(config, report = print):
+    global _thread
+
+    def warm_up():
+        report(LOADING_LIBRARIES)
+        try:
+            from scripts import pipeline # noqa: F401 (loads docling, ollama and the schemas)
+            from scripts.documentParser import warmUpConverter
+            from scripts import aiFunctions
+            from scripts.backendPool import ollamaHosts
+
+            # parser processes load their own models when monitoring starts
+            if getSetting(config, "parse_processes") == 0:
+                report(LOADING_DOCLING)
+                warmUpConverter(getSetting(config, "parse_workers")).join()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+            report(WARM_UP_FAILED)
+            return
+
+        report(LOADING_MODEL)
+        keep_alive = getSetting(config, "ollama_keep_alive")
+        loaded = 0
+        for host in ollamaHosts(config):
+            try:
+                aiFunctions.preloadModel(host, keep_alive)
+                loaded += 1
+            except Exception as e:
+                print(f"Could not preload {aiFunctions.MODEL} on {host or 'the default Ollama server'}: {e}")
+        report(READY if loaded else OLLAMA_UNAVAILABLE)
+
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target = warm_up, name = "warm-up", daemon = True)
+            _thread.start()
+        return _thread
@@ -0,0 +1,269 @@
+import os
+import sys
+import time
+import queue
+import pickle
+import statistics
+import threading
+import multiprocessing
+from collections import deque
+
+from scripts import metrics
+
+WORKER_RSS = metrics.REGISTRY.gauge("smartscanner_process_resident_bytes", "Resident memory of the app and its worker processes after their last document.")
+WORKER_PEAK_RSS = metrics.REGISTRY.gauge("smartscanner_process_peak_resident_bytes", "Highest resident memory of the app and of each worker process so far.")
+WORKER_RESTARTS = metrics.REGISTRY.counter("smartscanner_worker_restarts_total", "Worker processes replaced, by reason (documents, memory or crash).")
+
+READY_TIMEOUT = 600     # seconds a new worker may take to load its models
+STOP_TIMEOUT = 10       # seconds a recycled worker may take to exit before it is killed
+STEADY_SAMPLES = 100    # recent memory samples used for the steady-state figure
+
+# resident memory of a process in MB (this one by default), None where it can't be read
+def currentRssMb(pid = None):
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", "r") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, AttributeError): # not Linux
+        pass
+    try:
+        import psutil
+        return round(psutil.Process(pid).memory_info().rss / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+# highest resident memory of this process so far in MB, None where it can't be measured
+def peakRssMb():
+    try:
+        import resource
+    except ImportError: # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024, 1) # bytes on macOS, KB on Linux
+
+WORKER_RSS.set_function(lambda: (currentRssMb() or 0) * 1024 * 1024, process = "main")
+WORKER_PEAK_RSS.set_function(lambda: (peakRssMb() or 0) * 1024 * 1024, process = "main")
+
+# the worker process died while it had a document, e.g. killed by the OS for using too much memory
+class WorkerCrashed(RuntimeError):
+    pass
+
+# the pool was shut down before a worker took the task, it was not run
+class PoolStopped(RuntimeError):
+    pass
+
+# none of the worker processes could be started (e.g. their models could not be loaded), the task was not run
+class PoolUnavailable(RuntimeError):
+    pass
+
+# HELPER: main loop of a worker process: load the models with `initializer`, then run the tasks sent
+# by the parent one at a time; every answer carries the worker's memory so the parent can recycle it
+def _workerMain(connection, initializer, initargs):
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+        connection.send(("ready", None, currentRssMb(), peakRssMb()))
+    except BaseException as e:
+        connection.send(("failed", _picklable(e), None, None))
+        return
+
+    while True:
+        try:
+            task = connection.recv()
+        except (EOFError, OSError): # parent is gone
+            return
+        if task is None:
+            return
+        function, args = task
+        try:
+            answer = ("ok", function(*args))
+        except BaseException as e:
+            answer = ("error", _picklable(e))
+        connection.send(answer + (currentRssMb(), peakRssMb()))
+
+# HELPER: the exception itself if it can be sent to the parent, otherwise a RuntimeError with its text
+def _picklable(error):
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+# parent side of one worker process
+class Worker:
+    def __init__(self, context, name, initializer, initargs):
+        self.name = name
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target = _workerMain, args = (child_connection, initializer, initargs), name = name, daemon = True)
+        self.process.start()
+        child_connection.close()
+        self.documents = 0      # tasks run since it was started
+        self.rss_mb = None      # resident memory after its last task
+        self.peak_mb = None     # highest resident memory so far
+
+    # wait until the models are loaded, raises the initializer's exception if it failed
+    def wait_ready(self, timeout = READY_TIMEOUT):
+        if not self.connection.poll(timeout):
+            raise TimeoutError(f"{self.name} did not start within {timeout} seconds")
+        status, error, self.rss_mb, self.peak_mb = self.connection.recv()
+        if status != "ready":
+            raise error
+
+    # ask the process to exit after its current task, and kill it if it does not
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+# pool of worker processes that are replaced after `max_documents` tasks or once their resident memory
+# goes over `max_rss_mb`, so libraries that keep growing (Docling's models and page images) can't take
+# the machine into swap on long runs. A worker is only replaced between two tasks, never in the middle
+# of one; a task whose worker crashed is handed to a new worker once
+class RecyclingPool:
+    def __init__(self, processes, initializer = None, initargs = (), max_documents = 0, max_rss_mb = 0, name = "worker"):
+        self.size = max(1, processes)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_documents = max_documents  # tasks per process before it is replaced, 0 for no limit
+        self.max_rss_mb = max_rss_mb        # resident memory above which a process is replaced, 0 for no limit
+        self.name = name
+        self.context = multiprocessing.get_context("spawn") # a forked copy of the app's threads and models is unsafe and large
+        self.idle = queue.Queue()           # workers waiting for a task
+        self.lock = threading.Lock()
+        self.closed = False
+        self.workers = {}                   # slot -> current Worker, busy or idle
+        self.restarts = {}                  # reason -> count
+        self.samples = deque(maxlen = STEADY_SAMPLES) # worker memory after each task
+        self.peak_mb = 0.0                  # highest memory of any worker, including the replaced ones
+        self.broken = set()                 # slots whose worker could not be started
+        for slot in range(self.size):
+            self.start_worker(slot)
+
+    # HELPER: start the worker of a slot in the background, it joins the idle queue once its models are loaded
+    def start_worker(self, slot, attempt = 0):
+        def start():
+            if self.closed:
+                return
+            worker = Worker(self.context, f"{self.name}-{slot}", self.initializer, self.initargs)
+            with self.lock:
+                self.workers[slot] = worker
+            try:
+                worker.wait_ready()
+            except Exception as e:
+                print(f"{worker.name} could not start: {e}")
+                worker.stop()
+                if attempt < 3 and not self.closed:
+                    time.sleep(5)
+                    self.start_worker(slot, attempt + 1)
+                else:
+                    with self.lock:
+                        self.broken.add(slot)
+                return
+            WORKER_RSS.set_function(lambda: (worker.rss_mb or 0) * 1024 * 1024, process = worker.name)
+            WORKER_PEAK_RSS.set_function(lambda: (worker.peak_mb or 0) * 1024 * 1024, process = worker.name)
+            if self.closed:
+                worker.stop()
+            else:
+                self.idle.put((slot, worker))
+        threading.Thread(target = start, name = f"{self.name}-{slot}-start", daemon = True).start()
+
+    # HELPER: stop a worker and start its replacement
+    def recycle(self, slot, worker, reason):
+        WORKER_RESTARTS.inc(reason = reason)
+        with self.lock:
+            self.restarts[reason] = self.restarts.get(reason, 0) + 1
+        if reason != "crash":
+            print(f"Restarting {worker.name} after {worker.documents} document(s) ({reason}, {worker.rss_mb} MB).")
+        threading.Thread(target = worker.stop, daemon = True).start()
+        self.start_worker(slot)
+
+    # run function(*args) in a worker process and return its result; blocks until a worker is free.
+    # `function` and its arguments must be picklable (module-level functions, strings, numbers...)
+    def call(self, function, *args):
+        for attempt in range(2):
+            slot, worker = self.acquire()
+            try:
+                worker.connection.send((function, args))
+                status, value, worker.rss_mb, worker.peak_mb = worker.connection.recv()
+            except (EOFError, OSError) as e:
+                worker.process.join(1)
+                code = worker.process.exitcode
+                print(f"{worker.name} died while working (exit code {code}), handing its document to a new worker.")
+                self.recycle(slot, worker, "crash")
+                if attempt == 1:
+                    raise WorkerCrashed(f"{worker.name} died twice on the same document (exit code {code})") from e
+                continue
+
+            worker.documents += 1
+            self.release(slot, worker)
+            if status == "error":
+                raise value
+            return value
+
+    # HELPER: next idle worker, skipping any that exited while idle
+    def acquire(self):
+        while True:
+            if self.closed:
+                raise PoolStopped(f"{self.name} processes are stopped")
+            if len(self.broken) == self.size:
+                raise PoolUnavailable(f"no {self.name} process could be started, see the console")
+            try:
+                slot, worker = self.idle.get(timeout = 1)
+            except queue.Empty:
+                continue
+            if worker.process.is_alive():
+                return slot, worker
+            self.recycle(slot, worker, "crash")
+
+    # HELPER: give a worker back after a task, or replace it if it has done enough or grown too large
+    def release(self, slot, worker):
+        with self.lock:
+            if worker.rss_mb is not None:
+                self.samples.append(worker.rss_mb)
+            self.peak_mb = max(self.peak_mb, worker.peak_mb or 0.0)
+
+        if self.closed:
+            threading.Thread(target = worker.stop, daemon = True).start()
+        elif self.max_rss_mb and worker.rss_mb is not None and worker.rss_mb > self.max_rss_mb:
+            self.recycle(slot, worker, "memory")
+        elif self.max_documents and worker.documents >= self.max_documents:
+            self.recycle(slot, worker, "documents")
+        else:
+            self.idle.put((slot, worker))
+
+    # memory of the app and its workers in MB: current and peak of the app, peak of any worker
+    # (replaced ones included), median of the workers' memory after their recent tasks (steady state),
+    # and the number of restarts by reason
+    def memory_report(self):
+        with self.lock:
+            samples = list(self.samples)
+            return {
+                "main_rss_mb": currentRssMb(),
+                "main_peak_mb": peakRssMb(),
+                "worker_peak_mb": self.peak_mb or None,
+                "worker_steady_mb": round(statistics.median(samples), 1) if samples else None,
+                "workers": [
+                    {"name": worker.name, "pid": worker.process.pid, "documents": worker.documents, "rss_mb": worker.rss_mb}
+                    for _, worker in sorted(self.workers.items())
+                ],
+                "restarts": dict(self.restarts),
+            }
+
+    # stop every worker; tasks already running finish first, their workers exit afterwards
+    def shutdown(self):
+        self.closed = True
+        while True:
+            try:
+                _, worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            threading.Thread(target = worker.stop, daemon = True).start()
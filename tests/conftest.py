@@ -0,0 +1,9 @@
+# the tests import the app modules the same way main.py does, from the repository root
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.json and everything kept next to it go to a folder of the test run, never the user's %AppData%
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix = "smartscanner-tests-")
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from scripts import aiFunctions
+from scripts.aiFunctions import Classification, missingFields
+
+# HELPER: classification with the given fields changed
+def classification(**fields):
+    values = {"subject": "Budget Review", "author": "Finance Office", "type": "ADM", "year_processed": "2024"}
+    values.update(fields)
+    return Classification(**values)
+
+def test_a_complete_classification_has_no_missing_fields():
+    assert missingFields(classification()) == []
+
+def test_empty_placeholder_and_yearless_fields_are_missing():
+    assert missingFields(classification(author = " ")) == ["author"]
+    assert missingFields(classification(subject = "null", author = "Unknown")) == ["subject", "author"]
+    assert missingFields(classification(year_processed = "last year")) == ["year_processed"]
+
+# stands in for ollama.chat, answers with the next canned response and records the messages
+class FakeChat:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.options = []
+
+    def __call__(self, model, messages, stream, format, **options):
+        self.calls.append([dict(message) for message in messages])
+        self.options.append(options)
+        return SimpleNamespace(message = SimpleNamespace(content = self.responses.pop(0)))
+
+CRE_CLASSIFICATION = '{"subject": "Study", "author": "Doe", "type": "CRE", "year_processed": "2024", "funding": "INT"}'
+ADM_CLASSIFICATION = '{"subject": "Memo", "author": "Office", "type": "ADM", "year_processed": "2024", "funding": "null"}'
+METADATA = '''{"title": "A Study", "authors": ["Doe"], "presenting_author": "Doe", "conference": "Research Week",
+    "conference_date": "2024-03-01", "location": "null", "abstract": "...", "keywords": ["study"]}'''
+
+def test_two_call_mode_sends_the_document_again_for_the_metadata(monkeypatch):
+    fake_chat = FakeChat(CRE_CLASSIFICATION, METADATA)
+    monkeypatch.setattr(aiFunctions.ollama, "chat", fake_chat)
+
+    document = aiFunctions.analyzeDocument("# A Study", "paper", aiFunctions.TWO_CALL)
+    assert document.metadata.title == "A Study"
+    assert document.metadata.location is None
+    assert [len(messages) for messages in fake_chat.calls] == [1, 1]
+    assert all(messages[0]["content"].startswith("# A Study") for messages in fake_chat.calls)
+
+def test_multi_turn_mode_continues_the_classification_conversation(monkeypatch):
+    fake_chat = FakeChat(CRE_CLASSIFICATION, METADATA)
+    monkeypatch.setattr(aiFunctions.ollama, "chat", fake_chat)
+
+    document = aiFunctions.analyzeDocument("# A Study", "paper", aiFunctions.MULTI_TURN)
+    assert document.classification.funding == "INT"
+    classify_call, metadata_call = fake_chat.calls
+    assert metadata_call[:1] == classify_call
+    assert metadata_call[1] == {"role": "assistant", "content": CRE_CLASSIFICATION}
+    assert "# A Study" not in metadata_call[2]["content"]
+
+def test_combined_mode_is_a_single_call(monkeypatch):
+    fake_chat = FakeChat('{"classification": %s, "metadata": %s}' % (CRE_CLASSIFICATION, METADATA))
+    monkeypatch.setattr(aiFunctions.ollama, "chat", fake_chat)
+
+    document = aiFunctions.analyzeDocument("# A Study", "paper", aiFunctions.COMBINED)
+    assert len(fake_chat.calls) == 1
+    assert document.metadata.title == "A Study"
+
+def test_documents_that_are_not_cre_get_no_metadata_or_funding(monkeypatch):
+    for mode in aiFunctions.ANALYSIS_MODES:
+        if mode == aiFunctions.COMBINED:
+            fake_chat = FakeChat('{"classification": %s, "metadata": %s}' % (ADM_CLASSIFICATION, METADATA))
+        else:
+            fake_chat = FakeChat(ADM_CLASSIFICATION)
+        monkeypatch.setattr(aiFunctions.ollama, "chat", fake_chat)
+
+        document = aiFunctions.analyzeDocument("# Memo", "memo", mode)
+        assert len(fake_chat.calls) == 1
+        assert document.metadata is None
+        assert document.classification.funding is None
+
+def test_requests_keep_the_model_loaded(monkeypatch):
+    fake_chat = FakeChat(ADM_CLASSIFICATION, ADM_CLASSIFICATION)
+    monkeypatch.setattr(aiFunctions.ollama, "chat", fake_chat)
+
+    aiFunctions.analyzeDocument("# Memo", "memo")
+    aiFunctions.analyzeDocument("# Memo", "memo", keep_alive = "2h")
+    assert fake_chat.options == [{"keep_alive": aiFunctions.KEEP_ALIVE}, {"keep_alive": "2h"}]
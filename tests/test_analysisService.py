@@ -0,0 +1,87 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import analysisService
+from scripts.analysisService import AnalysisService, AnalysisCancelled
+
+# stands in for ollama.AsyncClient, every chat takes `delay` seconds and the most requests
+# running at the same time is recorded
+class FakeAsyncClient:
+    delay = 0.05
+    instances = []
+
+    def __init__(self, host = None):
+        self.host = host
+        self.active = 0
+        self.most_active = 0
+        self.closed = False
+        self._client = SimpleNamespace(aclose = self.aclose)
+        FakeAsyncClient.instances.append(self)
+
+    async def chat(self, **kwargs):
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return SimpleNamespace(message = SimpleNamespace(content = kwargs["messages"][0]["content"]))
+
+    async def aclose(self):
+        self.closed = True
+
+@pytest.fixture(autouse = True)
+def fake_client(monkeypatch):
+    FakeAsyncClient.instances = []
+    FakeAsyncClient.delay = 0.05
+    monkeypatch.setattr(analysisService, "AsyncClient", FakeAsyncClient)
+
+# HELPER: send `count` chats from as many threads, returns the responses (or exceptions) in order
+def chatFromThreads(service, count):
+    results = [None] * count
+    def send(i):
+        try:
+            results[i] = service.chat(model = "qwen3", messages = [{"role": "user", "content": str(i)}]).message.content
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target = send, args = (i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_requests_in_flight_are_bounded_by_the_concurrency():
+    service = AnalysisService("http://ollama:11434", concurrency = 2)
+    threads, results = chatFromThreads(service, 6)
+    for thread in threads:
+        thread.join()
+    service.close()
+
+    client = FakeAsyncClient.instances[0]
+    assert client.host == "http://ollama:11434"
+    assert results == [str(i) for i in range(6)]
+    assert client.most_active == 2
+    assert client.closed
+
+def test_close_cancels_the_requests_in_flight():
+    FakeAsyncClient.delay = 30
+    service = AnalysisService(concurrency = 1)
+    threads, results = chatFromThreads(service, 2)
+    time.sleep(0.1)
+
+    service.close()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(result, AnalysisCancelled) for result in results)
+    with pytest.raises(AnalysisCancelled):
+        service.chat(model = "qwen3", messages = [{"role": "user", "content": "late"}])
+
+def test_slow_requests_time_out():
+    FakeAsyncClient.delay = 30
+    service = AnalysisService(concurrency = 1, timeout = 0.05)
+    with pytest.raises(TimeoutError):
+        service.chat(model = "qwen3", messages = [{"role": "user", "content": "slow"}])
+    service.close()
@@ -0,0 +1,92 @@
+import socket
+import threading
+
+import pytest
+
+from benchmarks.stub_ollama import StubOllama
+from scripts.backendPool import BackendPool, parseBackends, ollamaHosts
+
+MESSAGES = [{"role": "user", "content": "SUBJECT: Request for Room Usage"}]
+
+@pytest.fixture
+def stubs():
+    stubs = [StubOllama(latency = 0.1).start() for _ in range(2)]
+    yield stubs
+    for stub in stubs:
+        stub.stop()
+
+# HELPER: address where no Ollama server is listening
+def deadHost():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+# HELPER: send `count` chats at the same time through the pool
+def chatAtOnce(pool, count):
+    errors = []
+    def send():
+        try:
+            pool.chat(model = "qwen3", messages = MESSAGES)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target = send) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+def test_requests_are_spread_over_the_backends(stubs):
+    pool = BackendPool([(stub.host, 1) for stub in stubs], health_interval = 3600)
+    try:
+        assert pool.concurrency == 2
+        assert chatAtOnce(pool, 6) == []
+        assert sum(stub.requests for stub in stubs) == 6
+        assert min(stub.requests for stub in stubs) >= 2
+        assert [backend["outstanding"] for backend in pool.status()] == [0, 0]
+    finally:
+        pool.close()
+
+def test_an_unreachable_backend_is_skipped(stubs):
+    dead = deadHost()
+    pool = BackendPool([(dead, 4), (stubs[0].host, 1)], health_interval = 3600, health_timeout = 1)
+    try:
+        assert [backend["healthy"] for backend in pool.status()] == [False, True]
+        assert chatAtOnce(pool, 3) == []
+        assert stubs[0].requests == 3
+    finally:
+        pool.close()
+
+def test_requests_fail_over_when_a_backend_goes_down(stubs):
+    dead = deadHost()
+    pool = BackendPool([(dead, 4), (stubs[0].host, 1)], health_interval = 3600, health_timeout = 1)
+    try:
+        for backend in pool.backends:
+            backend.healthy = True # went down after its last health check
+        assert chatAtOnce(pool, 1) == []
+        assert stubs[0].requests == 1
+        assert [backend["healthy"] for backend in pool.status()] == [False, True]
+    finally:
+        pool.close()
+
+def test_an_error_is_raised_when_every_backend_is_down():
+    pool = BackendPool([(deadHost(), 1), (deadHost(), 1)], health_interval = 3600, health_timeout = 1)
+    try:
+        errors = chatAtOnce(pool, 1)
+        assert len(errors) == 1
+        assert isinstance(errors[0], ConnectionError)
+    finally:
+        pool.close()
+
+def test_backends_are_read_from_the_setting():
+    assert parseBackends(["http://a:11434", {"host": "http://b:11434", "concurrency": 4}], default_concurrency = 2) == [
+        ("http://a:11434", 2), ("http://b:11434", 4)
+    ]
+    assert parseBackends(None) == []
+    with pytest.raises(ValueError):
+        BackendPool([])
+
+def test_the_ollama_servers_are_the_backends_or_the_single_host():
+    assert ollamaHosts({"ollama_backends": ["http://a:11434", {"host": "http://b:11434"}], "ollama_host": "http://c:11434"}) == ["http://a:11434", "http://b:11434"]
+    assert ollamaHosts({"ollama_host": "http://c:11434"}) == ["http://c:11434"]
+    assert ollamaHosts({}) == [None] # the default server
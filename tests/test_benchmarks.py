@@ -0,0 +1,66 @@
+import os
+import json
+
+import ollama
+import pypdfium2
+import pytest
+
+from benchmarks.common import percentile, summarize
+from benchmarks.corpus import generateCorpus, TEMPLATES
+from benchmarks.stub_ollama import StubOllama
+from scripts.aiFunctions import Classification, Document, CLASSIFY_PROMPT
+
+# HELPER: page count and text of the first page of a PDF
+def readPdf(path):
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        textpage = pdf[0].get_textpage()
+        return len(pdf), textpage.get_text_range()
+    finally:
+        pdf.close()
+
+@pytest.fixture
+def stub():
+    stub = StubOllama(latency = 0).start()
+    yield stub
+    stub.stop()
+
+def test_the_corpus_has_every_type_as_text_and_as_scan(tmp_path):
+    manifest = generateCorpus(str(tmp_path), per_type = 1, page_counts = (1, 2))
+
+    assert len(manifest) == len(TEMPLATES) * 2 * 2
+    with open(tmp_path / "manifest.json", encoding = "utf-8") as f:
+        assert json.load(f) == manifest
+    for filename, entry in manifest.items():
+        pages, text = readPdf(str(tmp_path / filename))
+        assert pages == entry["pages"]
+        assert ("SUBJECT:" in text) == entry["text_layer"]
+
+def test_the_stub_answers_in_the_requested_schema(stub):
+    client = ollama.Client(host = stub.host)
+    prompt = CLASSIFY_PROMPT.format(doc = "12 March 2021\nSUBJECT: Purchase Order for Laboratory Supplies")
+
+    response = client.chat(model = "qwen3", messages = [{"role": "user", "content": prompt}], format = Classification.model_json_schema())
+    classification = Classification.model_validate_json(response.message.content)
+    assert (classification.type, classification.year_processed, classification.funding) == ("FIN", "2021", None)
+
+    response = client.chat(model = "qwen3", messages = [{"role": "user", "content": "SUBJECT: Terminal Report of the Research Project"}], format = Document.model_json_schema())
+    document = Document.model_validate_json(response.message.content)
+    assert document.classification.type == "CRE"
+    assert document.metadata is not None
+
+    assert [model.model for model in client.list().models] == ["qwen3:latest"]
+    assert stub.requests == 2
+
+def test_stub_embeddings_are_unit_vectors_and_repeatable(stub):
+    client = ollama.Client(host = stub.host)
+    first = client.embed(model = "nomic-embed-text", input = "memo").embeddings[0]
+    assert client.embed(model = "nomic-embed-text", input = "memo").embeddings[0] == first
+    assert abs(sum(value * value for value in first) - 1) < 1e-6
+
+def test_percentiles_use_the_nearest_rank():
+    samples = [float(value) for value in range(1, 21)]
+    assert percentile(samples, 0.5) == 10
+    assert percentile(samples, 0.95) == 19
+    assert percentile([], 0.5) is None
+    assert summarize([2.0, 4.0]) == {"count": 2, "mean": 3.0, "p50": 2.0, "p95": 4.0}
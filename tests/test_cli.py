@@ -0,0 +1,150 @@
+import io
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import cli
+from scripts.aiFunctions import Document, Classification
+
+# HELPER: a job as the pipeline hands it to on_done / on_error
+def finishedJob(filepath, type = "cre"):
+    return SimpleNamespace(
+        filepath = filepath,
+        source = SimpleNamespace(name = "office"),
+        started = time.time(),
+        destination = f"/filed/{filepath}",
+        routes = ["text-layer", "docling", "docling"],
+        timing = {"stages": {"parse": 0.5, "analyze": 2.0, "commit": 0.01}},
+        attempts = 0,
+        quarantined = None,
+        document = Document(classification = Classification(subject = "Study", author = "Doe", type = type, year_processed = "2024"))
+    )
+
+def test_results_are_written_as_one_json_object_per_line():
+    stream = io.StringIO()
+    results = cli.ResultWriter(stream)
+    results.on_done(finishedJob("a.pdf"))
+    results.on_error(finishedJob("b.pdf"), ValueError("unreadable PDF"))
+    quarantined = finishedJob("c.pdf")
+    quarantined.quarantined = "/filed/Quarantine/c.pdf"
+    results.on_error(quarantined, ValueError("broken xref table"))
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["status"] for line in lines] == ["ok", "error", "quarantined"]
+    assert lines[0]["type"] == "CRE"
+    assert lines[0]["destination"] == "/filed/a.pdf"
+    assert lines[0]["route"] == "text-layer,docling"
+    assert [line["source"] for line in lines] == ["office", "office", "office"]
+    assert lines[0]["stages"] == {"parse": 0.5, "analyze": 2.0, "commit": 0.01}
+    assert lines[1]["error"] == "ValueError: unreadable PDF"
+    assert lines[2]["quarantined_as"] == "/filed/Quarantine/c.pdf"
+    assert (results.processed, results.failed, results.quarantined) == (1, 2, 1)
+    assert results.errors == {"ValueError": 2}
+
+def test_results_of_concurrent_workers_are_all_counted():
+    results = cli.ResultWriter(io.StringIO())
+    def commitWorker():
+        for i in range(50):
+            results.on_done(finishedJob(f"{i}.pdf"))
+    workers = [threading.Thread(target = commitWorker) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert results.processed == 400
+
+def test_stdout_is_restored_after_a_run(monkeypatch):
+    stdout = sys.stdout
+    def process(args, results):
+        assert sys.stdout is sys.stderr # only the JSONL results go to stdout
+        raise KeyboardInterrupt
+    monkeypatch.setattr(cli, "process", process)
+
+    with pytest.raises(KeyboardInterrupt):
+        cli.run(None)
+    assert sys.stdout is stdout
+
+def test_console_log_strips_the_html_of_the_gui_terminal(capsys):
+    cli.ConsoleLog().append_to_terminal("<b>Processing <i>a</i>.</b>")
+    cli.ConsoleLog(quiet = True).append_to_terminal("<b>hidden</b>")
+
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert captured.err.endswith("] Processing a.\n")
+
+def test_command_line_options_override_the_config(monkeypatch):
+    monkeypatch.setattr(cli, "loadConfig", lambda: {"parse_workers": 1, "cache_enabled": True})
+    args = cli.argparse.Namespace(workers = 3, parse_processes = 2, ollama_concurrency = 4, order = "sjf", no_cache = True, metrics_port = 9464, metrics_file = None, shared_queue = True)
+
+    config = cli.build_config(args)
+    assert config["parse_workers"] == config["analyze_workers"] == config["commit_workers"] == 3
+    assert config["parse_processes"] == 2
+    assert config["ollama_concurrency"] == 4
+    assert config["queue_order"] == "sjf"
+    assert config["cache_enabled"] is False
+    assert config["metrics_port"] == 9464
+    assert "metrics_file" not in config
+    assert config["shared_queue_enabled"] is True
+
+    args = cli.argparse.Namespace(workers = None, parse_processes = None, ollama_concurrency = None, order = None, no_cache = False, metrics_port = None, metrics_file = None, shared_queue = False)
+    assert cli.build_config(args) == {"parse_workers": 1, "cache_enabled": True}
+
+def test_importing_the_cli_does_not_load_the_processing_modules():
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, scripts.cli; print(sorted(m for m in ('docling', 'scripts.pipeline', 'scripts.aiFunctions', 'numpy') if m in sys.modules))"],
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output = True, text = True, check = True
+    )
+    assert loaded.stdout.strip() == "[]"
+
+def test_the_filed_documents_are_indexed_and_searched(tmp_path, capsys):
+    folder = tmp_path / "ADM"
+    folder.mkdir()
+    (folder / "Finance Office - Budget Review - 2023.json").write_text(json.dumps(
+        {"classification": {"type": "ADM", "author": "Finance Office", "subject": "Budget Review", "year_processed": "2023"}}
+    ), encoding = "utf-8")
+    (folder / "Finance Office - Budget Review - 2023.pdf").write_bytes(b"%PDF-1.4")
+
+    assert cli.main(["search", str(tmp_path), "budget"]) == 1 # no index yet
+    assert cli.main(["build-index", str(tmp_path)]) == 0
+    capsys.readouterr()
+
+    assert cli.main(["search", str(tmp_path), "budget"]) == 0
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result["subject"] for result in results] == ["Budget Review"]
+
+def test_the_pipeline_is_closed_when_the_batch_wait_is_interrupted(monkeypatch, tmp_path):
+    pytest.importorskip("docling")
+    from scripts import pipeline as pipeline_module
+    from scripts import documentParser
+
+    calls = []
+    class FakePipeline:
+        parser_pool = None
+        leases = {}
+        halted = None
+        def start(self):
+            calls.append("start")
+        def stop(self):
+            calls.append("stop")
+        def close(self):
+            calls.append("close")
+        def join(self):
+            calls.append("join")
+
+    def interrupted(self):
+        raise KeyboardInterrupt # Ctrl+C while a file is still being written
+    monkeypatch.setattr(cli, "loadConfig", lambda: {})
+    monkeypatch.setattr(pipeline_module, "createPipeline", lambda *args, **kwargs: FakePipeline())
+    monkeypatch.setattr(pipeline_module, "memoryReport", lambda parser_pool: {})
+    monkeypatch.setattr(documentParser, "shutdownConverter", lambda: None)
+    monkeypatch.setattr(cli.MyEventHandler, "has_pending", interrupted)
+    (tmp_path / "in").mkdir()
+
+    assert cli.main(["batch", str(tmp_path / "in"), str(tmp_path / "out"), "--quiet"]) == 0
+    assert calls == ["stop", "close", "join"]
@@ -0,0 +1,81 @@
+import os
+import json
+
+from scripts.documentIndex import DocumentIndex, parseQuery
+
+MEMO = {"classification": {"type": "ADM", "author": "Finance Office", "subject": "Budget Review", "year_processed": "2023"}}
+PAPER = {
+    "classification": {"type": "CRE", "author": "Dela Cruz JC", "subject": "Durian Yield Study", "year_processed": "2024", "funding": "INT"},
+    "metadata": {"title": "Yield of Durian Farms in Davao", "authors": ["Juan Dela Cruz"], "keywords": ["durian", "agriculture"], "abstract": "A study of the budget of farms."},
+}
+
+# HELPER: file a document as the commit stage does, returns (pdf path, json path)
+def fileDocument(root, doc_type, name, document):
+    folder = os.path.join(root, doc_type)
+    os.makedirs(folder, exist_ok = True)
+    json_path = os.path.join(folder, f"{name}.json")
+    pdf_path = os.path.join(folder, f"[FOR REVIEW] {name}.pdf")
+    with open(json_path, "w", encoding = "utf-8") as f:
+        json.dump(document, f)
+    open(pdf_path, "wb").close()
+    return pdf_path, json_path
+
+def test_queries_become_prefix_terms_phrases_and_filters():
+    assert parseQuery('durian "yield study" type:cre year:2024') == ('"durian"* "yield study"', {"type": "CRE", "year": "2024"})
+    assert parseQuery("NOT -") == ('"NOT"* "-"*', {})
+
+def test_documents_are_found_by_their_fields_best_match_first(tmp_path):
+    root = str(tmp_path)
+    index = DocumentIndex(root)
+    index.upsert(MEMO, *reversed(fileDocument(root, "ADM", "memo", MEMO)))
+    index.upsert(PAPER, *reversed(fileDocument(root, "CRE", "paper", PAPER)))
+
+    results = index.search("budget")
+    assert [result["subject"] for result in results] == ["Budget Review", "Durian Yield Study"] # subject weighs more than abstract
+    assert results[0]["pdf_path"] == os.path.join(root, "ADM", "[FOR REVIEW] memo.pdf")
+
+    assert [result["type"] for result in index.search("dur")] == ["CRE"] # prefix match
+    assert index.search("budget type:cre")[0]["title"] == "Yield of Durian Farms in Davao"
+    assert [result["type"] for result in index.search("year:2023")] == ["ADM"]
+    assert index.search("") == []
+    index.close()
+
+def test_an_updated_or_removed_document_is_searched_as_it_is_now(tmp_path):
+    root = str(tmp_path)
+    index = DocumentIndex(root)
+    pdf_path, json_path = fileDocument(root, "ADM", "memo", MEMO)
+    index.upsert(MEMO, json_path, pdf_path)
+    index.upsert({"classification": dict(MEMO["classification"], subject = "Travel Request")}, json_path, pdf_path)
+
+    assert len(index) == 1
+    assert index.search("budget") == []
+    assert len(index.search("travel")) == 1
+
+    index.remove(json_path)
+    assert index.search("travel") == []
+    index.close()
+
+def test_rebuild_indexes_the_sidecars_filed_before(tmp_path):
+    root = str(tmp_path)
+    fileDocument(root, "ADM", "memo", MEMO)
+    fileDocument(root, "CRE", "paper", PAPER)
+    open(os.path.join(root, "ADM", "reserved.json"), "w").close() # reserved by a commit in progress
+
+    index = DocumentIndex(root)
+    assert not index.is_built() # the filed documents are not in it yet
+    assert index.rebuild(log = lambda text: None) == 2
+    assert index.is_built()
+
+    # the PDF was reviewed and renamed since, it is still found
+    os.rename(os.path.join(root, "CRE", "[FOR REVIEW] paper.pdf"), os.path.join(root, "CRE", "paper.pdf"))
+    assert index.search("durian")[0]["pdf_path"] == os.path.join(root, "CRE", "paper.pdf")
+
+    os.remove(os.path.join(root, "ADM", "memo.json"))
+    assert index.rebuild(log = lambda text: None) == 1
+    assert index.search("budget type:adm") == []
+    index.close()
+
+def test_a_new_index_of_an_empty_destination_is_complete(tmp_path):
+    index = DocumentIndex(str(tmp_path))
+    assert index.is_built()
+    index.close()
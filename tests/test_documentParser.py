@@ -0,0 +1,175 @@
+import threading
+
+import pytest
+
+pytest.importorskip("docling")
+
+from scripts import documentParser
+from scripts.documentParser import parseDocument, warmUpConverter, shutdownConverter, ConverterUnavailable
+from scripts.workerPool import PoolStopped
+
+# stands in for a Docling converter, counts how many were built and how many convert at once
+class FakeConverter:
+    created = 0
+    active = 0
+    most_active = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        with FakeConverter.lock:
+            FakeConverter.created += 1
+        self.busy = threading.Event()
+
+    def convert(self, filename, page_range = None):
+        with FakeConverter.lock:
+            FakeConverter.active += 1
+            FakeConverter.most_active = max(FakeConverter.most_active, FakeConverter.active)
+        self.busy.wait(0.05)
+        with FakeConverter.lock:
+            FakeConverter.active -= 1
+        document = type("Document", (), {"export_to_markdown": lambda self: f"# {filename}"})()
+        return type("Result", (), {"document": document})()
+
+@pytest.fixture(autouse = True)
+def fakeConverters(monkeypatch):
+    FakeConverter.created = FakeConverter.active = FakeConverter.most_active = 0
+    monkeypatch.setattr(documentParser, "_createConverter", FakeConverter)
+    monkeypatch.setattr(documentParser, "_pool_size", 1)
+    shutdownConverter()
+    yield
+    shutdownConverter()
+
+def test_the_converter_is_built_once_and_reused():
+    assert parseDocument("a.pdf") == "# a.pdf"
+    assert parseDocument("b.pdf") == "# b.pdf"
+    assert FakeConverter.created == 1
+
+def test_threads_share_at_most_pool_size_converters():
+    warmUpConverter(2).join()
+    assert FakeConverter.created == 2
+
+    results = []
+    threads = [threading.Thread(target = lambda i = i: results.append(parseDocument(f"{i}.pdf"))) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == sorted(f"# {i}.pdf" for i in range(8))
+    assert FakeConverter.created == 2
+    assert FakeConverter.most_active == 2
+
+def test_shutdown_drops_the_converters():
+    parseDocument("a.pdf")
+    shutdownConverter()
+    parseDocument("b.pdf")
+    assert FakeConverter.created == 2 # a fresh one after the shutdown
+
+def test_a_converter_that_cannot_be_built_is_reported_as_unavailable(monkeypatch):
+    def createConverter():
+        raise OSError("layout model could not be downloaded")
+    monkeypatch.setattr(documentParser, "_createConverter", createConverter)
+
+    with pytest.raises(ConverterUnavailable):
+        parseDocument("a.pdf")
+    monkeypatch.setattr(documentParser, "_createConverter", FakeConverter)
+    assert parseDocument("a.pdf") == "# a.pdf" # built again once the problem is fixed
+
+# stands in for the process pool, runs the task in this process and remembers it
+class FakeProcessPool:
+    def __init__(self):
+        self.tasks = []
+        self.stopped = False
+
+    def call(self, function, *args):
+        if self.stopped:
+            raise PoolStopped("parser processes are stopped")
+        self.tasks.append((function.__name__, args))
+        return "# parsed in a process"
+
+    def shutdown(self):
+        self.stopped = True
+
+def test_documents_go_to_the_parser_processes_they_are_given(monkeypatch):
+    pool = FakeProcessPool()
+    monkeypatch.setattr(documentParser, "_process_pool", pool)
+
+    assert parseDocument("a.pdf", pool = pool) == "# parsed in a process"
+    assert pool.tasks == [("_parseInWorker", ("a.pdf", documentParser.PAGE_RANGE))]
+    assert FakeConverter.created == 0 # no converter in this process
+
+    shutdownConverter()
+    assert pool.stopped
+    assert documentParser._process_pool is None
+
+def test_a_stopped_pool_never_falls_back_to_docling_in_this_process():
+    pool = FakeProcessPool()
+    pool.shutdown()
+    with pytest.raises(PoolStopped):
+        parseDocument("a.pdf", pool = pool)
+    assert FakeConverter.created == 0
+
+# HELPER: write a PDF with one page per entry of `pages`, each a list of text lines drawn in Helvetica
+def writePdf(path, pages, scanned = False):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    resources = "<< /Font << /F1 3 0 R >> >>"
+    scan = ""
+    if scanned: # a page-sized image under the text, as a scanner with OCR writes it
+        objects.append("<< /Type /XObject /Subtype /Image /Width 1 /Height 1 /ColorSpace /DeviceGray /BitsPerComponent 8 /Length 1 >>\nstream\n\x80\nendstream")
+        resources = "<< /Font << /F1 3 0 R >> /XObject << /Im1 4 0 R >> >>"
+        scan = "q 612 0 0 792 0 0 cm /Im1 Do Q\n"
+
+    kids = []
+    for lines in pages:
+        content = scan + "BT /F1 11 Tf 72 720 Td 14 TL\n" + "".join(f"({line}) Tj T*\n" for line in lines) + "ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources {resources} /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start = 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+MEMO = ["MEMORANDUM", "Subject: Budget review for the third quarter", "From: Finance Office, 12 March 2024"]
+
+def test_born_digital_pages_are_read_from_their_text_layer(tmp_path):
+    path = writePdf(tmp_path / "memo.pdf", [MEMO, ["Page two of the memo lists every line item in the budget."]])
+
+    markdown = documentParser.parseTextLayer(path, (1, 1))
+    assert markdown.splitlines() == MEMO
+    assert "Page two" in documentParser.parseTextLayer(path, (1, 2))
+
+    assert documentParser.parseDocumentWithRoute(path, (1, 1)) == (markdown, documentParser.TEXT_LAYER)
+    assert FakeConverter.created == 0
+
+def test_scanned_pages_go_through_docling_even_with_an_ocr_text_layer(tmp_path):
+    path = writePdf(tmp_path / "scan.pdf", [MEMO], scanned = True)
+
+    assert documentParser.parseTextLayer(path, (1, 1)) is None
+    assert documentParser.parseDocumentWithRoute(path, (1, 1))[1] == documentParser.DOCLING
+
+def test_empty_pages_go_through_docling(tmp_path):
+    empty = writePdf(tmp_path / "empty.pdf", [[]])
+    mixed = writePdf(tmp_path / "mixed.pdf", [MEMO, []])
+
+    for path in (empty, mixed):
+        assert documentParser.parseTextLayer(path, (1, 2)) is None
+        assert documentParser.parseDocumentWithRoute(path, (1, 2)) == (f"# {path}", documentParser.DOCLING)
+
+    # a file pdfium can't open at all is left to Docling too
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4 truncated")
+    assert documentParser.parseTextLayer(str(broken)) is None
+
+    # without the fast path every document goes through Docling
+    born_digital = writePdf(tmp_path / "memo.pdf", [MEMO])
+    assert documentParser.parseDocumentWithRoute(born_digital, (1, 1), fastPath = False)[1] == documentParser.DOCLING
@@ -0,0 +1,145 @@
+import time
+from types import SimpleNamespace
+
+from eventHandler import MyEventHandler
+from scripts.jobQueue import JobQueue
+
+# stands in for the main window, keeps the terminal messages
+class FakeWindow:
+    def __init__(self):
+        self.messages = []
+
+    def append_to_terminal(self, text):
+        self.messages.append(text)
+
+# HELPER: handler on tmp_path whose pending files are checked by the test instead of a thread
+def makeHandler(tmp_path, quiet_period = 0.05, max_wait = 60):
+    window = FakeWindow()
+    job_queue = JobQueue()
+    handler = MyEventHandler(str(tmp_path), window, job_queue, quiet_period = quiet_period, max_wait = max_wait)
+    return handler, job_queue, window
+
+# HELPER: watchdog event for a path
+def event(path, dest_path = None):
+    return SimpleNamespace(src_path = str(path), dest_path = str(dest_path) if dest_path else None, is_directory = False)
+
+def test_a_file_is_queued_once_it_stops_changing(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path)
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4 first part")
+    handler.on_created(event(path))
+
+    handler.check_pending() # first look at the file
+    assert len(job_queue) == 0
+
+    with open(path, "ab") as f:
+        f.write(b" second part") # still being copied
+    time.sleep(0.06)
+    handler.check_pending()
+    assert len(job_queue) == 0 and handler.has_pending()
+
+    time.sleep(0.06)
+    handler.check_pending()
+    assert job_queue.snapshot() == [str(path)]
+    assert not handler.has_pending()
+    assert window.messages == ["New file detected: <i>scan</i>. Added to queue."]
+
+def test_a_closed_file_is_queued_without_waiting(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 60)
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    handler.on_created(event(path))
+    handler.on_closed(event(path))
+
+    handler.check_pending()
+    assert job_queue.snapshot() == [str(path)]
+
+def test_a_burst_of_events_is_coalesced_into_one_job_and_one_message(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 0)
+    paths = [tmp_path / f"scan{i}.pdf" for i in range(5)]
+    for path in paths:
+        path.write_bytes(b"%PDF-1.4")
+        handler.on_created(event(path))
+        for _ in range(10):
+            handler.on_modified(event(path))
+        handler.on_closed(event(path))
+    (tmp_path / "notes.txt").write_text("not a PDF")
+    handler.on_created(event(tmp_path / "notes.txt"))
+
+    handler.check_pending()
+    handler.check_pending()
+    assert sorted(job_queue.snapshot()) == sorted(str(path) for path in paths)
+    assert window.messages == ["5 new files detected and added to queue."]
+
+def test_empty_files_are_not_queued_nor_waited_for(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 0, max_wait = 0.2)
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"")
+    handler.on_created(event(path))
+
+    handler.check_pending()
+    handler.check_pending()
+    assert len(job_queue) == 0
+    assert not handler.has_pending() # a batch run does not wait for it
+    assert handler.stalled() == [str(path)]
+
+    time.sleep(0.2)
+    handler.check_pending()
+    assert len(job_queue) == 0
+    assert handler.stalled() == []
+    assert window.messages == ["<b><i>scan.pdf</i> is still empty after 0 seconds, it was not queued.</b>"]
+
+def test_a_file_that_never_stops_changing_is_queued_after_max_wait(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 60, max_wait = 0.2)
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    handler.on_created(event(path))
+    handler.check_pending()
+
+    time.sleep(0.2)
+    with open(path, "ab") as f:
+        f.write(b" more")
+    handler.check_pending()
+    assert job_queue.snapshot() == [str(path)]
+
+def test_a_locked_file_waits_without_holding_up_a_batch(tmp_path, monkeypatch):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 0, max_wait = 0.2)
+    monkeypatch.setattr(handler, "can_open", lambda filepath: False) # still open in the scanner software
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    handler.on_created(event(path))
+
+    handler.check_pending()
+    handler.check_pending()
+    assert len(job_queue) == 0
+    assert not handler.has_pending() and handler.stalled() == [str(path)]
+
+    time.sleep(0.2)
+    handler.check_pending()
+    assert job_queue.snapshot() == [str(path)] # the pipeline retries it while it is locked
+
+def test_deleted_and_renamed_files_are_followed(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 0)
+    deleted, renamed = tmp_path / "deleted.pdf", tmp_path / "scan0001.pdf"
+    for path in (deleted, renamed):
+        path.write_bytes(b"%PDF-1.4")
+        handler.on_created(event(path))
+
+    deleted.unlink()
+    handler.on_deleted(event(deleted))
+    renamed.rename(tmp_path / "invoice.pdf")
+    handler.on_moved(event(renamed, tmp_path / "invoice.pdf"))
+
+    handler.check_pending()
+    handler.check_pending()
+    assert job_queue.snapshot() == [str(tmp_path / "invoice.pdf")]
+
+def test_scan_picks_up_the_pdfs_already_in_the_folder(tmp_path):
+    handler, job_queue, window = makeHandler(tmp_path, quiet_period = 0)
+    for name in ("a.pdf", "b.PDF", "c.docx"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+
+    assert handler.scan() == 2
+    handler.check_pending()
+    handler.check_pending()
+    assert len(job_queue) == 2
@@ -0,0 +1,94 @@
+import os
+import json
+import errno
+import threading
+
+import pytest
+
+from scripts.fileFunctions import quarantineDocument, reserveDestination, moveFile, QUARANTINE_FOLDER
+
+# HELPER: a file with the given contents
+def writeFile(path, contents = b"%PDF-1.4"):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, "wb") as f:
+        f.write(contents)
+    return path
+
+def test_quarantine_moves_the_document_next_to_its_error_sidecar(tmp_path):
+    pdf = writeFile(str(tmp_path / "source" / "scan.pdf"))
+    destination = str(tmp_path / "destination")
+
+    quarantined = quarantineDocument(pdf, destination, {"stage": "parse", "error": "broken xref table"})
+
+    assert quarantined == os.path.join(destination, QUARANTINE_FOLDER, "scan.pdf")
+    assert os.path.exists(quarantined) and not os.path.exists(pdf)
+    with open(os.path.join(destination, QUARANTINE_FOLDER, "scan.error.json"), encoding = "utf-8") as f:
+        details = json.load(f)
+    assert details == {"stage": "parse", "error": "broken xref table", "quarantined_as": quarantined}
+
+def test_quarantine_numbers_documents_with_the_same_name(tmp_path):
+    destination = str(tmp_path / "destination")
+    first = quarantineDocument(writeFile(str(tmp_path / "a" / "scan.pdf")), destination, {})
+    second = quarantineDocument(writeFile(str(tmp_path / "b" / "scan.pdf")), destination, {})
+
+    assert os.path.basename(first) == "scan.pdf"
+    assert os.path.basename(second) == "scan (2).pdf"
+    assert os.path.exists(os.path.join(destination, QUARANTINE_FOLDER, "scan (2).error.json"))
+
+def test_reserve_destination_numbers_names_that_are_taken(tmp_path):
+    folder = str(tmp_path / "ADM")
+    first = reserveDestination(folder, "Dela Cruz JC - Memo - 2024")
+    assert first == (os.path.join(folder, "[FOR REVIEW] Dela Cruz JC - Memo - 2024.pdf"), os.path.join(folder, "Dela Cruz JC - Memo - 2024.json"))
+    assert os.path.exists(first[1]) # reserved until the commit writes it
+
+    # a document filed earlier and already reviewed (prefix removed) keeps its name too
+    writeFile(os.path.join(folder, "Dela Cruz JC - Memo - 2024 (2).pdf"))
+    second = reserveDestination(folder, "Dela Cruz JC - Memo - 2024")
+    assert second[1] == os.path.join(folder, "Dela Cruz JC - Memo - 2024 (3).json")
+
+def test_reserve_destination_gives_every_thread_its_own_name(tmp_path):
+    folder = str(tmp_path / "FIN")
+    reserved = []
+    def reserve():
+        reserved.append(reserveDestination(folder, "Unknown - Purchase Request - 2024"))
+    threads = [threading.Thread(target = reserve) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(reserved)) == 20
+
+def test_move_file_never_overwrites(tmp_path):
+    source = writeFile(str(tmp_path / "scan.pdf"), b"new")
+    destination = writeFile(str(tmp_path / "filed.pdf"), b"old")
+    with pytest.raises(FileExistsError):
+        moveFile(source, destination)
+    with open(destination, "rb") as f:
+        assert f.read() == b"old"
+    assert os.path.exists(source)
+
+def test_move_file_copies_across_filesystems(tmp_path, monkeypatch):
+    source = writeFile(str(tmp_path / "source" / "scan.pdf"), b"%PDF-1.4 contents")
+    os.utime(source, (1700000000, 1700000000))
+    destination = str(tmp_path / "destination" / "filed.pdf")
+    os.makedirs(os.path.dirname(destination))
+
+    def rename(source, destination):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(os, "rename", rename)
+    moveFile(source, destination)
+
+    assert not os.path.exists(source)
+    with open(destination, "rb") as f:
+        assert f.read() == b"%PDF-1.4 contents"
+    assert os.path.getmtime(destination) == 1700000000
+    assert os.listdir(os.path.dirname(destination)) == ["filed.pdf"] # no temp file left
+
+def test_move_file_raises_other_errors(tmp_path, monkeypatch):
+    source = writeFile(str(tmp_path / "scan.pdf"))
+    def rename(source, destination):
+        raise PermissionError(errno.EACCES, "Permission denied")
+    monkeypatch.setattr(os, "rename", rename)
+    with pytest.raises(PermissionError):
+        moveFile(source, str(tmp_path / "filed.pdf"))
+    assert os.path.exists(source)
@@ -0,0 +1,29 @@
+from scripts.jobJournal import JobJournal, PARSED, ANALYZED, COMMITTING
+
+def test_a_stage_is_recorded_and_updated_in_place(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite"))
+    assert journal.lookup("a.pdf") is None
+
+    journal.record("a.pdf", PARSED, sha256 = "abc", markdown = "# A", pages = 2)
+    journal.record("a.pdf", ANALYZED, sha256 = "abc", document = "{}")
+
+    entry = journal.lookup("a.pdf")
+    assert entry["stage"] == ANALYZED
+    assert (entry["markdown"], entry["pages"], entry["document"]) == ("# A", 2, "{}") # earlier fields are kept
+    journal.close()
+
+def test_entries_survive_a_restart_until_the_file_is_finished(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = JobJournal(path)
+    journal.record("a.pdf", PARSED, sha256 = "abc", markdown = "# A", pages = 1)
+    journal.record("b.pdf", COMMITTING, sha256 = "def", document = "{}", pdf_destination = "/filed/b.pdf", json_destination = "/filed/b.json")
+    journal.close()
+
+    journal = JobJournal(path)
+    assert journal.lookup("a.pdf")["markdown"] == "# A"
+    assert [entry["path"] for entry in journal.interruptedCommits()] == ["b.pdf"]
+
+    journal.finish("b.pdf")
+    assert journal.lookup("b.pdf") is None
+    assert journal.interruptedCommits() == []
+    journal.close()
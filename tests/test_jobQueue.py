@@ -0,0 +1,114 @@
+import os
+
+from scripts.jobQueue import JobQueue, estimateCost
+from scripts.sources import Source, Sources
+
+# HELPER: two sources "a" and "b" with their folders under `root`
+def twoSources(root, weight_a = 1.0, weight_b = 1.0):
+    return Sources([
+        Source("a", os.path.join(root, "a"), os.path.join(root, "filed"), weight_a),
+        Source("b", os.path.join(root, "b"), os.path.join(root, "filed"), weight_b),
+    ])
+
+# HELPER: queue `count` files of `cost` pages in the folder of a source
+def queueFiles(job_queue, root, name, count, cost = 1, start = 0):
+    for i in range(start, start + count):
+        assert job_queue.put(os.path.join(root, name, f"{i}.pdf"), cost = cost)
+
+# HELPER: source folder of each of the next `count` files taken from the queue
+def take(job_queue, count):
+    return [os.path.basename(os.path.dirname(job_queue.get(timeout = 0))) for _ in range(count)]
+
+def test_fifo_keeps_the_arrival_order_and_sjf_takes_small_files_first():
+    for ordering, expected in (("fifo", ["big", "small", "medium"]), ("sjf", ["small", "medium", "big"])):
+        job_queue = JobQueue(ordering)
+        for name, cost in (("big", 40), ("small", 1), ("medium", 5)):
+            job_queue.put(name, cost = cost)
+        assert [job_queue.get(timeout = 0) for _ in range(3)] == expected
+
+def test_removed_files_are_skipped_and_snapshot_is_the_order_of_get():
+    job_queue = JobQueue("sjf")
+    for i, cost in enumerate((4, 1, 7, 2, 9)):
+        job_queue.put(f"{i}.pdf", cost = cost)
+    assert job_queue.remove("3.pdf")
+    assert not job_queue.remove("3.pdf")
+
+    expected = job_queue.snapshot()
+    assert expected == ["1.pdf", "0.pdf", "2.pdf", "4.pdf"]
+    assert [job_queue.get(timeout = 0) for _ in range(len(expected))] == expected
+    assert job_queue.get(timeout = 0) is None
+
+def test_pages_are_shared_according_to_the_weights(tmp_path):
+    root = str(tmp_path)
+    job_queue = JobQueue(sources = twoSources(root, 2.0, 1.0))
+    queueFiles(job_queue, root, "a", 100)
+    queueFiles(job_queue, root, "b", 100)
+
+    taken = take(job_queue, 30)
+    assert taken.count("a") == 20
+    assert taken.count("b") == 10
+
+def test_costs_are_counted_in_pages(tmp_path):
+    root = str(tmp_path)
+    job_queue = JobQueue(sources = twoSources(root))
+    queueFiles(job_queue, root, "a", 10, cost = 10) # a backfill of long reports
+    queueFiles(job_queue, root, "b", 20, cost = 1)  # one-page memos
+
+    taken = take(job_queue, 22)
+    assert taken.count("a") == 2
+    assert taken.count("b") == 20
+
+def test_snapshot_is_the_order_of_get(tmp_path):
+    root = str(tmp_path)
+    job_queue = JobQueue("sjf", sources = twoSources(root, 3.0, 1.0))
+    for i, cost in enumerate((4, 1, 7, 2, 2, 9, 1)):
+        job_queue.put(os.path.join(root, "a", f"{i}.pdf"), cost = cost)
+        job_queue.put(os.path.join(root, "b", f"{i}.pdf"), cost = 8 - cost)
+    job_queue.get(timeout = 0) # the virtual times are no longer equal
+    job_queue.remove(os.path.join(root, "b", "3.pdf"))
+
+    expected = job_queue.snapshot()
+    assert [job_queue.get(timeout = 0) for _ in range(len(expected))] == expected
+    assert len(job_queue) == 0
+
+def test_a_source_that_was_idle_does_not_catch_up(tmp_path):
+    root = str(tmp_path)
+    job_queue = JobQueue(sources = twoSources(root))
+    queueFiles(job_queue, root, "a", 30)
+    assert take(job_queue, 10) == ["a"] * 10
+
+    # "b" starts at the current virtual time instead of getting the 10 files it did not use
+    queueFiles(job_queue, root, "b", 10)
+    taken = take(job_queue, 10)
+    assert taken.count("a") == 5
+    assert taken.count("b") == 5
+
+def test_a_renamed_file_is_queued_once(tmp_path):
+    changes = []
+    job_queue = JobQueue(on_change = lambda action, path: changes.append((action, os.path.basename(path))))
+    old_path, new_path = str(tmp_path / "scan0001.pdf"), str(tmp_path / "invoice.pdf")
+    with open(old_path, "wb") as f:
+        f.write(b"%PDF-1.4 /Type /Pages /Count 3")
+
+    assert job_queue.put(old_path)
+    assert not job_queue.put(old_path) # already queued
+    os.rename(old_path, new_path)
+    assert job_queue.put(new_path)
+
+    assert len(job_queue) == 1
+    assert old_path not in job_queue
+    assert changes == [("added", "scan0001.pdf"), ("removed", "scan0001.pdf"), ("added", "invoice.pdf")]
+    assert job_queue.get(timeout = 0) == new_path
+
+def test_cost_is_the_page_count_of_the_pdf(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n<< /Type /Pages /Kids [3 0 R] /Count 2 >>\n<< /Type /Pages /Count 12 >>")
+    assert estimateCost(path) == 12
+    assert estimateCost(str(tmp_path / "missing.pdf")) == 1
+
+def test_close_wakes_up_the_worker():
+    job_queue = JobQueue()
+    job_queue.close()
+    assert job_queue.get() is None
+    assert not job_queue.put("late.pdf", cost = 1)
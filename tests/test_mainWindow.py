@@ -0,0 +1,147 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("docling")
+
+from PySide6.QtWidgets import QApplication
+
+import mainWindow
+from scripts import documentParser, pipeline as pipeline_module
+
+@pytest.fixture
+def window(monkeypatch):
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(mainWindow, "startWarmUp", lambda config, on_state: None) # no models in the tests
+    monkeypatch.setattr(documentParser, "shutdownConverter", lambda: None)
+    window = mainWindow.MainWindow()
+    yield window
+    window.close()
+    app.processEvents()
+
+# stands in for a pipeline with a file still being processed when Stop is clicked
+class BusyPipeline:
+    def __init__(self):
+        self.stopped = False
+        self.joined = False
+        self.finished = threading.Event()
+        self.pre_classifier = None
+
+    def start(self):
+        pass
+
+    def submit(self, filepath):
+        return True
+
+    def stop(self):
+        self.stopped = True
+
+    def join(self):
+        self.finished.wait(5)
+        self.joined = self.finished.is_set()
+
+# HELPER: let the event loop run until `condition()` holds
+def waitFor(condition, timeout = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        QApplication.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+def test_stop_waits_for_the_pipeline_without_blocking_the_window(window):
+    pipeline = BusyPipeline()
+    window.pipeline = pipeline
+    window.monitoring = True
+
+    started = time.monotonic()
+    window.stop_observer()
+    assert time.monotonic() - started < 1 # returned while the file is still being processed
+    assert pipeline.stopped
+    assert window.buttonRun.text() == "Stopping..."
+    assert not window.buttonRun.isEnabled()
+
+    pipeline.finished.set()
+    assert waitFor(window.buttonRun.isEnabled)
+    assert window.buttonRun.text() == "Run"
+    assert window.pipeline is None
+    assert window.readiness_label.text() == "Stopped"
+
+@pytest.fixture
+def folders(monkeypatch, tmp_path):
+    (tmp_path / "source").mkdir()
+    config = {"source_path": str(tmp_path / "source"), "destination_path": str(tmp_path / "filed")}
+    monkeypatch.setattr(mainWindow, "loadConfig", lambda: dict(config))
+
+def test_the_pipeline_is_built_without_blocking_the_window(window, folders, monkeypatch):
+    built = threading.Event()
+    pipeline = BusyPipeline()
+    def createPipeline(config, sources, **kwargs):
+        built.wait(5) # importing Docling, checking the Ollama servers, ...
+        return pipeline
+    monkeypatch.setattr(pipeline_module, "createPipeline", createPipeline)
+
+    started = time.monotonic()
+    window.start_observer()
+    assert time.monotonic() - started < 1
+    assert window.buttonRun.text() == "Stop"
+    assert not window.buttonRun.isEnabled() # until the pipeline runs
+
+    built.set()
+    assert waitFor(window.buttonRun.isEnabled)
+    assert window.pipeline is pipeline
+
+    window.stop_observer()
+    pipeline.finished.set()
+    assert waitFor(lambda: window.buttonRun.text() == "Run" and window.buttonRun.isEnabled())
+    assert pipeline.stopped
+
+def test_monitoring_stops_when_the_pipeline_cannot_be_built(window, folders, monkeypatch):
+    def createPipeline(config, sources, **kwargs):
+        raise RuntimeError("no Ollama server could be reached")
+    monkeypatch.setattr(pipeline_module, "createPipeline", createPipeline)
+
+    window.start_observer()
+    assert waitFor(lambda: window.buttonRun.text() == "Run" and window.buttonRun.isEnabled())
+    assert not window.monitoring
+    assert window.pipeline is None
+
+# stands in for the pre-classifier, remembers whether its index was saved
+class UnsavedIndex:
+    def __init__(self):
+        self.saved = False
+
+    def save(self):
+        self.saved = True
+
+# stands in for a search index opened by the search box
+class OpenSearchIndex:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_closing_the_window_waits_for_the_pipeline(window):
+    pipeline = BusyPipeline()
+    pipeline.finished.set()
+    window.pipeline = pipeline
+    window.monitoring = True
+
+    window.search_indexes["/filed"] = index = OpenSearchIndex()
+
+    window.close()
+    assert pipeline.stopped and pipeline.joined
+    assert index.closed and window.search_indexes == {} # opened again on the next search
+
+def test_the_embedding_index_is_saved_when_closing_does_not_wait_any_longer(window, monkeypatch):
+    monkeypatch.setattr(mainWindow, "CLOSE_TIMEOUT", 0.1)
+    pipeline = BusyPipeline()
+    pipeline.pre_classifier = UnsavedIndex()
+    window.pipeline = pipeline
+    window.monitoring = True
+
+    window.close()
+    assert not pipeline.joined # a file is still being processed
+    assert pipeline.pre_classifier.saved
+    pipeline.finished.set()
@@ -0,0 +1,89 @@
+import urllib.request
+from types import SimpleNamespace
+
+from scripts import metrics
+from scripts.metrics import Registry
+
+def test_counters_and_gauges_are_kept_per_label():
+    registry = Registry()
+    documents = registry.counter("docs_total", "Documents.")
+    documents.inc(type = "ADM")
+    documents.inc(2, type = "ADM")
+    documents.inc(type = "CRE")
+    depth = registry.gauge("depth", "Queue depth.")
+    depth.set(3, stage = "parse")
+    depth.set_function(lambda: 7, stage = "analyze")
+    depth.set_function(lambda: 1 / 0, stage = "commit") # a failing function is left out
+
+    assert registry.counter("docs_total", "Documents.") is documents
+    assert registry.render().splitlines() == [
+        "# HELP docs_total Documents.",
+        "# TYPE docs_total counter",
+        'docs_total{type="ADM"} 3',
+        'docs_total{type="CRE"} 1',
+        "# HELP depth Queue depth.",
+        "# TYPE depth gauge",
+        'depth{stage="analyze"} 7',
+        'depth{stage="parse"} 3',
+    ]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Registry().histogram("latency", "Latency.", buckets = (0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, step = "docling")
+
+    assert histogram.render() == [
+        'latency_bucket{step="docling",le="0.1"} 1',
+        'latency_bucket{step="docling",le="1.0"} 3',
+        'latency_bucket{step="docling",le="+Inf"} 4',
+        'latency_count{step="docling"} 4',
+        'latency_sum{step="docling"} 6.05',
+    ]
+
+def test_label_values_are_escaped():
+    counter = Registry().counter("errors", "Errors.")
+    counter.inc(message = 'bad "quote"\nnext line')
+    assert counter.render() == ['errors{message="bad \\"quote\\"\\nnext line"} 1']
+
+def test_steps_and_ollama_calls_go_to_the_timing_of_the_current_document():
+    timing = metrics.newTiming()
+    metrics.activate(timing)
+    try:
+        with metrics.timed("docling"):
+            pass
+        response = SimpleNamespace(prompt_eval_count = 120, eval_count = 30, load_duration = None, prompt_eval_duration = 2e9, eval_duration = 5e8)
+        metrics.observeOllama("classify", response, 2.6)
+    finally:
+        metrics.deactivate()
+    with metrics.timed("docling"): # outside a document, only the histogram sees it
+        pass
+
+    assert set(timing["steps"]) == {"docling", "classify"}
+    assert timing["ollama"] == [{
+        "call": "classify", "seconds": 2.6, "prompt_tokens": 120, "eval_tokens": 30,
+        "prompt_eval_seconds": 2.0, "eval_seconds": 0.5
+    }]
+    assert metrics.currentTiming() is None
+
+def test_metrics_are_served_over_http_and_written_to_a_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    monkeypatch.setattr(metrics, "_file_thread", None)
+    monkeypatch.setattr(metrics, "_file_path", None)
+    metrics.DOCUMENTS.inc(type = "TEST")
+
+    path = str(tmp_path / "smartscanner.prom")
+    metrics.startExport(port = 0, path = path, interval = 3600) # port 0 disables the server
+    assert metrics._server is None
+    metrics.flushExport()
+    with open(path, encoding = "utf-8") as f:
+        assert 'smartscanner_documents_total{type="TEST"}' in f.read()
+
+    metrics._server = metrics.ThreadingHTTPServer(("127.0.0.1", 0), metrics.MetricsHandler)
+    metrics.threading.Thread(target = metrics._server.serve_forever, daemon = True).start()
+    try:
+        url = f"http://127.0.0.1:{metrics._server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert 'smartscanner_documents_total{type="TEST"}' in response.read().decode("utf-8")
+    finally:
+        metrics._server.shutdown()
+        metrics._server.server_close()
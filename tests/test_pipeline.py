@@ -0,0 +1,403 @@
+import os
+import json
+import threading
+
+import ollama
+import pytest
+
+pytest.importorskip("docling")
+
+from scripts.pipeline import Pipeline, Job
+from scripts.sources import Source, DEFAULT_SOURCE
+from scripts.fileFunctions import QUARANTINE_FOLDER
+from scripts.sharedQueue import SharedQueue
+from scripts.workerPool import PoolStopped
+from scripts.aiFunctions import Document, Classification
+
+# pipeline whose stages only record what they did, `fail` are the files whose parsing fails
+class RecordingPipeline(Pipeline):
+    def __init__(self, destination_root, fail = (), **kwargs):
+        self.steps = []
+        self.steps_lock = threading.Lock()
+        self.fail = set(fail)
+        super().__init__(destination_root, log = lambda text: None, **kwargs)
+
+    def record(self, stage, job):
+        with self.steps_lock:
+            self.steps.append((stage, job.filepath))
+
+    def parse(self, job):
+        self.record("parse", job)
+        if job.filepath in self.fail:
+            raise ValueError("unreadable PDF")
+        job.markdown = f"# {job.filepath}"
+
+    def analyze(self, job):
+        self.record("analyze", job)
+        job.document = Document(classification = Classification(subject = job.markdown, author = "Unknown", type = "ADM", year_processed = "2024"))
+
+    def commit(self, job):
+        self.record("commit", job)
+
+# HELPER: submit the files, wait until the pipeline is done, returns (done, failed) file paths
+def runPipeline(pipeline, files):
+    done, failed = [], []
+    pipeline.on_done = lambda job: done.append(job.filepath)
+    pipeline.on_error = lambda job, error: failed.append(job.filepath)
+    pipeline.start()
+    for filepath in files:
+        assert pipeline.submit(filepath)
+    pipeline.close()
+    pipeline.join()
+    return done, failed
+
+def test_every_file_goes_through_the_three_stages_in_order(tmp_path):
+    files = [str(tmp_path / f"missing-{i}.pdf") for i in range(10)]
+    pipeline = RecordingPipeline(str(tmp_path), parse_workers = 2, analyze_workers = 2)
+    done, failed = runPipeline(pipeline, files)
+
+    assert sorted(done) == sorted(files)
+    assert failed == []
+    for filepath in files:
+        assert [stage for stage, path in pipeline.steps if path == filepath] == ["parse", "analyze", "commit"]
+
+def test_a_failing_file_does_not_stop_the_others(tmp_path):
+    files = [str(tmp_path / f"missing-{i}.pdf") for i in range(5)]
+    pipeline = RecordingPipeline(str(tmp_path), fail = [files[1]])
+    done, failed = runPipeline(pipeline, files)
+
+    assert failed == [files[1]]
+    assert sorted(done) == sorted(files[:1] + files[2:])
+    assert ("analyze", files[1]) not in pipeline.steps
+
+def test_stages_work_on_different_files_at_the_same_time(tmp_path):
+    second_parsed = threading.Event()
+    overlapped = []
+
+    class OverlappingPipeline(RecordingPipeline):
+        def parse(self, job):
+            super().parse(job)
+            if job.filepath.endswith("1.pdf"):
+                second_parsed.set()
+
+        def analyze(self, job):
+            if job.filepath.endswith("0.pdf"):
+                overlapped.append(second_parsed.wait(5)) # the next file is parsed while this one is analyzed
+            super().analyze(job)
+
+    pipeline = OverlappingPipeline(str(tmp_path))
+    done, _ = runPipeline(pipeline, [str(tmp_path / "0.pdf"), str(tmp_path / "1.pdf")])
+    assert overlapped == [True]
+    assert len(done) == 2
+
+# HELPER: pipeline whose Docling and Ollama calls are replaced, returns the parsed page ranges
+# and the number of metadata prompts; `classify` returns the Classification for the markdown so far
+def progressivePipeline(monkeypatch, tmp_path, classify, total_pages = 20):
+    from scripts import pipeline as pipeline_module
+
+    parsed, metadata_calls = [], []
+    monkeypatch.setattr(pipeline_module, "getPageCount", lambda filepath: total_pages)
+    monkeypatch.setattr(pipeline_module, "parseDocumentWithRoute", lambda filepath, pageRange, fastPath = True, pool = None: (parsed.append(pageRange) or f"pages {pageRange}", "docling"))
+    monkeypatch.setattr(pipeline_module, "classifyDocument", lambda markdown, filename, conversation = None, client = None, known_type = None, keep_alive = None: classify(markdown))
+    monkeypatch.setattr(pipeline_module, "extractMetadata", lambda markdown, conversation = None, client = None, keep_alive = None: metadata_calls.append(markdown))
+
+    pipeline = Pipeline(str(tmp_path), log = lambda text: None, initial_pages = 1, page_limits = {"CRE": 6, "default": 3})
+    return pipeline, parsed, metadata_calls
+
+# stands in for a pre-classifier whose embedding model is not installed
+class MissingEmbeddingModel:
+    def embed(self, markdown):
+        raise ollama.ResponseError("model 'nomic-embed-text' not found", 404)
+
+    def predict(self, embedding):
+        raise AssertionError("nothing to predict from")
+
+def test_documents_are_classified_by_the_model_when_embeddings_fail(monkeypatch, tmp_path):
+    pipeline, parsed, metadata_calls = progressivePipeline(monkeypatch, tmp_path, classifyAfter("ADM", 1))
+    pipeline.pre_classifier = MissingEmbeddingModel()
+    messages = []
+    pipeline.log = messages.append
+
+    for name in ("memo.pdf", "letter.pdf"):
+        job = pdfJob(tmp_path, name)
+        pipeline.parse(job)
+        pipeline.analyze(job)
+        assert job.document.classification.type == "ADM"
+        assert job.embedding is None # not added to the index on commit
+    assert len([message for message in messages if "pre-classifier is not available" in message]) == 1
+
+# HELPER: job for a PDF written to tmp_path
+def pdfJob(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"%PDF-1.4")
+    return Job(str(path), Source(DEFAULT_SOURCE, str(tmp_path), str(tmp_path / "filed")))
+
+# HELPER: classification of the given type, author filled in once `pages` pages were parsed
+def classifyAfter(doc_type, pages):
+    def classify(markdown):
+        author = "Doe" if markdown.count("pages") >= pages else "Unknown"
+        return Classification(subject = "Study", author = author, type = doc_type, year_processed = "2024")
+    return classify
+
+def test_each_pipeline_passes_its_own_keep_alive_to_ollama(monkeypatch, tmp_path):
+    from scripts import pipeline as pipeline_module
+
+    keep_alives = []
+    monkeypatch.setattr(pipeline_module, "getPageCount", lambda filepath: 1)
+    monkeypatch.setattr(pipeline_module, "parseDocumentWithRoute", lambda filepath, pageRange, fastPath = True, pool = None: ("# Study", "docling"))
+    def classifyDocument(markdown, filename, conversation = None, client = None, known_type = None, keep_alive = None):
+        keep_alives.append(keep_alive)
+        return Classification(subject = "Study", author = "Doe", type = "ADM", year_processed = "2024")
+    monkeypatch.setattr(pipeline_module, "classifyDocument", classifyDocument)
+
+    for keep_alive in ("2h", "-1"):
+        pipeline = Pipeline(str(tmp_path), log = lambda text: None, keep_alive = keep_alive)
+        job = pdfJob(tmp_path, "memo.pdf")
+        pipeline.parse(job)
+        pipeline.analyze(job)
+    assert keep_alives == ["2h", "-1"]
+
+def test_a_complete_first_page_is_all_that_gets_parsed(monkeypatch, tmp_path):
+    pipeline, parsed, metadata_calls = progressivePipeline(monkeypatch, tmp_path, classifyAfter("ADM", 1))
+    job = pdfJob(tmp_path, "memo.pdf")
+    pipeline.parse(job)
+    pipeline.analyze(job)
+
+    assert parsed == [(1, 1)]
+    assert metadata_calls == []
+
+def test_missing_fields_parse_more_pages_up_to_the_limit_of_the_type(monkeypatch, tmp_path):
+    pipeline, parsed, metadata_calls = progressivePipeline(monkeypatch, tmp_path, classifyAfter("ADM", 10))
+    job = pdfJob(tmp_path, "memo.pdf")
+    pipeline.parse(job)
+    pipeline.analyze(job)
+
+    assert parsed == [(1, 1), (2, 3)] # the ADM limit is the default of 3 pages
+    assert job.document.classification.author == "Unknown"
+
+def test_cre_documents_are_parsed_further_for_their_metadata(monkeypatch, tmp_path):
+    pipeline, parsed, metadata_calls = progressivePipeline(monkeypatch, tmp_path, classifyAfter("CRE", 1), total_pages = 4)
+    job = pdfJob(tmp_path, "paper.pdf")
+    pipeline.parse(job)
+    pipeline.analyze(job)
+
+    assert parsed == [(1, 1), (2, 4)] # the CRE limit is 6, but the paper only has 4 pages
+    assert len(metadata_calls) == 1
+
+# HELPER: pipeline with a journal in tmp_path whose Docling and Ollama calls fail the test
+def journaledPipeline(monkeypatch, tmp_path):
+    from scripts import pipeline as pipeline_module
+    from scripts.jobJournal import JobJournal
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("the journaled step was done again")
+    monkeypatch.setattr(pipeline_module, "parseDocumentWithRoute", unexpected)
+    monkeypatch.setattr(pipeline_module, "classifyDocument", unexpected)
+
+    journal = JobJournal(str(tmp_path / "journal.sqlite"))
+    destination = tmp_path / "filed"
+    return Pipeline(str(destination), log = lambda text: None, journal = journal), journal, destination
+
+DOCUMENT = Document(classification = Classification(subject = "Budget", author = "Finance", type = "ADM", year_processed = "2024"))
+
+def test_a_parsed_file_resumes_at_the_analysis(monkeypatch, tmp_path):
+    from scripts.jobJournal import PARSED
+    from scripts.resultCache import hashFile
+
+    pipeline, journal, destination = journaledPipeline(monkeypatch, tmp_path)
+    job = pdfJob(tmp_path, "memo.pdf")
+    journal.record(job.filepath, PARSED, sha256 = hashFile(job.filepath), markdown = "# Memo", pages = 2)
+
+    pipeline.parse(job)
+    assert (job.markdown, job.pages, job.routes) == ("# Memo", 2, ["journal"])
+
+def test_a_changed_file_is_not_resumed(monkeypatch, tmp_path):
+    from scripts.jobJournal import PARSED
+
+    pipeline, journal, destination = journaledPipeline(monkeypatch, tmp_path)
+    job = pdfJob(tmp_path, "memo.pdf")
+    journal.record(job.filepath, PARSED, sha256 = "hash of an older scan", markdown = "# Old", pages = 1)
+
+    with pytest.raises(AssertionError, match = "done again"):
+        pipeline.parse(job)
+
+def test_an_interrupted_commit_is_finished_with_the_destinations_it_had_chosen(monkeypatch, tmp_path):
+    from scripts.jobJournal import COMMITTING, JobJournal
+    from scripts.resultCache import hashFile
+
+    pipeline, journal, destination = journaledPipeline(monkeypatch, tmp_path)
+    job = pdfJob(tmp_path, "memo.pdf")
+    pdf_destination = str(destination / "ADM" / "[FOR REVIEW] chosen before the crash.pdf")
+    json_destination = str(destination / "ADM" / "chosen before the crash.json")
+    journal.record(
+        job.filepath, COMMITTING, sha256 = hashFile(job.filepath), document = DOCUMENT.model_dump_json(),
+        pdf_destination = pdf_destination, json_destination = json_destination
+    )
+
+    done, failed = runPipeline(pipeline, [job.filepath])
+    assert (done, failed) == ([job.filepath], [])
+    assert sorted(os.listdir(destination / "ADM")) == sorted(os.path.basename(path) for path in (pdf_destination, json_destination))
+    journal = JobJournal(str(tmp_path / "journal.sqlite")) # the pipeline closed its journal
+    assert journal.lookup(job.filepath) is None
+    journal.close()
+
+def test_a_commit_interrupted_after_moving_the_pdf_is_finished_on_start(monkeypatch, tmp_path):
+    from scripts.jobJournal import COMMITTING, JobJournal
+
+    pipeline, journal, destination = journaledPipeline(monkeypatch, tmp_path)
+    source = tmp_path / "memo.pdf"
+    pdf_destination = destination / "ADM" / "[FOR REVIEW] Finance - Budget - 2024.pdf"
+    json_destination = destination / "ADM" / "Finance - Budget - 2024.json"
+    pdf_destination.parent.mkdir(parents = True)
+    pdf_destination.write_bytes(b"%PDF-1.4") # the PDF left the source folder, its JSON was never written
+    journal.record(
+        str(source), COMMITTING, sha256 = "abc", document = DOCUMENT.model_dump_json(),
+        pdf_destination = str(pdf_destination), json_destination = str(json_destination)
+    )
+
+    assert runPipeline(pipeline, []) == ([], [])
+    assert Document.model_validate_json(json_destination.read_text(encoding = "utf-8")) == DOCUMENT
+    journal = JobJournal(str(tmp_path / "journal.sqlite")) # the pipeline closed its journal
+    assert journal.interruptedCommits() == []
+    journal.close()
+
+def test_each_file_is_filed_into_the_destination_of_its_source(monkeypatch, tmp_path):
+    from scripts import pipeline as pipeline_module
+    from scripts.sources import Sources
+
+    monkeypatch.setattr(pipeline_module, "parseDocumentWithRoute", lambda filepath, pageRange, fastPath = True, pool = None: (f"# {filepath}", "docling"))
+    monkeypatch.setattr(pipeline_module, "classifyDocument", lambda markdown, filename, *args, **kwargs: DOCUMENT.classification.model_copy())
+    sources = Sources([
+        Source("office", str(tmp_path / "office"), str(tmp_path / "filed-office")),
+        Source("research", str(tmp_path / "office" / "research"), str(tmp_path / "filed-research")),
+    ])
+    files = [str(tmp_path / "office" / "memo.pdf"), str(tmp_path / "office" / "research" / "paper.pdf")]
+    for filepath in files:
+        os.makedirs(os.path.dirname(filepath), exist_ok = True)
+        with open(filepath, "wb") as f:
+            f.write(b"%PDF-1.4 " + filepath.encode("utf-8"))
+
+    pipeline = Pipeline(sources, log = lambda text: None)
+    done, failed = runPipeline(pipeline, files)
+    assert (sorted(done), failed) == (sorted(files), [])
+    for name in ("filed-office", "filed-research"):
+        assert sorted(os.listdir(tmp_path / name / "ADM")) == ["Finance - Budget - 2024.json", "[FOR REVIEW] Finance - Budget - 2024.pdf"]
+    assert pipeline.in_flight == {"office": 0, "research": 0}
+
+# pipeline whose parsing raises `parse_errors` one after the other before it works
+class FailingPipeline(RecordingPipeline):
+    def __init__(self, destination_root, parse_errors, **kwargs):
+        self.parse_errors = list(parse_errors)
+        super().__init__(destination_root, retry_backoff = 0.01, **kwargs)
+
+    def parse(self, job):
+        if self.parse_errors:
+            self.record("parse", job)
+            raise self.parse_errors.pop(0)
+        super().parse(job)
+
+# HELPER: a PDF in the source folder
+def sourcePdf(tmp_path, name = "scan.pdf"):
+    path = tmp_path / "source" / name
+    path.parent.mkdir(exist_ok = True)
+    path.write_bytes(b"%PDF-1.4")
+    return str(path)
+
+def test_transient_errors_send_the_document_back_to_its_stage(tmp_path):
+    pdf = sourcePdf(tmp_path)
+    pipeline = FailingPipeline(str(tmp_path / "filed"), [TimeoutError("Ollama did not answer"), ConnectionRefusedError()])
+    done, failed = runPipeline(pipeline, [pdf])
+
+    assert done == [pdf]
+    assert failed == []
+    assert [stage for stage, _ in pipeline.steps] == ["parse", "parse", "parse", "analyze", "commit"]
+
+def test_documents_stay_in_the_source_folder_once_the_retries_are_used_up(tmp_path):
+    pdf = sourcePdf(tmp_path)
+    pipeline = FailingPipeline(str(tmp_path / "filed"), [TimeoutError()] * 5, retry_attempts = 2)
+    done, failed = runPipeline(pipeline, [pdf])
+
+    assert failed == [pdf]
+    assert [stage for stage, _ in pipeline.steps] == ["parse"] * 3
+    assert os.path.exists(pdf)
+    assert not os.path.exists(tmp_path / "filed" / QUARANTINE_FOLDER)
+
+def test_documents_that_cannot_be_processed_are_quarantined(tmp_path):
+    pdf = sourcePdf(tmp_path)
+    pipeline = FailingPipeline(str(tmp_path / "filed"), [ValueError("broken xref table")])
+    done, failed = runPipeline(pipeline, [pdf])
+
+    assert failed == [pdf]
+    assert [stage for stage, _ in pipeline.steps] == ["parse"] # not retried
+    assert not os.path.exists(pdf)
+    quarantine = tmp_path / "filed" / QUARANTINE_FOLDER
+    assert (quarantine / "scan.pdf").exists()
+    details = json.loads((quarantine / "scan.error.json").read_text(encoding = "utf-8"))
+    assert (details["stage"], details["error_class"], details["error"]) == ("parse", "ValueError", "broken xref table")
+    assert details["attempts"] == 1
+
+def test_documents_are_not_quarantined_when_the_parser_processes_are_stopped(tmp_path):
+    pdf = sourcePdf(tmp_path)
+    pipeline = FailingPipeline(str(tmp_path / "filed"), [PoolStopped("parser processes are stopped")])
+    done, failed = runPipeline(pipeline, [pdf])
+
+    assert failed == [pdf]
+    assert os.path.exists(pdf) # processed on the next run
+    assert not os.path.exists(tmp_path / "filed" / QUARANTINE_FOLDER)
+
+def test_a_failed_commit_leaves_the_document_where_it_is(tmp_path):
+    class FailingCommitPipeline(RecordingPipeline):
+        def commit(self, job):
+            raise ValueError("destination folder is read-only")
+
+    pdf = sourcePdf(tmp_path)
+    done, failed = runPipeline(FailingCommitPipeline(str(tmp_path / "filed")), [pdf])
+
+    assert failed == [pdf]
+    assert os.path.exists(pdf)
+    assert not os.path.exists(tmp_path / "filed" / QUARANTINE_FOLDER)
+
+def test_files_leased_by_another_scanner_are_left_to_it(tmp_path):
+    mine, theirs = sourcePdf(tmp_path, "mine.pdf"), sourcePdf(tmp_path, "theirs.pdf")
+    shared_queue, other_scanner = SharedQueue(str(tmp_path / "source"), heartbeat = 60), SharedQueue(str(tmp_path / "source"), heartbeat = 60)
+    other_scanner.node = "other-machine"
+    assert other_scanner.claim(theirs)
+
+    pipeline = RecordingPipeline(str(tmp_path / "filed"), leases = {DEFAULT_SOURCE: shared_queue})
+    done = []
+    pipeline.on_done = lambda job: done.append(job.filepath)
+    pipeline.start()
+    assert pipeline.submit(mine)
+    assert not pipeline.submit(theirs)
+    pipeline.close()
+    pipeline.join()
+
+    assert done == [mine]
+    assert ("parse", theirs) not in pipeline.steps
+    assert other_scanner.claim(mine) # given back once it was committed
+    other_scanner.close()
+
+def test_a_missing_model_stops_the_pipeline_without_quarantining_anything(tmp_path):
+    class MissingModelPipeline(RecordingPipeline):
+        def analyze(self, job):
+            self.record("analyze", job)
+            raise ollama.ResponseError("model 'qwen3' not found, try pulling it first", 404)
+
+    files = [sourcePdf(tmp_path, f"scan-{i}.pdf") for i in range(3)]
+    pipeline = MissingModelPipeline(str(tmp_path / "filed"), retry_backoff = 0.01)
+    halted, failed = [], []
+    pipeline.on_halt = halted.append
+    pipeline.on_error = lambda job, error: failed.append(job.filepath)
+    for filepath in files:
+        assert pipeline.submit(filepath)
+    pipeline.start()
+    pipeline.close()
+    pipeline.join()
+
+    assert len(halted) == 1 and halted[0] is pipeline.halted
+    assert pipeline.halted.status_code == 404
+    assert [stage for stage, _ in pipeline.steps].count("analyze") == 1 # not retried, the other files were not tried
+    assert failed == files[:1]
+    assert all(os.path.exists(filepath) for filepath in files)
+    assert not os.path.exists(tmp_path / "filed" / QUARANTINE_FOLDER)
+    assert not pipeline.submit(files[0])
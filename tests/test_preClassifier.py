@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+from scripts import preClassifier as preClassifierModule
+from scripts.preClassifier import PreClassifier, rebuildIndex
+
+# stands in for Ollama: the same text always gets the same embedding
+class FakeEmbeddings:
+    def embed(self, model, input):
+        seed = int(hashlib.sha256(input.encode("utf-8")).hexdigest()[:8], 16)
+        return SimpleNamespace(embeddings = [np.random.default_rng(seed).random(8).tolist()])
+
+# HELPER: a destination root with `count` filed documents of each type, as the commit stage leaves them
+def fileDocuments(root, count, types = ("ADM", "FIN")):
+    for doc_type in types:
+        os.makedirs(os.path.join(root, doc_type))
+        for i in range(count):
+            name = f"{doc_type} document {i}"
+            with open(os.path.join(root, doc_type, f"{name}.json"), "w", encoding = "utf-8") as f:
+                json.dump({"classification": {"type": doc_type, "subject": name}}, f)
+            open(os.path.join(root, doc_type, f"{name}.pdf"), "wb").close()
+    return count * len(types)
+
+# HELPER: unit vector pointing mostly along `axis`, `noise` moves it away from the axis
+def unitVector(axis, noise = 0.0, size = 8):
+    vector = np.full(size, noise, dtype = np.float32)
+    vector[axis] = 1.0
+    return vector / np.linalg.norm(vector)
+
+def test_a_document_close_to_filed_ones_gets_their_type(tmp_path):
+    pre_classifier = PreClassifier(str(tmp_path), threshold = 0.9, neighbours = 3, client = FakeEmbeddings())
+    for i in range(3):
+        pre_classifier.add(unitVector(0, 0.01 * i), "adm", "{}")
+        pre_classifier.add(unitVector(1, 0.01 * i), "FIN", "{}")
+
+    doc_type, similarity, template = pre_classifier.predict(unitVector(0, 0.02))
+    assert doc_type == "ADM"
+    assert similarity > 0.99
+    assert template is None # template reuse is disabled by default
+
+def test_no_type_below_the_threshold_or_when_the_neighbours_disagree(tmp_path):
+    pre_classifier = PreClassifier(str(tmp_path), threshold = 0.9, neighbours = 2)
+    assert pre_classifier.predict(unitVector(0)) == (None, 0.0, None) # empty index
+
+    pre_classifier.add(unitVector(0), "ADM", "{}")
+    pre_classifier.add(unitVector(1), "FIN", "{}")
+    doc_type, similarity, template = pre_classifier.predict(unitVector(2))
+    assert doc_type is None
+    assert similarity < 0.9
+
+    # the best match is ADM but most of the neighbours are FIN: the vote disagrees with the best match
+    pre_classifier = PreClassifier(str(tmp_path), threshold = 0.9, neighbours = 3)
+    pre_classifier.add(unitVector(0), "ADM", "{}")
+    pre_classifier.add(unitVector(0, 0.02), "FIN", "{}")
+    pre_classifier.add(unitVector(0, 0.03), "FIN", "{}")
+    doc_type, similarity, template = pre_classifier.predict(unitVector(0))
+    assert doc_type is None
+    assert similarity > 0.99
+
+def test_a_near_duplicate_reuses_the_whole_classification(tmp_path):
+    pre_classifier = PreClassifier(str(tmp_path), threshold = 0.9, template_threshold = 0.99)
+    pre_classifier.add(unitVector(0), "CRE", '{"classification": {"type": "CRE"}}')
+
+    assert pre_classifier.predict(unitVector(0, 0.01))[2] == '{"classification": {"type": "CRE"}}'
+    assert pre_classifier.predict(unitVector(0, 0.2))[2] is None
+
+def test_the_index_is_saved_in_the_destination_and_loaded_again(tmp_path):
+    root = str(tmp_path)
+    pre_classifier = PreClassifier(root)
+    pre_classifier.add(unitVector(0), "ADM", "{}")
+    pre_classifier.save()
+    assert os.path.exists(os.path.join(root, preClassifierModule.INDEX_FILENAME))
+
+    loaded = PreClassifier(root)
+    assert loaded.types == ["ADM"]
+    assert loaded.predict(unitVector(0))[0] == "ADM"
+
+    # an index of another embedding model can't be compared, a new one is started
+    assert len(PreClassifier(root, model = "other-embed")) == 0
+
+def test_the_index_is_rebuilt_from_the_filed_documents(tmp_path):
+    root = str(tmp_path)
+    documents = fileDocuments(root, 3)
+    open(os.path.join(root, "ADM", "orphan.json"), "w").close() # no PDF next to it, skipped
+    pre_classifier = PreClassifier(root, client = FakeEmbeddings())
+
+    assert rebuildIndex(pre_classifier, root, os.path.basename, log = lambda text: None) == documents
+    assert sorted(set(pre_classifier.types)) == ["ADM", "FIN"]
+    assert len(PreClassifier(root, client = FakeEmbeddings())) == documents
+
+def test_scanners_filing_into_the_same_root_keep_each_others_rows(tmp_path):
+    root = str(tmp_path)
+    first, second = PreClassifier(root), PreClassifier(root)
+    first.add(unitVector(0), "ADM", "{}")
+    first.save()
+    second.add(unitVector(1), "FIN", "{}")
+    second.save()
+
+    assert second.types == ["ADM", "FIN"] # picked up the row the other scanner saved
+    assert PreClassifier(root).types == ["ADM", "FIN"]
+
+# HELPER: rows of the index saved in a destination root
+def savedRows(root):
+    with np.load(os.path.join(root, preClassifierModule.INDEX_FILENAME)) as data:
+        return len(data["types"])
+
+def test_rebuilding_twice_keeps_one_row_per_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(preClassifierModule, "SAVE_INTERVAL", -1) # a rebuild longer than the save interval
+    root = str(tmp_path)
+    documents = fileDocuments(root, 3)
+    pre_classifier = PreClassifier(root, client = FakeEmbeddings())
+
+    for _ in range(2):
+        assert rebuildIndex(pre_classifier, root, os.path.basename, log = lambda text: None) == documents
+        assert len(pre_classifier) == documents
+        assert savedRows(root) == documents
+
+    assert len(PreClassifier(root, client = FakeEmbeddings())) == documents
+
+def test_scanners_saving_at_the_same_time_keep_each_others_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(preClassifierModule, "SAVE_INTERVAL", -1) # every add saves
+    root = str(tmp_path)
+    client = FakeEmbeddings()
+    scanners = [PreClassifier(root, client = client) for _ in range(2)]
+
+    def file(scanner, name):
+        for i in range(15):
+            scanner.add(scanner.embed(f"{name} {i}"), "ADM", "{}")
+        scanner.save()
+
+    threads = [threading.Thread(target = file, args = (scanner, f"scanner {n}")) for n, scanner in enumerate(scanners)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert savedRows(root) == 30
@@ -0,0 +1,77 @@
+from scripts.promptCompactor import (
+    cleanMarkdown, compactMarkdown, compactDocument, estimateTokens, GAP_MARKER, MAX_TABLE_ROWS
+)
+
+LETTER = """18 November 2024
+
+MEMORANDUM
+
+TO: Dr. Maria Santos, Dean
+FROM: Office of the Chancellor
+SUBJECT: Request for Room Usage
+
+{body}
+
+Sincerely,
+
+Juan C. Dela Cruz, PhD
+Director, Research Office"""
+
+# HELPER: a letter whose middle is `paragraphs` paragraphs of filler
+def letter(paragraphs):
+    body = "\n\n".join(f"Paragraph {i} describes the schedule of the activity in more detail than the analysis needs." for i in range(paragraphs))
+    return LETTER.format(body = body)
+
+def test_noise_is_removed():
+    markdown = "# Title\n\n<!-- image -->\n![logo](logo.png)\nName: ..............\n\nPage 2 of 5\n\n- 3 -\n\nText of 2024"
+    cleaned = cleanMarkdown(markdown)
+    assert "image" not in cleaned and "logo" not in cleaned
+    assert "Name: ..." in cleaned and "...." not in cleaned
+    assert "Page 2" not in cleaned and "- 3 -" not in cleaned
+    assert "Text of 2024" in cleaned # a year is not a page number
+
+def test_repeated_headers_are_kept_once_but_not_the_signer():
+    pages = "\n\n".join(f"UP Mindanao Records Office\n\nContent of page {i}" for i in range(4))
+    signatures = "\n\n".join("Noted by:\n\nJuan C. Dela Cruz" for _ in range(3))
+    cleaned = cleanMarkdown(pages + "\n\n" + signatures)
+    assert cleaned.count("UP Mindanao Records Office") == 1
+    assert cleaned.count("Juan C. Dela Cruz") == 3
+
+def test_long_tables_keep_their_first_rows_and_their_total():
+    rows = [f"| item {i}    |    {i} |" for i in range(20)]
+    table = "\n".join(["| Item | Amount |", "|------|--------|"] + rows + ["| Total | 190 |"])
+    cleaned = cleanMarkdown(table).splitlines()
+    assert cleaned[0] == "| Item | Amount |"
+    assert cleaned[2] == "| item 0 | 0 |"
+    assert cleaned[-1] == "| Total | 190 |"
+    assert len(cleaned) == 2 + MAX_TABLE_ROWS + 1
+    assert "more rows" in cleaned[-2]
+
+def test_a_document_within_the_budget_is_only_cleaned():
+    markdown = letter(2)
+    compacted, stats = compactMarkdown(markdown, 10000)
+    assert compacted == cleanMarkdown(markdown)
+    assert stats["dropped_chunks"] == 0
+
+def test_compaction_keeps_the_header_and_the_signature_within_the_budget():
+    markdown = letter(60)
+    compacted, stats = compactMarkdown(markdown, 150)
+
+    assert estimateTokens(compacted) <= 150 + 2 # chunks are joined by blank lines
+    assert compacted.startswith("18 November 2024")
+    assert "SUBJECT: Request for Room Usage" in compacted
+    assert "Juan C. Dela Cruz, PhD" in compacted
+    assert GAP_MARKER in compacted
+    assert stats["dropped_chunks"] > 0
+    assert stats["tokens_before"] == estimateTokens(markdown)
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+
+def test_kept_chunks_stay_in_their_original_order():
+    compacted, _ = compactMarkdown(letter(60), 150)
+    positions = [compacted.index(text) for text in ("18 November 2024", "SUBJECT:", "Sincerely,", "Juan C. Dela Cruz")]
+    assert positions == sorted(positions)
+
+def test_no_budget_leaves_the_document_as_it_is():
+    markdown = letter(60)
+    assert compactDocument(markdown, 0) is markdown
+    assert compactDocument(markdown, None) is markdown
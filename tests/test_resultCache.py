@@ -0,0 +1,111 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import aiFunctions
+from scripts.resultCache import ResultCache, hashFile
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+# HELPER: write a file and return its path
+def writeFile(folder, name, content):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+def test_identical_files_get_the_same_hash_whatever_their_name(tmp_path):
+    a = writeFile(tmp_path, "scan.pdf", b"%PDF same bytes")
+    b = writeFile(tmp_path, "copy of scan.pdf", b"%PDF same bytes")
+    c = writeFile(tmp_path, "other.pdf", b"%PDF other bytes")
+
+    assert hashFile(a) == hashFile(b)
+    assert hashFile(a) != hashFile(c)
+
+def test_markdown_and_document_are_returned_once_stored(cache_path):
+    cache = ResultCache("parser-1", "analysis-1", path = cache_path)
+    assert cache.get("abc") == (None, None)
+
+    cache.putMarkdown("abc", "# Title")
+    assert cache.get("abc") == ("# Title", None)
+
+    cache.putDocument("abc", '{"classification": {}}')
+    assert cache.get("abc") == ("# Title", '{"classification": {}}')
+    cache.close()
+
+def test_other_parser_version_drops_the_whole_entry(cache_path):
+    cache = ResultCache("parser-1", "analysis-1", path = cache_path)
+    cache.putMarkdown("abc", "# Title")
+    cache.putDocument("abc", "{}")
+    cache.close()
+
+    cache = ResultCache("parser-2", "analysis-1", path = cache_path)
+    assert cache.get("abc") == (None, None)
+    cache.close()
+
+def test_other_analysis_version_keeps_the_markdown_only(cache_path):
+    cache = ResultCache("parser-1", "analysis-1", path = cache_path)
+    cache.putMarkdown("abc", "# Title")
+    cache.putDocument("abc", "{}")
+    cache.close()
+
+    cache = ResultCache("parser-1", "analysis-2", path = cache_path)
+    assert cache.get("abc") == ("# Title", None)
+    cache.close()
+
+    # the same versions as when it was stored still hit
+    cache = ResultCache("parser-1", "analysis-2", path = cache_path)
+    cache.putDocument("abc", "{}")
+    cache.close()
+    cache = ResultCache("parser-1", "analysis-2", path = cache_path)
+    assert cache.get("abc") == ("# Title", "{}")
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted_above_max_bytes(cache_path):
+    cache = ResultCache("parser-1", "analysis-1", path = cache_path, max_bytes = 25)
+    cache.putMarkdown("old", "x" * 10)
+    cache.putMarkdown("used", "y" * 10)
+    cache.get("used") # more recent than "old" now
+    cache.putMarkdown("new", "z" * 10)
+
+    assert cache.get("old") == (None, None)
+    assert cache.get("used")[0] == "y" * 10
+    assert cache.get("new")[0] == "z" * 10
+    cache.close()
+
+def test_analysis_version_changes_with_the_model_digest(monkeypatch):
+    digest = {"value": "sha256:aaa"}
+    monkeypatch.setattr(aiFunctions.ollama, "list", lambda: SimpleNamespace(models = [
+        SimpleNamespace(model = f"{aiFunctions.MODEL}:latest", digest = digest["value"])
+    ]))
+
+    first = aiFunctions.getAnalysisVersion()
+    assert aiFunctions.getAnalysisVersion() == first
+
+    digest["value"] = "sha256:bbb"
+    assert aiFunctions.getAnalysisVersion() != first
+
+def test_analysis_version_reads_the_model_from_the_configured_servers(monkeypatch):
+    digests = {"http://gpu-1:11434": None, "http://gpu-2:11434": "sha256:aaa"} # gpu-1 is down
+
+    class FakeClient:
+        def __init__(self, host):
+            self.host = host
+
+        def list(self):
+            if digests[self.host] is None:
+                raise ConnectionError("connection refused")
+            return SimpleNamespace(models = [SimpleNamespace(model = f"{aiFunctions.MODEL}:latest", digest = digests[self.host])])
+
+    def defaultList():
+        raise AssertionError("the default Ollama server was asked")
+    monkeypatch.setattr(aiFunctions.ollama, "Client", FakeClient)
+    monkeypatch.setattr(aiFunctions.ollama, "list", defaultList)
+
+    hosts = ["http://gpu-1:11434", "http://gpu-2:11434"]
+    first = aiFunctions.getAnalysisVersion(0, hosts)
+    digests["http://gpu-2:11434"] = "sha256:bbb"
+    assert aiFunctions.getAnalysisVersion(0, hosts) != first
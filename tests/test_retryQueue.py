@@ -0,0 +1,65 @@
+import time
+import sqlite3
+
+import ollama
+
+from scripts.retryQueue import RetryQueue, backoffDelay, isTransient, isEnvironmentError, JITTER
+
+# HELPER: RetryQueue whose deliveries are collected in a list
+def collectingQueue():
+    delivered = []
+    return RetryQueue(delivered.append), delivered
+
+def test_backoff_doubles_up_to_the_max_delay():
+    for attempt, expected in ((1, 5), (2, 10), (3, 20), (4, 40), (10, 60)):
+        delay = backoffDelay(attempt, 5, 60)
+        assert expected <= delay <= expected * (1 + JITTER)
+
+def test_transient_errors():
+    assert isTransient(TimeoutError())
+    assert isTransient(ConnectionRefusedError())
+    assert isTransient(PermissionError())
+    assert isTransient(sqlite3.OperationalError("database is locked"))
+    assert isTransient(ollama.ResponseError("overloaded", 503))
+    assert isTransient(ollama.ResponseError("too many requests", 429))
+
+def test_document_errors_are_not_transient():
+    assert not isTransient(ValueError("invalid JSON"))
+    assert not isTransient(sqlite3.OperationalError("no such table: documents"))
+    assert not isTransient(ollama.ResponseError("model not found", 404))
+
+def test_errors_of_the_setup_are_environment_errors():
+    assert isEnvironmentError(ollama.ResponseError("model 'qwen3' not found", 404))
+    assert isEnvironmentError(ollama.ResponseError("invalid format", 400))
+    assert not isEnvironmentError(ollama.ResponseError("overloaded", 503))
+    assert not isEnvironmentError(ValueError("invalid JSON"))
+
+def test_items_are_delivered_once_their_delay_has_passed():
+    retry_queue, delivered = collectingQueue()
+    started = time.monotonic()
+    retry_queue.put("late", 0.3)
+    retry_queue.put("early", 0.1)
+    assert len(retry_queue) == 2
+
+    while (len(delivered) < 2 or len(retry_queue)) and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    assert delivered == ["early", "late"]
+    assert time.monotonic() - started >= 0.3
+    assert len(retry_queue) == 0
+    retry_queue.close()
+
+def test_clear_returns_the_waiting_items_in_due_order():
+    retry_queue, delivered = collectingQueue()
+    retry_queue.put("b", 20)
+    retry_queue.put("a", 10)
+    assert retry_queue.clear() == ["a", "b"]
+    assert len(retry_queue) == 0
+    retry_queue.close()
+    assert delivered == []
+
+def test_close_stops_the_thread_and_returns_the_waiting_items():
+    retry_queue, delivered = collectingQueue()
+    retry_queue.put("waiting", 10)
+    assert retry_queue.close() == ["waiting"]
+    assert not retry_queue.thread.is_alive()
+    assert delivered == []
@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+from scripts.sharedQueue import SharedQueue
+
+# HELPER: a scanner's view of the shared queue of `folder`, `node` stands in for another machine or process
+def scanner(folder, node, ttl = 60):
+    shared_queue = SharedQueue(str(folder), ttl = ttl, heartbeat = 60, name = "office")
+    shared_queue.node = node
+    return shared_queue
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    return str(path)
+
+def test_a_file_is_processed_by_one_scanner_at_a_time(tmp_path, pdf):
+    first, second = scanner(tmp_path, "a"), scanner(tmp_path, "b")
+
+    assert first.claim(pdf)
+    assert not second.claim(pdf)
+    assert not first.claim(pdf) # not twice by the same scanner either
+    assert first.renew(pdf) and not second.renew(pdf)
+
+    first.release(pdf)
+    assert second.claim(pdf)
+    assert first.counts["claimed"] == second.counts["claimed"] == 1
+    assert second.counts["busy"] == 1
+    first.close()
+    second.close()
+
+def test_scanners_agree_on_the_file_whatever_the_path_they_use(tmp_path, pdf):
+    shared_queue = scanner(tmp_path, "a")
+    assert shared_queue.key(pdf) == "scan.pdf"
+    assert shared_queue.key(os.path.join(str(tmp_path), "sub", "..", "scan.pdf")) == "scan.pdf"
+    assert shared_queue.key(str(tmp_path / "2024" / "scan.pdf")) == "2024/scan.pdf"
+    assert shared_queue.local_path("2024/scan.pdf") == os.path.join(str(tmp_path), "2024", "scan.pdf")
+    shared_queue.close()
+
+def test_an_expired_lease_is_taken_over(tmp_path, pdf):
+    crashed, other = scanner(tmp_path, "crashed", ttl = 0.1), scanner(tmp_path, "other")
+    assert crashed.claim(pdf)
+    time.sleep(0.2)
+
+    assert other.expired() == [pdf]
+    assert other.claim(pdf)
+    assert other.counts["taken_over"] == 1
+
+    # the scanner that stopped responding finds out before it touches the file
+    assert not crashed.renew(pdf)
+    assert crashed.counts["lost"] == 1 and "scan.pdf" not in crashed.held
+    crashed.close()
+    other.close()
+
+def test_expired_leases_of_files_that_were_filed_are_removed(tmp_path, pdf):
+    crashed, other = scanner(tmp_path, "crashed", ttl = 0.1), scanner(tmp_path, "other")
+    assert crashed.claim(pdf)
+    os.remove(pdf) # filed before the scanner died
+    time.sleep(0.2)
+
+    assert other.expired() == []
+    assert other.connection.execute("SELECT COUNT(*) FROM leases").fetchone()[0] == 0
+    crashed.close()
+    other.close()
+
+def test_the_heartbeat_renews_the_leases_and_forgets_the_lost_ones(tmp_path, pdf):
+    slow, other = scanner(tmp_path, "slow", ttl = 0.1), scanner(tmp_path, "other")
+    assert slow.claim(pdf)
+    time.sleep(0.2)
+    assert other.claim(pdf)
+
+    slow.renew_all()
+    assert slow.held == set()
+    assert slow.counts["lost"] == 1
+    assert not slow.renew(pdf)
+    slow.close()
+    other.close()
+
+def test_close_gives_the_leases_back(tmp_path, pdf):
+    first, second = scanner(tmp_path, "a"), scanner(tmp_path, "b")
+    assert first.claim(pdf)
+    first.close()
+    assert not first.thread.is_alive()
+
+    assert second.claim(pdf)
+    assert second.counts["taken_over"] == 0 # released, not expired
+    second.close()
@@ -0,0 +1,55 @@
+import os
+import ntpath
+from types import SimpleNamespace
+
+import pytest
+
+from scripts import sources as sources_module
+from scripts.sources import Source, Sources, loadSources, DEFAULT_SOURCE
+
+def test_a_file_belongs_to_the_deepest_source_folder_containing_it(tmp_path):
+    root = str(tmp_path)
+    sources = Sources([
+        Source("office", os.path.join(root, "scans"), os.path.join(root, "filed")),
+        Source("research", os.path.join(root, "scans", "research"), os.path.join(root, "filed-research")),
+    ])
+
+    assert sources.match(os.path.join(root, "scans", "memo.pdf")).name == "office"
+    assert sources.match(os.path.join(root, "scans", "research", "paper.pdf")).name == "research"
+    assert sources.match(os.path.join(root, "scans-old", "memo.pdf")).name == "office" # no match, the first source
+    assert sources.destinations() == [os.path.join(root, "filed"), os.path.join(root, "filed-research")]
+
+def test_files_on_other_windows_drives_belong_to_no_source(monkeypatch):
+    monkeypatch.setattr(sources_module, "os", SimpleNamespace(path = ntpath)) # Windows paths on any OS
+    office = Source("office", "C:\\Scans", "C:\\Filed")
+
+    assert office.contains("c:\\scans\\memo.pdf")
+    assert not office.contains("D:\\Scans\\memo.pdf")
+    assert not office.contains("\\\\server\\share\\memo.pdf")
+    assert not office.contains("C:\\Scans-old\\memo.pdf")
+    assert Source("drive", "C:\\", "D:\\Filed").contains("C:\\Scans\\memo.pdf")
+    assert Sources([office, Source("share", "\\\\server\\share", "C:\\Filed")]).match("\\\\server\\share\\memo.pdf").name == "share"
+
+def test_sources_come_from_the_command_line_then_the_list_then_the_pair():
+    config = {"source_path": "/scans", "destination_path": "/filed", "sources": [
+        {"name": "office", "source_path": "/office", "destination_path": "/filed", "weight": 2},
+        {"source_path": "/research/", "destination_path": "/filed-research"},
+    ]}
+
+    sources = loadSources(config, "/cli", "/cli-filed")
+    assert [(source.name, source.source_path, source.destination_path) for source in sources] == [(DEFAULT_SOURCE, "/cli", "/cli-filed")]
+
+    sources = loadSources(config)
+    assert [(source.name, source.weight) for source in sources] == [("office", 2.0), ("research", 1.0)]
+
+    sources = loadSources(dict(config, sources = []))
+    assert [(source.name, source.source_path) for source in sources] == [(DEFAULT_SOURCE, "/scans")]
+
+@pytest.mark.parametrize("entries", [
+    [{"source_path": "/scans"}],
+    [{"source_path": "/scans", "destination_path": "/filed", "weight": 0}],
+    [{"name": "a", "source_path": "/a", "destination_path": "/filed"}, {"name": "a", "source_path": "/b", "destination_path": "/filed"}],
+])
+def test_invalid_sources_are_refused(entries):
+    with pytest.raises(ValueError):
+        loadSources({"sources": entries})
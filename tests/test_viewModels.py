@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+pytest.importorskip("PySide6")
+
+from PySide6.QtCore import Qt
+
+from scripts.jobQueue import JobQueue
+from viewModels import LogModel, QueueModel
+
+# HELPER: text of every row of a list model
+def rows(model):
+    return [model.data(model.index(row), Qt.DisplayRole) for row in range(model.rowCount())]
+
+def test_the_terminal_keeps_the_last_lines_only():
+    model = LogModel(max_lines = 3)
+    for i in range(5):
+        model.append(f"message {i}")
+    assert model.rowCount() == 0 # nothing shown before the GUI thread flushes
+
+    assert model.flush()
+    assert [line.split("] ", 1)[1] for line in rows(model)] == ["message 2", "message 3", "message 4"]
+    model.append("message 5")
+    model.flush()
+    assert [line.split("] ", 1)[1] for line in rows(model)] == ["message 3", "message 4", "message 5"]
+    assert not model.flush()
+
+def test_html_messages_become_bold_plain_lines_and_go_to_the_log_file():
+    records = []
+    file_logger = logging.getLogger("smartscanner-test")
+    file_logger.addHandler(type("Handler", (logging.Handler,), {"emit": lambda self, record: records.append(record.getMessage())})())
+    file_logger.setLevel(logging.INFO)
+
+    model = LogModel(file_logger = file_logger)
+    model.append("<b>Processing <i>memo</i>.</b>")
+    model.append("memo parsed.")
+    model.flush()
+
+    assert records == ["Processing memo.", "memo parsed."]
+    assert model.data(model.index(0), Qt.FontRole).bold()
+    assert model.data(model.index(1), Qt.FontRole) is None
+
+def test_the_queue_panel_follows_the_job_queue_in_processing_order():
+    model = QueueModel()
+    job_queue = JobQueue("sjf", on_change = lambda action, path: model.changed(action, path, job_queue.key_of(path) if action == "added" else None))
+    for name, cost in (("big.pdf", 40), ("small.pdf", 1), ("medium.pdf", 5), ("tiny.pdf", 1)):
+        job_queue.put(name, cost = cost)
+    model.flush()
+    assert rows(model) == ["[1] small.pdf", "[2] tiny.pdf", "[3] medium.pdf", "[4] big.pdf"]
+
+    job_queue.get(timeout = 0)
+    job_queue.get(timeout = 0)
+    job_queue.remove("big.pdf")
+    model.flush()
+    assert rows(model) == ["[1] medium.pdf"]
+    assert model.data(model.index(0), Qt.ToolTipRole) == "medium.pdf"
+
+    model.clear()
+    assert model.rowCount() == 0
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+pytest.importorskip("docling")
+
+from scripts import warmUp, documentParser, aiFunctions
+
+# HELPER: run a warm-up with the given settings, returns the states it reported
+def runWarmUp(config):
+    states = []
+    warmUp.startWarmUp(config, states.append).join(5)
+    return states
+
+@pytest.fixture
+def loaded(monkeypatch):
+    loaded = {"converters": [], "model": []}
+    def warmUpConverter(workers):
+        loaded["converters"].append(workers)
+        thread = threading.Thread(target = lambda: None)
+        thread.start()
+        return thread
+    monkeypatch.setattr(documentParser, "warmUpConverter", warmUpConverter)
+    monkeypatch.setattr(aiFunctions, "preloadModel", lambda host = None, keep_alive = None: loaded["model"].append((host, keep_alive)))
+    return loaded
+
+def test_docling_and_the_model_are_loaded_before_ready(loaded):
+    states = runWarmUp({"parse_processes": 0, "parse_workers": 2, "ollama_host": "http://gpu:11434", "ollama_keep_alive": "2h"})
+    assert states == [warmUp.LOADING_LIBRARIES, warmUp.LOADING_DOCLING, warmUp.LOADING_MODEL, warmUp.READY]
+    assert loaded == {"converters": [2], "model": [("http://gpu:11434", "2h")]}
+
+def test_parser_processes_load_their_own_models(loaded):
+    states = runWarmUp({"parse_processes": 2})
+    assert warmUp.LOADING_DOCLING not in states
+    assert loaded["converters"] == []
+    assert states[-1] == warmUp.READY
+
+def test_an_unreachable_ollama_is_reported(loaded, monkeypatch):
+    def preloadModel(host = None, keep_alive = None):
+        raise ConnectionError("connection refused")
+    monkeypatch.setattr(aiFunctions, "preloadModel", preloadModel)
+    assert runWarmUp({"parse_processes": 2})[-1] == warmUp.OLLAMA_UNAVAILABLE
+
+def test_a_docling_failure_is_reported(loaded, monkeypatch):
+    def warmUpConverter(workers):
+        raise RuntimeError("models could not be downloaded")
+    monkeypatch.setattr(documentParser, "warmUpConverter", warmUpConverter)
+    assert runWarmUp({"parse_processes": 0}) == [warmUp.LOADING_LIBRARIES, warmUp.LOADING_DOCLING, warmUp.WARM_UP_FAILED]
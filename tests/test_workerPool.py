@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from scripts.workerPool import RecyclingPool, WorkerCrashed, PoolStopped
+
+@pytest.fixture
+def pools():
+    pools = []
+    yield pools.append
+    for pool in pools:
+        pool.shutdown()
+
+def test_tasks_run_in_the_worker_processes(pools):
+    pool = RecyclingPool(2, name = "test")
+    pools(pool)
+
+    assert pool.call(pow, 2, 10) == 1024
+    assert pool.call(os.getpid) != os.getpid()
+    with pytest.raises(ValueError):
+        pool.call(int, "not a number") # the task's own exception is raised in the caller
+
+def test_a_worker_is_replaced_after_max_documents(pools):
+    pool = RecyclingPool(1, max_documents = 2, name = "test")
+    pools(pool)
+
+    pids = [pool.call(os.getpid) for _ in range(3)]
+    assert pids[0] == pids[1] != pids[2]
+    assert pool.memory_report()["restarts"] == {"documents": 1}
+
+def test_a_task_that_kills_its_worker_is_retried_once(pools):
+    pool = RecyclingPool(1, name = "test")
+    pools(pool)
+
+    with pytest.raises(WorkerCrashed):
+        pool.call(os._exit, 3)
+    assert pool.memory_report()["restarts"] == {"crash": 2}
+    assert pool.call(pow, 2, 2) == 4 # a new worker took over
+
+def test_memory_is_reported_per_worker(pools):
+    pool = RecyclingPool(2, name = "test")
+    pools(pool)
+    pool.call(pow, 2, 2)
+
+    report = pool.memory_report()
+    assert [worker["name"] for worker in report["workers"]] == ["test-0", "test-1"]
+    assert sum(worker["documents"] for worker in report["workers"]) == 1
+    assert report["worker_steady_mb"] > 0
+    assert report["main_rss_mb"] > 0
+
+def test_no_task_is_accepted_after_shutdown():
+    pool = RecyclingPool(1, name = "test")
+    assert pool.call(pow, 2, 2) == 4
+    pool.shutdown()
+    with pytest.raises(PoolStopped):
+        pool.call(pow, 2, 2)
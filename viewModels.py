@@ -0,0 +1,178 @@
+import os
+import re
+import bisect
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from PySide6 import QtGui
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from scripts.fileFunctions import CONFIG_PATH
+
+LOG_PATH = os.path.join(os.path.dirname(CONFIG_PATH), "smartscanner.log") # stored next to config.json
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+# full history of the terminal panel, rotated so it never grows past max_mb * (backups + 1)
+def createFileLogger(max_mb = 10, backups = 5, path = LOG_PATH):
+    logger = logging.getLogger("smartscanner")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes = int(max_mb * 1024 * 1024), backupCount = backups, encoding = "utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+# terminal panel: keeps only the last `max_lines` messages, older ones are only in the log file;
+# append() can be called from any thread, flush() inserts the waiting messages from the GUI thread
+class LogModel(QAbstractListModel):
+    def __init__(self, max_lines = 5000, file_logger = None, parent = None):
+        super().__init__(parent)
+        self.max_lines = max(1, max_lines)
+        self.file_logger = file_logger
+        self.lines = deque()        # (text, bold) shown in the panel, oldest first
+        self.waiting = []           # messages appended since the last flush
+        self.lock = threading.Lock()
+        self.bold_font = QtGui.QFont()
+        self.bold_font.setBold(True)
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        text, bold = self.lines[index.row()]
+        if role == Qt.DisplayRole:
+            return text
+        if role == Qt.FontRole and bold:
+            return self.bold_font
+        return None
+
+    # add a message with timestamp; the HTML tags used by the callers become bold lines
+    def append(self, text):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        plain = TAG_PATTERN.sub("", text)
+        if self.file_logger is not None:
+            self.file_logger.info(plain)
+        with self.lock:
+            self.waiting.append((f"[{timestamp}] {plain}", "<b>" in text))
+
+    # insert the waiting messages as one batch and drop the oldest lines past the cap, returns True if any were added
+    def flush(self):
+        with self.lock:
+            batch, self.waiting = self.waiting[-self.max_lines:], []
+        if not batch:
+            return False
+
+        overflow = len(self.lines) + len(batch) - self.max_lines
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            for _ in range(overflow):
+                self.lines.popleft()
+            self.endRemoveRows()
+
+        first = len(self.lines)
+        self.beginInsertRows(QModelIndex(), first, first + len(batch) - 1)
+        self.lines.extend(batch)
+        self.endInsertRows()
+        return True
+
+# queue panel: mirrors the JobQueue in processing order from its on_change notifications;
+# changed() can be called from any thread, flush() applies the waiting changes from the GUI thread
+class QueueModel(QAbstractListModel):
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.keys = []              # JobQueue sort keys, same order as paths
+        self.paths = []             # queued files in the order they will be processed
+        self.waiting = []           # (action, path, key) received since the last flush
+        self.lock = threading.Lock()
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return f"[{index.row() + 1}] {os.path.basename(self.paths[index.row()])}"
+        if role == Qt.ToolTipRole:
+            return self.paths[index.row()]
+        return None
+
+    # JobQueue on_change callback, `key` is the file's sort key when it was added
+    def changed(self, action, path, key = None):
+        with self.lock:
+            self.waiting.append((action, path, key))
+
+    # apply the waiting changes, consecutive files taken from the front are removed as one batch
+    def flush(self):
+        with self.lock:
+            batch, self.waiting = self.waiting, []
+
+        front = 0 # files taken from the front, not removed from the model yet
+        for action, path, key in batch:
+            if action == "removed" and front < len(self.paths) and self.paths[front] == path:
+                front += 1
+                continue
+            self.remove_front(front)
+            front = 0
+
+            if action == "added" and key is not None:
+                row = bisect.bisect_right(self.keys, key)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.keys.insert(row, key)
+                self.paths.insert(row, path)
+                self.endInsertRows()
+            elif action == "removed" and path in self.paths:
+                row = self.paths.index(path)
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.keys[row], self.paths[row]
+                self.endRemoveRows()
+        self.remove_front(front)
+
+    # HELPER: remove the first `count` rows at once
+    def remove_front(self, count):
+        if count:
+            self.beginRemoveRows(QModelIndex(), 0, count - 1)
+            del self.keys[:count], self.paths[:count]
+            self.endRemoveRows()
+
+    def clear(self):
+        with self.lock:
+            self.waiting = []
+        self.beginResetModel()
+        self.keys, self.paths = [], []
+        self.endResetModel()
+
+# search panel: results of DocumentIndex.search(), replaced as a whole on every search
+class SearchModel(QAbstractListModel):
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.results = []
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def data(self, index, role = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        result = self.results[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{result['type']}  {result['author']} - {result['title'] or result['subject']} - {result['year']}"
+        if role == Qt.ToolTipRole:
+            lines = [result["pdf_path"] or result["json_path"]]
+            if result["snippet"]:
+                lines.append(result["snippet"])
+            return "\n".join(lines)
+        if role == Qt.UserRole:
+            return result["pdf_path"] or result["json_path"]
+        return None
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = results
+        self.endResetModel()